@@ -0,0 +1 @@
+"""Offline benchmarks of messengerapi, see python -m benchmarks --help."""
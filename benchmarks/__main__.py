@@ -0,0 +1,65 @@
+"""Run the benchmark suite: python -m benchmarks [--json results.json] [--compare baseline.json]"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+from datetime import datetime, timezone
+
+from .suite import BENCHMARKS
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("groups", nargs="*", help="the groups to run, all by default: "
+                        + ", ".join(group for group, _ in BENCHMARKS))
+    parser.add_argument("--min-time", type=float, default=1.0,
+                        help="seconds spent measuring each benchmark (default: 1)")
+    parser.add_argument("--json", metavar="PATH", help="write the results to PATH")
+    parser.add_argument("--compare", metavar="PATH", help="compare with results written by --json")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative change reported as a regression (default: 0.1)")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.groups) - {group for group, _ in BENCHMARKS}
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+    results = {}
+    regressions = 0
+    for group, function in BENCHMARKS:
+        if args.groups and group not in args.groups:
+            continue
+        for result in function(args.min_time):
+            results[result.name] = {"value": result.value, "unit": result.unit, "better": result.better}
+            line = f"{result.name:<48} {result.value:>12.3f} {result.unit}"
+            previous = baseline.get(result.name)
+            if previous:
+                change = result.value / previous["value"] - 1
+                worse = change > args.threshold if result.better == "lower" else change < -args.threshold
+                regressions += worse
+                line += f"  {change:+.1%}{'  REGRESSION' if worse else ''}"
+            print(line, flush=True)
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "python": sys.version.split()[0],
+                "implementation": platform.python_implementation(),
+                "platform": platform.platform(),
+                "results": results,
+            }, output, indent=2)
+            output.write("\n")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""Benchmarks of the send, upload and component hot paths, run offline against a FakeGraphServer."""
+
+from __future__ import annotations
+
+import gc
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Iterator, NamedTuple
+
+from messengerapi import AttachmentUploadApi, ConnectionPool, SendApi
+from messengerapi._json import encode as encode_json
+from messengerapi._mime import detect_file_mimetype, sniff_mimetype
+from messengerapi.components import Button, Buttons, Element, Elements, QuickReplies, QuickReply
+from messengerapi.constants import ButtonType
+from messengerapi.send_api import PreparedMessage
+
+PAGE_ACCESS_TOKEN = "benchmark-token"
+PAGE_ID = "1234567890"
+
+# A 1x1 PNG, so MIME sniffing has real magic bytes to recognize.
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082")
+
+
+class Result(NamedTuple):
+    name: str
+    value: float
+    unit: str
+    better: str = "lower"
+
+
+BENCHMARKS: list[tuple[str, Callable[[float], Iterator[Result]]]] = []
+
+
+def benchmark(group: str) -> Callable:
+    def register(function: Callable[[float], Iterator[Result]]) -> Callable:
+        BENCHMARKS.append((group, function))
+        return function
+    return register
+
+
+def per_call(function: Callable[[], object], min_time: float) -> float:
+    """Return the best seconds per call of function over batches lasting about min_time."""
+    number = 1
+    while True:
+        started_at = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - started_at
+        if elapsed >= min_time / 5:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(4):
+        started_at = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - started_at) / number)
+    return best
+
+
+def _subprocess_env() -> dict[str, str]:
+    """Return the environment of subprocesses importing messengerapi from this checkout."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (root, os.environ.get("PYTHONPATH")))))
+
+
+def cold_start(statement: str, min_time: float) -> float:
+    """Return the median seconds statement takes in fresh interpreters, over about min_time."""
+    code = f"import time\nstarted_at = time.perf_counter()\n{statement}\nprint(time.perf_counter() - started_at)"
+    samples = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < 5 or time.perf_counter() < deadline:
+        output = subprocess.run(
+            [sys.executable, "-c", code], env=_subprocess_env(), capture_output=True, text=True, check=True)
+        samples.append(float(output.stdout))
+    return statistics.median(samples)
+
+
+@contextmanager
+def graph_server(*options: str) -> Iterator[str]:
+    """Run a FakeGraphServer in a subprocess, so it neither shares the GIL nor the traced memory."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "messengerapi.fake_graph", "--port", "0", *options],
+        stdout=subprocess.PIPE, text=True, env=_subprocess_env())
+    try:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError("the fake Graph server did not start")
+        yield line.split()[-1]
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def _carousel(index: int = 0) -> Elements:
+    elements = Elements()
+    for position in range(10):
+        buttons = Buttons()
+        buttons.add_button(Button(title="Buy", payload=f"BUY_{index}_{position}"))
+        buttons.add_button(Button(button_type=ButtonType.WEB_URL, title="View", url=f"https://example.com/{position}"))
+        elements.add_element(Element(
+            title=f"Product {position}",
+            subtitle="A product of the catalog",
+            image_url=f"https://example.com/{position}.jpg",
+            buttons=buttons,
+        ))
+    return elements
+
+
+def _quick_replies() -> QuickReplies:
+    quick_replies = QuickReplies()
+    for position in range(5):
+        quick_replies.add_quick_reply(QuickReply(title=f"Option {position}", payload=f"OPTION_{position}"))
+    return quick_replies
+
+
+@benchmark("import")
+def imports(min_time: float) -> Iterator[Result]:
+    # What a serverless function pays on a cold start, before its first reply.
+    for name, statement in (
+        ("import.package", "import messengerapi"),
+        ("import.send_api", "from messengerapi import SendApi"),
+        ("import.async_send_api", "from messengerapi import AsyncSendApi"),
+    ):
+        yield Result(name, cold_start(statement, min_time) * 1e3, "ms")
+    with graph_server() as graph_url:
+        yield Result("import.first_text_message", cold_start(
+            "from messengerapi import SendApi\n"
+            f"SendApi({PAGE_ACCESS_TOKEN!r}, graph_url={graph_url!r}).send_text_message('Hello', '1')",
+            min_time) * 1e3, "ms")
+
+
+@benchmark("components")
+def components(min_time: float) -> Iterator[Result]:
+    yield Result("components.build_carousel", per_call(_carousel, min_time) * 1e6, "us")
+    counter = iter(range(1 << 62))
+    yield Result(
+        "components.build_and_compile_carousel",
+        per_call(lambda: _carousel(next(counter)).compile(), min_time) * 1e6, "us")
+    carousel = _carousel()
+    carousel.compile()
+    yield Result("components.compile_cached_carousel", per_call(carousel.compile, min_time) * 1e6, "us")
+
+
+@benchmark("encoding")
+def encoding(min_time: float) -> Iterator[Result]:
+    content = _carousel().get_content()
+    body = {
+        "recipient": {"id": "1"},
+        "message": {"attachment": {"type": "template", "payload": {
+            "template_type": "generic", "elements": content}}},
+    }
+    yield Result("encoding.generic_template_dicts", per_call(lambda: encode_json(body), min_time) * 1e6, "us")
+
+    fragment_body = dict(body)
+    fragment_body["message"] = {"attachment": {"type": "template", "payload": {
+        "template_type": "generic", "elements": _carousel().compile()}}}
+    yield Result(
+        "encoding.generic_template_fragment",
+        per_call(lambda: encode_json(fragment_body), min_time) * 1e6, "us")
+
+    prepared = PreparedMessage({"messaging_type": "UPDATE", "message": {"text": "Hello"}})
+    yield Result(
+        "encoding.prepared_message_for_recipient",
+        per_call(lambda: prepared.for_recipient("1234567890123456"), min_time) * 1e6, "us")
+
+
+@benchmark("mime")
+def mime(min_time: float) -> Iterator[Result]:
+    with tempfile.TemporaryDirectory() as directory:
+        named = os.path.join(directory, "photo.png")
+        unnamed = os.path.join(directory, "photo")
+        for path in (named, unnamed):
+            with open(path, "wb") as file_data:
+                file_data.write(PNG)
+        yield Result("mime.from_extension", per_call(lambda: detect_file_mimetype(named), min_time) * 1e6, "us")
+        yield Result("mime.sniff_file", per_call(lambda: detect_file_mimetype(unnamed), min_time) * 1e6, "us")
+    yield Result("mime.sniff_buffer", per_call(lambda: sniff_mimetype(PNG), min_time) * 1e6, "us")
+
+
+@benchmark("send")
+def send(min_time: float) -> Iterator[Result]:
+    with graph_server() as graph_url:
+        send_api = SendApi(PAGE_ACCESS_TOKEN, PAGE_ID, graph_url=graph_url, pool=ConnectionPool())
+        carousel = _carousel().compile()
+        quick_replies = _quick_replies().compile()
+
+        for name, call in (
+            ("send.text_message", lambda: send_api.send_text_message("Hello", "1")),
+            ("send.generic_message", lambda: send_api.send_generic_message(carousel, "1", quick_replies=quick_replies)),
+        ):
+            for _ in range(20):
+                call()
+            latencies = []
+            deadline = time.perf_counter() + min_time
+            while time.perf_counter() < deadline or len(latencies) < 50:
+                started_at = time.perf_counter()
+                call()
+                latencies.append(time.perf_counter() - started_at)
+            latencies.sort()
+            yield Result(f"{name}.p50", statistics.median(latencies) * 1e3, "ms")
+            yield Result(f"{name}.p99", latencies[int(len(latencies) * 0.99) - 1] * 1e3, "ms")
+
+
+@benchmark("upload")
+def upload(min_time: float) -> Iterator[Result]:
+    with graph_server() as graph_url, tempfile.TemporaryDirectory() as directory:
+        pool = ConnectionPool()
+        upload_api = AttachmentUploadApi(PAGE_ACCESS_TOKEN, PAGE_ID, graph_url=graph_url, pool=pool)
+        send_api = SendApi(PAGE_ACCESS_TOKEN, PAGE_ID, graph_url=graph_url, pool=pool)
+        for size_name, size in (("64KiB", 64 << 10), ("4MiB", 4 << 20)):
+            path = os.path.join(directory, f"photo_{size_name}.png")
+            with open(path, "wb") as file_data:
+                file_data.write(PNG + bytes(size - len(PNG)))
+            yield Result(
+                f"upload.local_image_{size_name}",
+                per_call(lambda: upload_api.upload_local_image(path), min_time) * 1e3, "ms")
+            yield Result(
+                f"upload.send_local_image_{size_name}",
+                per_call(lambda: send_api.send_local_image(path, "1"), min_time) * 1e3, "ms")
+
+
+@benchmark("throughput")
+def throughput(min_time: float) -> Iterator[Result]:
+    # A little server latency, so concurrency has something to overlap.
+    with graph_server("--latency", "0.005") as graph_url:
+        for concurrency in (1, 4, 16, 64):
+            send_api = SendApi(PAGE_ACCESS_TOKEN, graph_url=graph_url, pool=ConnectionPool())
+            count = max(concurrency * 4, int(min_time / 0.005) * concurrency)
+            started_at = time.perf_counter()
+            failures = sum(
+                result.error is not None
+                for result in send_api.broadcast(
+                    {"text": "Hello"}, (str(index) for index in range(count)), max_in_flight=concurrency)
+            )
+            elapsed = time.perf_counter() - started_at
+            if failures:
+                raise RuntimeError(f"{failures} broadcast requests failed")
+            yield Result(f"throughput.broadcast_c{concurrency}", count / elapsed, "msg/s", "higher")
+
+
+@benchmark("memory")
+def memory(min_time: float) -> Iterator[Result]:
+    # The server holds each response long enough for every worker to have a request in flight.
+    with graph_server("--latency", "0.05") as graph_url:
+        peaks = {}
+        for concurrency in (1, 64):
+            send_api = SendApi(PAGE_ACCESS_TOKEN, graph_url=graph_url, pool=ConnectionPool())
+            for _ in send_api.broadcast({"text": "warm-up"}, ["0"], max_in_flight=1):
+                pass
+            gc.collect()
+            tracemalloc.start()
+            try:
+                for _ in send_api.broadcast(
+                    {"text": "Hello"}, (str(index) for index in range(concurrency * 3)),
+                    max_in_flight=concurrency,
+                ):
+                    pass
+                peaks[concurrency] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        yield Result("memory.per_in_flight_request", (peaks[64] - peaks[1]) / 63 / 1024, "KiB")
@@ -1,4 +1,96 @@
-from .attachment_upload_api import AttachmentUploadApi
-from .messenger_profile_api import ProfileApi
-from .send_api import SendApi
-from .constants import *
\ No newline at end of file
+"""Python wrapper of the Messenger Platform APIs.
+
+The names below are imported from their submodule on first use, so importing the package
+only loads what is used: requests, aiohttp and libmagic included, which keeps the cold
+starts of serverless functions short.
+"""
+
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+_EXPORTS = {
+    "AttachmentUploadApi": "attachment_upload_api",
+    "ProfileApi": "messenger_profile_api",
+    "SendApi": "send_api",
+    "UserProfileApi": "user_profile_api",
+    "AttachmentCache": "attachment_cache",
+    "Outbox": "outbox",
+    "SuppressionList": "suppression",
+    "GraphBatch": "batch",
+    "JsonFragment": "_json",
+    "RequestHooks": "hooks",
+    "RequestTiming": "hooks",
+    "Metrics": "metrics",
+    "ConnectionPool": "pool",
+    "RateLimiter": "rate_limit",
+    "RetryPolicy": "retry",
+    "DuplicateSendError": "exceptions",
+    "GraphApiError": "exceptions",
+    "PermanentError": "exceptions",
+    "SuppressedError": "exceptions",
+    "ThrottledError": "exceptions",
+    "TransientError": "exceptions",
+    "AsyncAttachmentUploadApi": "async_api",
+    "AsyncProfileApi": "async_api",
+    "AsyncSendApi": "async_api",
+    "AsyncUserProfileApi": "async_api",
+    "API_VERSION": "constants",
+    "GRAPH_URL": "constants",
+    "ASSET_TYPES": "constants",
+    "ButtonType": "constants",
+    "MessagingType": "constants",
+    "NotificationType": "constants",
+    "SenderAction": "constants",
+    "MessageTag": "constants",
+}
+
+# Submodules the package used to import eagerly, still reachable as its attributes.
+_SUBMODULES = frozenset({
+    "async_api", "attachment_cache", "attachment_upload_api", "batch", "constants", "exceptions",
+    "hooks", "messenger_profile_api", "metrics", "outbox", "pool", "rate_limit", "retry", "send_api",
+})
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    if name in _EXPORTS:
+        value = getattr(import_module(f".{_EXPORTS[name]}", __name__), name)
+    elif name in _SUBMODULES:
+        value = import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(__all__) | _SUBMODULES)
+
+
+if TYPE_CHECKING:
+    from ._json import JsonFragment
+    from .async_api import (
+        AsyncAttachmentUploadApi, AsyncProfileApi, AsyncSendApi, AsyncUserProfileApi,
+    )
+    from .attachment_cache import AttachmentCache
+    from .attachment_upload_api import AttachmentUploadApi
+    from .batch import GraphBatch
+    from .constants import (
+        API_VERSION, ASSET_TYPES, GRAPH_URL, ButtonType, MessageTag, MessagingType,
+        NotificationType, SenderAction,
+    )
+    from .exceptions import (
+        DuplicateSendError, GraphApiError, PermanentError, SuppressedError, ThrottledError,
+        TransientError,
+    )
+    from .hooks import RequestHooks, RequestTiming
+    from .messenger_profile_api import ProfileApi
+    from .metrics import Metrics
+    from .outbox import Outbox
+    from .pool import ConnectionPool
+    from .rate_limit import RateLimiter
+    from .retry import RetryPolicy
+    from .send_api import SendApi
+    from .suppression import SuppressionList
+    from .user_profile_api import UserProfileApi
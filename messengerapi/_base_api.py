@@ -2,48 +2,633 @@
 
 from __future__ import annotations
 
-from typing import Any, Mapping
+import json
+import os
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Mapping
+from urllib.parse import urlencode
 
-import requests
+from ._json import encode as encode_json
+from ._streams import ProgressCallback, is_replayable, iter_multipart, open_source, reader_payload
+from .constants import GRAPH_URL
+from .exceptions import GraphApiError, PermanentError, ThrottledError, error_from_response
+from .hooks import RequestHooks, RequestTiming, _current_timing, begin_request, record_phase
+from .metrics import CONNECTION_ERROR, SUCCESS, Metrics, outcome_of
+from .pool import ConnectionPool, _import_aiohttp
+from .rate_limit import RateLimiter
+from .retry import RetryPolicy, parse_retry_after
+
+if TYPE_CHECKING:
+    import requests
+
+    from .outbox import Outbox
+    from .suppression import SuppressionList
+
+
+@dataclass(frozen=True)
+class FilePart:
+    """The content of a file sent as one part of a multipart request.
+
+    The source is a path, a bytes-like object, a binary file object or an
+    iterable of bytes; progress is called with the bytes sent and the total.
+    """
+
+    source: Any
+    mimetype: str
+    name: str | None = None
+    progress: ProgressCallback | None = None
+    offset: int | None = None
+
+    @property
+    def filename(self) -> str:
+        if self.name is not None:
+            return self.name
+        if isinstance(self.source, (str, os.PathLike)):
+            return os.path.basename(self.source)
+        return "attachment"
+
+    @property
+    def replayable(self) -> bool:
+        return is_replayable(self.source)
+
+    def open(self, stack: ExitStack) -> Any:
+        return open_source(self.source, stack, self.progress, self.offset)
+
+
+@dataclass(frozen=True)
+class GraphRequest:
+    """A Graph API call, described independently of the transport sending it.
+
+    The API classes only build these; the sync and async clients decide how
+    they go over the wire, so both share the same payload-building code.
+    A json body given as bytes is already encoded and is sent untouched, JsonFragment
+    values in a mapping body are spliced in without being encoded again.
+    The idempotency key identifies the request in an Outbox, to send it only once.
+    The recipient id of a message is checked against the client's SuppressionList.
+    Idempotent requests, e.g. profile settings, have the same effect when sent twice.
+    Requests without a body, such as GETs, carry their parameters in the url.
+    """
+
+    method: str
+    url: str
+    operation: str
+    json: Mapping[str, Any] | bytes | None = None
+    fields: Mapping[str, str] | None = None
+    files: Mapping[str, FilePart] | None = None
+    result_key: str | None = None
+    parse: Callable[[Any], Any] | None = None
+    idempotency_key: str | None = None
+    recipient_id: str | None = None
+    idempotent: bool = False
+
+    @property
+    def is_form(self) -> bool:
+        return self.fields is not None or bool(self.files)
+
+    @property
+    def replayable(self) -> bool:
+        """Whether the request can be sent again, i.e. no file part is a one-shot stream."""
+        return all(part.replayable for part in (self.files or {}).values())
+
+    @property
+    def resendable(self) -> bool:
+        """Whether the request is retried after a failure that Facebook may have processed.
+
+        GETs, DELETEs and idempotent requests are. So are requests with an idempotency key:
+        their sender accepts that they may be delivered twice, i.e. at least once.
+        """
+        return self.idempotent or self.method != "POST" or self.idempotency_key is not None
+
+    def finish(self, response_body: Any) -> Any:
+        """Turn the decoded response body into the value returned to callers."""
+        if self.result_key is not None:
+            response_body = response_body[self.result_key]
+        if self.parse is not None:
+            response_body = self.parse(response_body)
+        return response_body
 
 
 class BaseApiClient:
     """Base class with shared request behavior."""
 
+    # True on the copies made by GraphBatch.bind(), whose requests are queued instead of sent.
+    _deferred = False
+
     def __init__(
         self,
         page_access_token: str,
         *,
         timeout: float = 30.0,
         session: requests.Session | None = None,
+        pool: ConnectionPool | None = None,
+        rate_limiter: RateLimiter | bool | None = None,
+        retry_policy: RetryPolicy | None = None,
+        outbox: Outbox | None = None,
+        suppression: SuppressionList | None = None,
+        metrics: Metrics | bool | None = None,
+        hooks: Iterable[RequestHooks] | None = None,
+        graph_url: str = GRAPH_URL,
     ) -> None:
+        """
+        Args:
+            page_access_token (str): The page access token.
+            timeout (float, optional): The timeout of each request, in seconds. Defaults to 30.
+            session (requests.Session, optional): The session used to send requests, instead of
+                the one of the connection pool.
+            pool (ConnectionPool, optional): The connection pool shared with other clients.
+                Defaults to ConnectionPool.default().
+            rate_limiter (RateLimiter or bool, optional): A limiter throttling the requests of
+                this client, or True to share one limiter with every client of the same token.
+            retry_policy (RetryPolicy, optional): How failed requests are retried.
+                Defaults to RetryPolicy(), use RetryPolicy(max_attempts=1) to disable retries.
+            outbox (Outbox, optional): Where requests are recorded before being sent, to replay
+                them after a crash and to send each idempotency key only once.
+            suppression (SuppressionList, optional): The recipients whose messages are not sent,
+                raising a SuppressedError instead, learned from the permanent failures of sends.
+            metrics (Metrics or bool, optional): Where the latency and outcome of each request are
+                recorded, or True to share Metrics.default() with other clients. Defaults to None,
+                which records nothing.
+            hooks (iterable of RequestHooks, optional): Callbacks run around each API call,
+                given a RequestTiming of its phases.
+            graph_url (str, optional): The scheme and host of the Graph API, e.g. the url of a
+                FakeGraphServer. Defaults to "https://graph.facebook.com".
+
+        Raises:
+            GraphApiError: From the API methods, when a request fails for good.
+        """
         if not isinstance(page_access_token, str) or not page_access_token.strip():
             raise ValueError("page_access_token must be a non-empty string")
         if timeout <= 0:
             raise ValueError("timeout must be greater than 0")
+        if not isinstance(graph_url, str) or not graph_url.startswith(("http://", "https://")):
+            raise ValueError("graph_url must be an http or https url")
 
         self._page_access_token = page_access_token
         self._timeout = timeout
-        self._session = session or requests.Session()
+        self._graph_url = graph_url.rstrip("/")
+        self._session = session
+        self._pool = pool or ConnectionPool.default()
+        if rate_limiter is True:
+            rate_limiter = RateLimiter.for_token(page_access_token)
+        self._rate_limiter = rate_limiter or None
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._outbox = outbox
+        self._suppression = suppression
+        if metrics is True:
+            metrics = Metrics.default()
+        self._metrics = metrics or None
+        self._hooks = tuple(hooks or ())
 
     def get_access_token(self) -> str:
         return self._page_access_token
 
-    def _post_json(self, url: str, body: Mapping[str, Any]) -> dict[str, Any]:
-        response = self._session.post(
-            url,
-            params={"access_token": self.get_access_token()},
-            json=body,
-            timeout=self._timeout,
-        )
-        return response.json()
+    def get_graph_url(self) -> str:
+        return self._graph_url
+
+    def _resolved(self, value: Any) -> Any:
+        """Return value the way _execute returns results, for calls answered without a request."""
+        return value
+
+    def _execute(self, request: GraphRequest) -> Any:
+        if not self._hooks:
+            return self._execute_request(request)
+        token = _current_timing.set(begin_request(request))
+        try:
+            return self._execute_request(request)
+        finally:
+            _current_timing.reset(token)
+
+    def _execute_request(self, request: GraphRequest) -> Any:
+        suppression = self._suppression
+        if suppression is None or request.recipient_id is None:
+            return self._execute_outboxed(request)
+        from .suppression import _suppressed_error
+
+        error = _suppressed_error(suppression, request.recipient_id)
+        if error is not None:
+            raise error
+        try:
+            return self._execute_outboxed(request)
+        except PermanentError as error:
+            suppression.learn(request.recipient_id, error)
+            raise
+
+    def _execute_outboxed(self, request: GraphRequest) -> Any:
+        outbox = self._outbox
+        if outbox is None or not outbox.accepts(request):
+            return request.finish(self._send_with_retries(request))
+
+        request, entry = outbox.begin(request)
+        if entry.done:
+            return request.finish(entry.response_body)
+        failures = []
+        try:
+            response_body = self._send_with_retries(request, failures)
+        except PermanentError as error:
+            outbox.fail(request.idempotency_key, error)
+            raise
+        except BaseException as error:
+            outbox.abandon(request.idempotency_key, sent=(
+                error not in failures or any(map(_reached_server, failures))))
+            raise
+        outbox.complete(request.idempotency_key, response_body)
+        return request.finish(response_body)
+
+    def _send_with_retries(self, request: GraphRequest, failures: list | None = None) -> Any:
+        """Send request, retrying its failures, each of which is appended to failures."""
+        import requests
+
+        attempt = 1
+        while True:
+            try:
+                return self._attempt(request)
+            except (GraphApiError, requests.ConnectionError, requests.Timeout) as error:
+                if failures is not None:
+                    failures.append(error)
+                delay = self._retry_policy.delay_for(attempt, error)
+                if delay is None or not request.replayable or (
+                        not request.resendable and _reached_server(error)):
+                    raise
+            if self._metrics is not None:
+                self._metrics.add_retry(request.operation)
+            time.sleep(delay)
+            attempt += 1
+
+    def _attempt(self, request: GraphRequest) -> Any:
+        if self._metrics is None and not self._hooks:
+            return self._send(request)
+        import requests
+
+        stats = self._attempt_started(request)
+        started_at = time.perf_counter()
+        try:
+            response_body = self._send(request)
+        except (requests.ConnectionError, requests.Timeout) as error:
+            self._attempt_finished(request, stats, started_at, CONNECTION_ERROR, error=error)
+            raise
+        except BaseException as error:
+            self._attempt_finished(request, stats, started_at, outcome_of(error), error=error)
+            raise
+        self._attempt_finished(request, stats, started_at, SUCCESS, response_body)
+        return response_body
+
+    def _attempt_started(self, request: GraphRequest) -> Any:
+        timing = _current_timing.get()
+        if timing is not None:
+            timing.attempts += 1
+            for hook in self._hooks:
+                hook.before_send(request, timing)
+        return None if self._metrics is None else self._metrics.start(request.operation)
+
+    def _attempt_finished(self, request: GraphRequest, stats: Any, started_at: float, outcome: str,
+        response_body: Any = None, error: BaseException | None = None
+    ) -> None:
+        if stats is not None:
+            self._metrics.finish(stats, started_at, outcome)
+        timing = _current_timing.get()
+        if timing is not None:
+            for hook in self._hooks:
+                if error is None:
+                    hook.after_response(request, timing, response_body)
+                else:
+                    hook.on_error(request, timing, error)
+
+    def _count_bytes(self, request: GraphRequest, size: int) -> None:
+        if self._metrics is not None:
+            self._metrics.add_bytes(request.operation, size)
+
+    def _send(self, request: GraphRequest) -> Any:
+        started_at = time.perf_counter()
+        if request.files:
+            with ExitStack() as stack:
+                fields = dict(request.fields or {})
+                readers = []
+                for name, part in request.files.items():
+                    readers.append(part.open(stack))
+                    fields[name] = (part.filename, readers[-1], part.mimetype)
+                if any(reader.length is None for reader in readers):
+                    # Parts of unknown length are streamed with chunked transfer encoding.
+                    boundary = os.urandom(16).hex()
+                    record_phase("encode", started_at)
+                    return self._post_multipart(
+                        request.url,
+                        iter_multipart(fields, boundary),
+                        f"multipart/form-data; boundary={boundary}",
+                    )
+                from requests_toolbelt import MultipartEncoder
+
+                multipart_data = MultipartEncoder(fields=fields)
+                self._count_bytes(request, multipart_data.len)
+                record_phase("encode", started_at)
+                return self._post_multipart(
+                    request.url, multipart_data, multipart_data.content_type)
+        if request.fields is not None:
+            form = urlencode(request.fields)
+            self._count_bytes(request, len(form))
+            record_phase("encode", started_at)
+            return self._post_data(request.url, form, "application/x-www-form-urlencoded")
+        if request.json is None:
+            record_phase("encode", started_at)
+            return self._request(request.method, request.url)
+        body = request.json if isinstance(request.json, bytes) else encode_json(request.json)
+        self._count_bytes(request, len(body))
+        record_phase("encode", started_at)
+        if request.method != "POST":
+            return self._request(request.method, request.url, data=body,
+                                 headers={"content-type": "application/json"})
+        return self._post_json(request.url, body)
+
+    def _post_json(self, url: str, body: Mapping[str, Any] | bytes) -> dict[str, Any]:
+        if not isinstance(body, bytes):
+            body = encode_json(body)
+        return self._post_data(url, body, "application/json")
 
     def _post_multipart(self, url: str, data: Any, content_type: str) -> dict[str, Any]:
-        response = self._session.post(
+        return self._post_data(url, data, content_type)
+
+    def _post_data(self, url: str, data: Any, content_type: str) -> dict[str, Any]:
+        return self._request("POST", url, data=data, headers={"content-type": content_type})
+
+    def _request(self, method: str, url: str, **kwargs: Any) -> Any:
+        if self._rate_limiter is not None:
+            started_at = time.perf_counter()
+            self._rate_limiter.acquire()
+            record_phase("rate_limit", started_at)
+        started_at = time.perf_counter()
+        response = (self._session or self._pool.session).request(
+            method,
             url,
             params={"access_token": self.get_access_token()},
-            data=data,
-            headers={"content-type": content_type},
             timeout=self._timeout,
+            **kwargs,
         )
-        return response.json()
+        timing = _current_timing.get()
+        if timing is not None:
+            # elapsed ends with the response headers, the body is read after it.
+            server = response.elapsed.total_seconds()
+            timing.add("server", server)
+            timing.add("read", max(0.0, time.perf_counter() - started_at - server))
+        if self._rate_limiter is not None:
+            self._rate_limiter.update(response.headers)
+        return _timed_decode(response.status_code, response.headers, response.content)
+
+
+def _reached_server(error: BaseException) -> bool:
+    """Whether a failed attempt of a sync client may have been processed by Facebook.
+
+    Only throttled calls and connections that could not be opened certainly were not:
+    a timeout or a reset connection may come after Facebook accepted the request.
+    """
+    if isinstance(error, GraphApiError):
+        return not isinstance(error, ThrottledError)
+    import requests
+
+    if isinstance(error, requests.ConnectTimeout):
+        return False
+    if isinstance(error, requests.ConnectionError):
+        from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+        return not _caused_by(error, (ConnectTimeoutError, NewConnectionError, ConnectionRefusedError))
+    return True
+
+
+def _reached_server_async(error: BaseException, aiohttp: Any) -> bool:
+    """Like _reached_server(), for the errors of async clients."""
+    if isinstance(error, GraphApiError):
+        return not isinstance(error, ThrottledError)
+    # ConnectionTimeoutError only exists since aiohttp 3.10.
+    connect_timeout = getattr(aiohttp, "ConnectionTimeoutError", aiohttp.ClientConnectorError)
+    return not isinstance(error, (aiohttp.ClientConnectorError, connect_timeout))
+
+
+def _caused_by(error: BaseException, error_types: tuple) -> bool:
+    # requests wraps the urllib3 errors, which wrap the socket errors, in args or as a reason.
+    pending = [error]
+    seen = set()
+    while pending:
+        error = pending.pop()
+        if error is None or id(error) in seen:
+            continue
+        seen.add(id(error))
+        if isinstance(error, error_types):
+            return True
+        pending.extend((error.__cause__, error.__context__, getattr(error, "reason", None)))
+        pending.extend(arg for arg in error.args if isinstance(arg, BaseException))
+    return False
+
+
+def _timed_decode(status: int, headers: Mapping[str, str], content: bytes) -> Any:
+    started_at = time.perf_counter()
+    try:
+        return _decode_response(status, headers, content)
+    finally:
+        record_phase("decode", started_at)
+
+
+def _decode_response(status: int, headers: Mapping[str, str], content: bytes) -> Any:
+    """Return the decoded body of a response, raising a GraphApiError if it failed."""
+    try:
+        response_body = json.loads(content) if content else None
+    except ValueError:
+        response_body = None
+    if status >= 400 or (isinstance(response_body, dict) and "error" in response_body):
+        raise error_from_response(status, response_body, parse_retry_after(headers))
+    return response_body
+
+
+class AsyncBaseApiClient:
+    """Mixin sending GraphRequests over a pooled aiohttp session.
+
+    Combined with one of the sync API classes, the inherited methods build the
+    same requests and return ``self._execute(...)``, which is a coroutine here.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        session: Any = None,
+        pool: ConnectionPool | None = None,
+        **kwargs: Any,
+    ) -> None:
+        """
+        Args:
+            session (aiohttp.ClientSession, optional): The session used to send requests, instead
+                of the one of the connection pool.
+            pool (ConnectionPool, optional): The connection pool shared with other clients.
+                Defaults to a pool of this client only, closed by close().
+        """
+        self._owns_pool = pool is None
+        super().__init__(*args, pool=pool or ConnectionPool(), **kwargs)
+        self._aiohttp_session = session
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Close the connections of this client, unless they come from a shared pool or session."""
+        if self._owns_pool:
+            await self._pool.close_async()
+
+    async def _resolved(self, value: Any) -> Any:
+        return value
+
+    def _execute(self, request: GraphRequest) -> Any:
+        # Not a coroutine function: the request is timed from the moment the API method
+        # hands it over, not from when the returned coroutine is awaited.
+        if not self._hooks:
+            return self._execute_request(request)
+        return self._execute_traced(request, begin_request(request))
+
+    async def _execute_traced(self, request: GraphRequest, timing: RequestTiming) -> Any:
+        token = _current_timing.set(timing)
+        try:
+            return await self._execute_request(request)
+        finally:
+            _current_timing.reset(token)
+
+    async def _execute_request(self, request: GraphRequest) -> Any:
+        suppression = self._suppression
+        if suppression is None or request.recipient_id is None:
+            return await self._execute_outboxed(request)
+        from .suppression import _suppressed_error
+
+        error = _suppressed_error(suppression, request.recipient_id)
+        if error is not None:
+            raise error
+        try:
+            return await self._execute_outboxed(request)
+        except PermanentError as error:
+            suppression.learn(request.recipient_id, error)
+            raise
+
+    async def _execute_outboxed(self, request: GraphRequest) -> Any:
+        outbox = self._outbox
+        if outbox is None or not outbox.accepts(request):
+            return request.finish(await self._send_with_retries(request))
+
+        import asyncio
+        import contextvars
+
+        # The outbox blocks until its writes are committed: run them on threads, so that
+        # the writes of concurrent requests are committed together. The thread sees the
+        # idempotency_key() of the caller.
+        loop = asyncio.get_running_loop()
+        request, entry = await loop.run_in_executor(
+            None, contextvars.copy_context().run, outbox.begin, request)
+        if entry.done:
+            return request.finish(entry.response_body)
+        failures = []
+        try:
+            response_body = await self._send_with_retries(request, failures)
+        except PermanentError as error:
+            await loop.run_in_executor(None, outbox.fail, request.idempotency_key, error)
+            raise
+        except BaseException as error:
+            aiohttp = _import_aiohttp()
+            sent = error not in failures or any(
+                _reached_server_async(failure, aiohttp) for failure in failures)
+            await loop.run_in_executor(None, outbox.abandon, request.idempotency_key, sent)
+            raise
+        await loop.run_in_executor(None, outbox.complete, request.idempotency_key, response_body)
+        return request.finish(response_body)
+
+    async def _send_with_retries(self, request: GraphRequest, failures: list | None = None) -> Any:
+        import asyncio
+
+        aiohttp = _import_aiohttp()
+        attempt = 1
+        while True:
+            try:
+                return await self._attempt(request)
+            except (GraphApiError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+                if failures is not None:
+                    failures.append(error)
+                delay = self._retry_policy.delay_for(attempt, error)
+                if delay is None or not request.replayable or (
+                        not request.resendable and _reached_server_async(error, aiohttp)):
+                    raise
+            if self._metrics is not None:
+                self._metrics.add_retry(request.operation)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _attempt(self, request: GraphRequest) -> Any:
+        if self._metrics is None and not self._hooks:
+            return await self._send(request)
+        import asyncio
+
+        aiohttp = _import_aiohttp()
+        stats = self._attempt_started(request)
+        started_at = time.perf_counter()
+        try:
+            response_body = await self._send(request)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+            self._attempt_finished(request, stats, started_at, CONNECTION_ERROR, error=error)
+            raise
+        except BaseException as error:
+            self._attempt_finished(request, stats, started_at, outcome_of(error), error=error)
+            raise
+        self._attempt_finished(request, stats, started_at, SUCCESS, response_body)
+        return response_body
+
+    async def _send(self, request: GraphRequest) -> Any:
+        aiohttp = _import_aiohttp()
+        session = self._aiohttp_session or self._pool.aiohttp_session()
+        timing = _current_timing.get()
+
+        with ExitStack() as stack:
+            started_at = time.perf_counter()
+            if request.is_form:
+                data = aiohttp.FormData()
+                size = 0
+                for name, value in (request.fields or {}).items():
+                    data.add_field(name, value)
+                    size += len(value)
+                for name, part in (request.files or {}).items():
+                    reader = part.open(stack)
+                    size += reader.length or 0
+                    data.add_field(
+                        name,
+                        reader_payload(aiohttp, reader, content_type=part.mimetype),
+                        filename=part.filename,
+                        content_type=part.mimetype,
+                    )
+                self._count_bytes(request, size)
+                payload = {"data": data}
+            elif request.json is None:
+                payload = {}
+            else:
+                body = request.json if isinstance(request.json, bytes) else encode_json(request.json)
+                self._count_bytes(request, len(body))
+                payload = {"data": body, "headers": {"content-type": "application/json"}}
+            record_phase("encode", started_at)
+
+            if self._rate_limiter is not None:
+                started_at = time.perf_counter()
+                await self._rate_limiter.acquire_async()
+                record_phase("rate_limit", started_at)
+            if timing is not None:
+                payload["trace_request_ctx"] = timing
+                connection_time = timing.connection_time
+            started_at = time.perf_counter()
+            async with session.request(
+                request.method,
+                request.url,
+                params={"access_token": self.get_access_token()},
+                timeout=aiohttp.ClientTimeout(total=self._timeout),
+                **payload,
+            ) as response:
+                if timing is not None:
+                    timing.add("server", time.perf_counter() - started_at
+                               - (timing.connection_time - connection_time))
+                if self._rate_limiter is not None:
+                    self._rate_limiter.update(response.headers)
+                started_at = time.perf_counter()
+                content = await response.read()
+                record_phase("read", started_at)
+                return _timed_decode(response.status, response.headers, content)
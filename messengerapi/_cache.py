@@ -0,0 +1,54 @@
+"""A bounded in-memory cache whose entries expire."""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+MISSING = object()
+
+
+class TTLCache:
+    """A mapping trusted for ttl seconds per entry, evicting the least recently used past max_entries."""
+
+    def __init__(self, ttl: float, max_entries: Optional[int] = None) -> None:
+        if ttl <= 0:
+            raise ValueError("ttl must be greater than 0")
+        if max_entries is not None and max_entries <= 0:
+            raise ValueError("max_entries must be greater than 0")
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any:
+        """Return the value of key, or MISSING if it was never set or has expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self._ttl)
+            self._entries.move_to_end(key)
+            if self._max_entries is not None and len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,88 @@
+"""JSON encoding of request bodies, splicing pre-encoded fragments in verbatim."""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from typing import Any
+
+# The placeholders of fragments, compiled once: the token of the call is checked in each
+# match, a string of the value that happens to look like a placeholder is left alone.
+_PLACEHOLDER = re.compile(r'"fragment:([0-9a-f]{32}):(\d+)"')
+
+
+class JsonFragment:
+    """An immutable, already JSON-encoded value.
+
+    Request bodies may contain fragments anywhere a value is expected, they are copied
+    into the encoded body as is instead of being walked and encoded again.
+    """
+
+    __slots__ = ("_json",)
+
+    def __init__(self, encoded: str | bytes) -> None:
+        object.__setattr__(self, "_json", encoded.decode() if isinstance(encoded, bytes) else encoded)
+
+    @classmethod
+    def encode(cls, value: Any) -> JsonFragment:
+        """Return the fragment of a value, which may itself contain fragments."""
+        if isinstance(value, JsonFragment):
+            return value
+        if hasattr(value, "compile"):
+            return value.compile()
+        return cls(dumps(value))
+
+    @property
+    def json(self) -> str:
+        return self._json
+
+    def loads(self) -> Any:
+        """Decode the fragment back into dicts and lists."""
+        return json.loads(self._json)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("JsonFragment is immutable")
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, JsonFragment):
+            return NotImplemented
+        return self._json == other._json
+
+    def __hash__(self) -> int:
+        return hash(self._json)
+
+    def __repr__(self) -> str:
+        return f"JsonFragment({self._json!r})"
+
+
+def dumps(value: Any) -> str:
+    """Encode value compactly, copying the JsonFragment it contains verbatim.
+
+    The encoder turns each fragment into a placeholder string unique to this call, which is
+    then replaced by the fragment, so nothing but the outer value is walked.
+    """
+    fragments: list[str] = []
+    token = os.urandom(16).hex()
+
+    def default(obj: Any) -> Any:
+        if isinstance(obj, JsonFragment):
+            fragments.append(obj.json)
+            return f"fragment:{token}:{len(fragments) - 1}"
+        if hasattr(obj, "compile"):
+            fragments.append(obj.compile().json)
+            return f"fragment:{token}:{len(fragments) - 1}"
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    encoded = json.dumps(value, separators=(",", ":"), default=default)
+    if not fragments:
+        return encoded
+
+    def splice(match: re.Match) -> str:
+        return fragments[int(match[2])] if match[1] == token else match[0]
+
+    return _PLACEHOLDER.sub(splice, encoded)
+
+
+def encode(value: Any) -> bytes:
+    return dumps(value).encode()
@@ -0,0 +1,247 @@
+"""Readers streaming attachment content into multipart requests without copying it whole."""
+
+from __future__ import annotations
+
+import io
+import mmap
+import os
+from contextlib import ExitStack
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from ._mime import SNIFF_SIZE, detect_file_mimetype, mimetype_from_extension, sniff_mimetype
+
+# Files at least this large are memory-mapped rather than read through a file object.
+MMAP_THRESHOLD = 8 << 20
+
+ProgressCallback = Callable[[int, Optional[int]], Any]
+
+
+class _ProgressReader(io.RawIOBase):
+    """Base of the readers below: counts bytes read and reports them to a callback."""
+
+    def __init__(self, length: int | None, progress: ProgressCallback | None) -> None:
+        super().__init__()
+        self._length = length
+        self._progress = progress
+        self._sent = 0
+
+    @property
+    def length(self) -> int | None:
+        """The total number of bytes, None if unknown."""
+        return self._length
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        size = self._readinto(memoryview(buffer).cast("B"))
+        if size:
+            self._sent += size
+            if self._progress is not None:
+                self._progress(self._sent, self._length)
+        return size
+
+    def _readinto(self, buffer: memoryview) -> int:
+        raise NotImplementedError
+
+    def tell(self) -> int:
+        return self._sent
+
+    def __len__(self) -> int:
+        # MultipartEncoder computes the Content-Length as len() - tell().
+        if self._length is None:
+            raise TypeError("the length of this stream is unknown")
+        return self._length
+
+
+class BufferReader(_ProgressReader):
+    """Read a bytes-like object, such as a memory-mapped file, chunk by chunk."""
+
+    def __init__(self, buffer: Any, progress: ProgressCallback | None = None) -> None:
+        self._view = memoryview(buffer).cast("B")
+        super().__init__(len(self._view), progress)
+
+    def _readinto(self, buffer: memoryview) -> int:
+        size = min(len(buffer), len(self._view) - self._sent)
+        buffer[:size] = self._view[self._sent:self._sent + size]
+        return size
+
+    def close(self) -> None:
+        self._view.release()
+        super().close()
+
+
+class FileReader(_ProgressReader):
+    """Read an open binary file object."""
+
+    def __init__(self, file_data: Any, length: int | None, progress: ProgressCallback | None = None) -> None:
+        super().__init__(length, progress)
+        self._file_data = file_data
+
+    def _readinto(self, buffer: memoryview) -> int:
+        if hasattr(self._file_data, "readinto"):
+            return self._file_data.readinto(buffer) or 0
+        chunk = self._file_data.read(len(buffer))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+
+class IterReader(_ProgressReader):
+    """Read an iterable of bytes-like chunks, of unknown total length."""
+
+    def __init__(self, chunks: Iterable[Any], progress: ProgressCallback | None = None) -> None:
+        super().__init__(None, progress)
+        self._chunks: Iterator[Any] = iter(chunks)
+        self._pending = memoryview(b"")
+
+    def _readinto(self, buffer: memoryview) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk).cast("B")
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+_reader_payload_class: Any = None
+
+
+def reader_payload(aiohttp: Any, reader: _ProgressReader, **kwargs: Any) -> Any:
+    """Wrap a reader in an aiohttp payload, sent with a Content-Length when it is known."""
+    global _reader_payload_class
+    if _reader_payload_class is None:
+        class ReaderPayload(aiohttp.payload.IOBasePayload):
+            @property
+            def size(self) -> int | None:
+                return self._value.length
+
+        _reader_payload_class = ReaderPayload
+    return _reader_payload_class(reader, **kwargs)
+
+
+def is_replayable(source: Any) -> bool:
+    """Whether a source can be read again, to retry a failed upload."""
+    if isinstance(source, (str, os.PathLike, bytes, bytearray, memoryview)):
+        return True
+    return hasattr(source, "seekable") and source.seekable()
+
+
+def start_offset(source: Any) -> int | None:
+    """The position a seekable file object is read from, to rewind it before a retry."""
+    if hasattr(source, "read") and hasattr(source, "seekable") and source.seekable():
+        return source.tell()
+    return None
+
+
+def open_source(source: Any, stack: ExitStack, progress: ProgressCallback | None = None,
+    offset: int | None = None
+) -> _ProgressReader:
+    """Return a reader of an attachment source, registering its cleanup on stack.
+
+    A source is a path, a bytes-like object, a binary file object or an iterable of bytes.
+    Files of MMAP_THRESHOLD bytes or more are memory-mapped. File objects are read from
+    offset if given, so that a retried upload starts over.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        file_data = stack.enter_context(open(source, "rb"))
+        size = os.fstat(file_data.fileno()).st_size
+        if size < MMAP_THRESHOLD:
+            return stack.enter_context(FileReader(file_data, size, progress))
+        mapped = stack.enter_context(mmap.mmap(file_data.fileno(), 0, access=mmap.ACCESS_READ))
+        return stack.enter_context(BufferReader(mapped, progress))
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return stack.enter_context(BufferReader(source, progress))
+    if hasattr(source, "read"):
+        if offset is not None:
+            source.seek(offset)
+        return FileReader(source, _remaining_length(source), progress)
+    if isinstance(source, Iterable):
+        return IterReader(source, progress)
+    raise TypeError(
+        "an attachment must be a path, a bytes-like object, a binary file object "
+        f"or an iterable of bytes, not {type(source)}"
+    )
+
+
+def detect_source_mimetype(source: Any, filename: str | None = None) -> tuple[Any, str]:
+    """Return the MIME type of a source, from filename or else its first bytes.
+
+    Iterables are consumed while sniffing, so the returned source must be used instead.
+    """
+    mimetype = mimetype_from_extension(filename or "")
+    if mimetype is not None:
+        return source, mimetype
+
+    if isinstance(source, (str, os.PathLike)):
+        return source, detect_file_mimetype(os.fspath(source))
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source, sniff_mimetype(memoryview(source).cast("B")[:SNIFF_SIZE])
+    if hasattr(source, "read"):
+        if not (hasattr(source, "seekable") and source.seekable()):
+            return source, "application/octet-stream"
+        position = source.tell()
+        head = source.read(SNIFF_SIZE)
+        source.seek(position)
+        return source, sniff_mimetype(head)
+    if isinstance(source, Iterable):
+        chunks = iter(source)
+        head = bytearray()
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= SNIFF_SIZE:
+                break
+        return _Chained(bytes(head), chunks), sniff_mimetype(head)
+    raise TypeError(f"cannot detect the MIME type of {type(source)}")
+
+
+class _Chained:
+    """An iterable yielding head before the rest of chunks."""
+
+    def __init__(self, head: bytes, chunks: Iterator[Any]) -> None:
+        self._head = head
+        self._chunks = chunks
+
+    def __iter__(self) -> Iterator[Any]:
+        if self._head:
+            yield self._head
+        yield from self._chunks
+
+
+def _remaining_length(file_data: Any) -> int | None:
+    try:
+        return os.fstat(file_data.fileno()).st_size - file_data.tell()
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        pass
+    if hasattr(file_data, "seekable") and file_data.seekable():
+        position = file_data.tell()
+        end = file_data.seek(0, io.SEEK_END)
+        file_data.seek(position)
+        return end - position
+    return None
+
+
+def iter_multipart(fields: dict[str, Any], boundary: str, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+    """Encode multipart/form-data as a stream, for parts of unknown length.
+
+    fields maps names to strings or to (filename, reader, mimetype) tuples.
+    """
+    for name, value in fields.items():
+        if isinstance(value, tuple):
+            filename, reader, mimetype = value
+            filename = filename.replace('"', "%22")
+            yield (
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                f'filename="{filename}"\r\nContent-Type: {mimetype}\r\n\r\n'
+            ).encode()
+            for chunk in iter(lambda: reader.read(chunk_size), b""):
+                yield chunk
+            yield b"\r\n"
+        else:
+            yield (
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                f"{value}\r\n"
+            ).encode()
+    yield f"--{boundary}--\r\n".encode()
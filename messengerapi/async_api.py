@@ -0,0 +1,287 @@
+"""Asyncio versions of the Send, Profile and Attachment Upload API wrappers.
+
+They need the optional aiohttp dependency:
+``pip install messenger-api-python[async]``.
+"""
+
+import asyncio
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Mapping, Optional, Union
+
+from ._base_api import AsyncBaseApiClient
+from .attachment_upload_api import AttachmentUploadApi, UploadResult, _attachment_id, _dedupe_key
+from ._cache import MISSING
+from .batch import MAX_BATCH_SIZE, GraphBatch
+from .constants import MessagingType, NotificationType
+from .exceptions import GraphApiError
+from .messenger_profile_api import PROFILE_FIELDS, ProfileApi, UserMenuResult, _user_chunks, _user_menu_result
+from .send_api import BroadcastResult, EncodedMessage, SendApi
+from .user_profile_api import UserProfileApi, _validate_user_id
+
+
+async def _aiter(items: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+class AsyncSendApi(AsyncBaseApiClient, SendApi):
+    """SendApi whose methods return awaitables.
+
+    Example:
+        async with AsyncSendApi(<page_access_token>) as send_api:
+            await send_api.send_text_message(<message>, <recipient_id>)
+    """
+
+    async def send_batch_image_attachments(self, image_urls: list, recipient_id: str):
+        return await self._image_batch(image_urls, recipient_id).execute_async()
+
+    def broadcast(self, message: dict, recipients: Union[Iterable[str], AsyncIterable[str]],
+        messaging_type: str = MessagingType.UPDATE,
+        notification_type: str = NotificationType.REGULAR,
+        tag: Optional[str] = None, max_in_flight: int = 100,
+        idempotency_key: Optional[str] = None
+    ) -> AsyncIterator[BroadcastResult]:
+        """Like SendApi.broadcast(), recipients may also be an async iterable.
+
+        Not a coroutine function: like the sync version, the message is validated when
+        broadcast() is called, before anything is sent.
+        """
+        prepared = self._prepare_broadcast(message, messaging_type, notification_type, tag, max_in_flight)
+        return self._send_concurrently(
+            ((recipient_id, self._broadcast_request(prepared, recipient_id, idempotency_key))
+             async for recipient_id in _aiter(recipients)),
+            max_in_flight,
+        )
+
+    def send_encoded_messages(self, messages: Union[Iterable[EncodedMessage], AsyncIterable[EncodedMessage]],
+        max_in_flight: int = 100, idempotency_key: Optional[str] = None
+    ) -> AsyncIterator[BroadcastResult]:
+        """Like SendApi.send_encoded_messages(), messages may also be an async iterable."""
+        if max_in_flight <= 0:
+            raise ValueError("max_in_flight must be greater than 0")
+        return self._send_concurrently(
+            ((recipient_id, self._encoded_request(recipient_id, request_body, idempotency_key))
+             async for recipient_id, request_body in _aiter(messages)),
+            max_in_flight,
+        )
+
+    async def _send_concurrently(self, requests: AsyncIterable, max_in_flight: int
+    ) -> AsyncIterator[BroadcastResult]:
+        in_flight = {}
+        try:
+            async for recipient_id, request in requests:
+                if len(in_flight) >= max_in_flight:
+                    done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield _broadcast_result(in_flight.pop(task), task)
+                in_flight[asyncio.ensure_future(self._execute(request))] = recipient_id
+
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield _broadcast_result(in_flight.pop(task), task)
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+
+class AsyncProfileApi(AsyncBaseApiClient, ProfileApi):
+    """ProfileApi whose methods return awaitables."""
+
+    def sync_profile(self, profile: Mapping[str, Any]):
+        # Bound to a GraphBatch, the requests are queued synchronously like the sync client's.
+        if self._deferred:
+            return super().sync_profile(profile)
+        return self._sync_profile(profile)
+
+    async def _sync_profile(self, profile: Mapping[str, Any]):
+        if self._profile_unknown(PROFILE_FIELDS):
+            await self.get_profile()
+        requests, changes = self._sync_profile_requests(profile)
+        for request in requests:
+            await self._execute(request)
+        return changes
+
+    async def _send_user_batches(self, requests: Iterable, max_in_flight: int
+    ) -> AsyncIterator[UserMenuResult]:
+        in_flight = set()
+        try:
+            for chunk, skipped in _user_chunks(requests):
+                for result in skipped:
+                    yield result
+                if not chunk:
+                    continue
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        for result in task.result():
+                            yield result
+                in_flight.add(asyncio.ensure_future(self._send_user_batch(chunk)))
+
+            while in_flight:
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    for result in task.result():
+                        yield result
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    async def _send_user_batch(self, chunk: list) -> list:
+        batch = GraphBatch(self)
+        for _, request in chunk:
+            batch.add(request)
+        try:
+            results = await batch.execute_async()
+        except Exception as error:
+            return [UserMenuResult(user_id, error=error) for user_id, _ in chunk]
+        return [_user_menu_result(user_id, result) for (user_id, _), result in zip(chunk, results)]
+
+    def _set_profile(self, operation: str, fields: dict):
+        if self._deferred:
+            return self._post_profile(operation, fields)
+        return self._set_profile_async(operation, fields)
+
+    async def _set_profile_async(self, operation: str, fields: dict):
+        if self._skip_unchanged and self._profile_unknown(fields):
+            await self.get_profile()
+        return await self._post_profile(operation, fields)
+
+    def _set_user_persistent_menu(self, user_id: str, persistent_menu: list):
+        if self._deferred:
+            return self._post_user_persistent_menu(user_id, persistent_menu)
+        return self._set_user_persistent_menu_async(user_id, persistent_menu)
+
+    async def _set_user_persistent_menu_async(self, user_id: str, persistent_menu: list):
+        if self._skip_unchanged and self._user_menu_unknown(user_id):
+            await self.get_user_persistent_menu(user_id)
+        return await self._post_user_persistent_menu(user_id, persistent_menu)
+
+
+class AsyncUserProfileApi(AsyncBaseApiClient, UserProfileApi):
+    """UserProfileApi whose methods return awaitables.
+
+    The lookups missing from the cache started in the same event loop iteration are
+    fetched together, in batch requests of up to 50 users.
+    """
+
+    def __init__(self, page_access_token: str, **kwargs) -> None:
+        super().__init__(page_access_token, **kwargs)
+        self._pending: list = []
+        self._fetches: set = set()
+
+    def get_user_profile(self, user_id: str):
+        if self._deferred:
+            return super().get_user_profile(user_id)
+        return self._lookup(_validate_user_id(user_id))
+
+    async def _lookup(self, user_id: str):
+        profile = self._cache.get(user_id)
+        if profile is not MISSING:
+            return profile
+        future, owner = self._join_lookup(user_id)
+        if owner:
+            self._pending.append((user_id, future))
+            if len(self._pending) == 1:
+                asyncio.get_running_loop().call_soon(self._flush)
+        # A cancelled caller must not cancel the lookup the others are waiting on.
+        return await asyncio.shield(future)
+
+    async def get_user_profiles(self, user_ids: Iterable[str]) -> dict:
+        user_ids = list(dict.fromkeys(map(_validate_user_id, user_ids)))
+        profiles = await asyncio.gather(*map(self.get_user_profile, user_ids), return_exceptions=True)
+        return dict(zip(user_ids, profiles))
+
+    def _new_lookup(self) -> asyncio.Future:
+        return asyncio.get_running_loop().create_future()
+
+    def _flush(self) -> None:
+        pending, self._pending = self._pending, []
+        for start in range(0, len(pending), MAX_BATCH_SIZE):
+            task = asyncio.ensure_future(self._fetch_pending(pending[start:start + MAX_BATCH_SIZE]))
+            self._fetches.add(task)
+            task.add_done_callback(self._fetches.discard)
+
+    async def _fetch_pending(self, chunk: list) -> None:
+        try:
+            outcomes = await self._fetch([user_id for user_id, _ in chunk])
+        except BaseException as error:
+            for user_id, future in chunk:
+                self._finish_lookup(user_id, future, error=error)
+            if not isinstance(error, Exception):
+                raise
+            return
+        for (user_id, future), outcome in zip(chunk, outcomes):
+            self._finish_outcome(user_id, future, outcome)
+
+    async def _fetch(self, user_ids: list) -> list:
+        if len(user_ids) == 1:
+            try:
+                return [await self._execute(self._profile_request(user_ids[0]))]
+            except GraphApiError as error:
+                return [error]
+        batch = GraphBatch(self)
+        for user_id in user_ids:
+            batch.add(self._profile_request(user_id))
+        return await batch.execute_async()
+
+
+class AsyncAttachmentUploadApi(AsyncBaseApiClient, AttachmentUploadApi):
+    """AttachmentUploadApi whose methods return awaitables."""
+
+    def upload_many(self, asset_type: str, sources: Union[Iterable, AsyncIterable],
+        max_in_flight: int = 100
+    ) -> AsyncIterator[UploadResult]:
+        """Like AttachmentUploadApi.upload_many(), sources may also be an async iterable.
+
+        Not a coroutine function: like the sync version, the arguments are checked when
+        upload_many() is called.
+        """
+        self._validate_upload_many(asset_type, max_in_flight)
+        return self._upload_many(asset_type, sources, max_in_flight)
+
+    async def _upload_many(self, asset_type: str, sources: Union[Iterable, AsyncIterable],
+        max_in_flight: int
+    ) -> AsyncIterator[UploadResult]:
+        in_flight = {}
+        seen = set()
+        try:
+            async for source in _aiter(sources):
+                key = _dedupe_key(source)
+                if key is not None:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                if len(in_flight) >= max_in_flight:
+                    done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield _upload_result(in_flight.pop(task), task)
+                in_flight[asyncio.ensure_future(self._upload_one(asset_type, source))] = source
+
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield _upload_result(in_flight.pop(task), task)
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    async def _upload_one(self, asset_type: str, source):
+        return _attachment_id(await self._upload_source(asset_type, source))
+
+
+def _broadcast_result(recipient_id: str, task: asyncio.Future) -> BroadcastResult:
+    error = task.exception()
+    if error is not None:
+        return BroadcastResult(recipient_id, error=error)
+    return BroadcastResult(recipient_id, task.result())
+
+
+def _upload_result(source, task: asyncio.Future) -> UploadResult:
+    error = task.exception()
+    if error is not None:
+        return UploadResult(source, error=error)
+    return UploadResult(source, task.result())
@@ -0,0 +1,161 @@
+"""A persistent cache of uploaded attachments, to avoid uploading the same content twice."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Callable
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+class AttachmentCache:
+    """Maps uploaded content to the attachment_id Facebook returned for it, in SQLite.
+
+    Local files are keyed by the hash of their content, remote files by their url and an
+    optional validator, such as an ETag or a version, that changes with the content.
+
+    Args:
+        path (str, optional): The SQLite database file. Defaults to ":memory:", a cache
+            that only lasts as long as the process.
+        ttl (float, optional): Seconds an attachment_id is reused before uploading the content
+            again, None to keep it forever. Defaults to 30 days.
+        max_entries (int, optional): Entries kept before the least recently used are evicted.
+            Defaults to 100000.
+
+    Example:
+        cache = AttachmentCache("attachments.sqlite3")
+        send_api = SendApi(<page_access_token>, <page_id>, attachment_cache=cache)
+    """
+
+    _EVICTION_INTERVAL = 100
+    _MAX_FILE_DIGESTS = 4096
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        *,
+        ttl: float | None = 30 * 24 * 3600,
+        max_entries: int = 100_000,
+    ) -> None:
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be greater than 0")
+        if max_entries <= 0:
+            raise ValueError("max_entries must be greater than 0")
+
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._file_digests: dict[tuple[str, int, int], str] = {}
+        import sqlite3
+
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS attachments ("
+            " key TEXT PRIMARY KEY,"
+            " attachment_id TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " used_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS attachments_used_at ON attachments (used_at)")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def get(self, key: str) -> str | None:
+        """Return the attachment_id cached for key, None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT attachment_id, created_at FROM attachments WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self._ttl is not None and row[1] < now - self._ttl:
+                self._connection.execute("DELETE FROM attachments WHERE key = ?", (key,))
+                return None
+            self._connection.execute(
+                "UPDATE attachments SET used_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def put(self, key: str, attachment_id: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO attachments VALUES (?, ?, ?, ?)",
+                (key, attachment_id, now, now),
+            )
+            self._puts += 1
+            if self._puts % self._EVICTION_INTERVAL == 0:
+                self._evict(now)
+
+    def discard(self, key: str) -> None:
+        """Forget an entry, e.g. after Facebook rejected its attachment_id."""
+        with self._lock:
+            self._connection.execute("DELETE FROM attachments WHERE key = ?", (key,))
+
+    def file_key(self, scope: str, asset_type: str, file_location: str) -> str:
+        """Return the key of a local file, from the hash of its content."""
+        stat = os.stat(file_location)
+        file_id = (os.path.abspath(file_location), stat.st_mtime_ns, stat.st_size)
+        digest = self._file_digests.get(file_id)
+        if digest is None:
+            sha256 = hashlib.sha256()
+            with open(file_location, "rb") as file_data:
+                for chunk in iter(lambda: file_data.read(_HASH_CHUNK_SIZE), b""):
+                    sha256.update(chunk)
+            if len(self._file_digests) >= self._MAX_FILE_DIGESTS:
+                self._file_digests.clear()
+            digest = self._file_digests[file_id] = sha256.hexdigest()
+        return f"{scope}:{asset_type}:sha256:{digest}"
+
+    def data_key(self, scope: str, asset_type: str, data: Any) -> str:
+        """Return the key of in-memory content, from its hash."""
+        return f"{scope}:{asset_type}:sha256:{hashlib.sha256(data).hexdigest()}"
+
+    def source_key(self, scope: str, asset_type: str, source: Any) -> str | None:
+        """Return the key of a path or bytes-like source, None for streams."""
+        if isinstance(source, (str, os.PathLike)):
+            return self.file_key(scope, asset_type, os.fspath(source))
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return self.data_key(scope, asset_type, source)
+        return None
+
+    def url_key(self, scope: str, asset_type: str, url: str, validator: str | None = None) -> str:
+        """Return the key of a remote file, from its url and validator."""
+        return f"{scope}:{asset_type}:url:{url}#{validator or ''}"
+
+    def remember(self, key: str) -> Callable[[Any], Any]:
+        """Return a GraphRequest parse hook storing the attachment_id of the response."""
+        def parse(response_body: Any) -> Any:
+            attachment_id = (
+                response_body.get("attachment_id") if isinstance(response_body, dict)
+                else response_body
+            )
+            if attachment_id:
+                self.put(key, attachment_id)
+            return response_body
+        return parse
+
+    def _evict(self, now: float) -> None:
+        if self._ttl is not None:
+            self._connection.execute(
+                "DELETE FROM attachments WHERE created_at < ?", (now - self._ttl,))
+        self._connection.execute(
+            "DELETE FROM attachments WHERE key IN ("
+            " SELECT key FROM attachments ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (self._max_entries,),
+        )
+
+
+def cache_scope(page_id: str | None, page_access_token: str) -> str:
+    """Attachment ids belong to a page, scope keys by page id, or else by token."""
+    if page_id is not None:
+        return page_id
+    return "token-" + hashlib.sha256(page_access_token.encode()).hexdigest()[:16]
@@ -1,22 +1,49 @@
 """Wrapper for the Attachment Upload API"""
 
-import os
+import hashlib
 import json
+import os
+import time
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, NamedTuple, Optional
+
+from ._base_api import BaseApiClient, FilePart, GraphRequest
+from ._streams import detect_source_mimetype, start_offset
+from .attachment_cache import AttachmentCache, cache_scope
+from .constants import API_VERSION, ASSET_TYPES
+from .hooks import record_phase, traced
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
 
-import magic
-from requests_toolbelt import MultipartEncoder
+class UploadResult(NamedTuple):
+    """The outcome of upload_many() for one source."""
 
-from ._base_api import BaseApiClient
-from .constants import API_VERSION
+    source: Any
+    attachment_id: Optional[str] = None
+    error: Optional[BaseException] = None
 
 
 class AttachmentUploadApi(BaseApiClient):
-    def __init__(self, page_access_token: str, page_id: str, *, timeout: float = 30.0) -> None:
-        super().__init__(page_access_token, timeout=timeout)
+    def __init__(self, page_access_token: str, page_id: str, *, timeout: float = 30.0,
+        attachment_cache: Optional[AttachmentCache] = None, **kwargs
+    ) -> None:
+        """
+        Args:
+            page_access_token (str): The page access token.
+            page_id (str): The page id.
+            timeout (float, optional): The timeout of each request, in seconds. Defaults to 30.
+            attachment_cache (AttachmentCache, optional): Where uploads are remembered, so
+                uploading the same content again returns its saved attachment_id.
+            Other keyword arguments are passed to BaseApiClient.
+        """
+        super().__init__(page_access_token, timeout=timeout, **kwargs)
         if not isinstance(page_id, str) or not page_id.strip():
             raise ValueError("page_id must be a non-empty string")
+        self.__attachment_cache = attachment_cache
+        self.__cache_scope = cache_scope(page_id, page_access_token)
         self.__graph_version = API_VERSION
-        self.__api_url = f"https://graph.facebook.com/v{self.__graph_version}/{page_id}/message_attachments"
+        self.__api_url = f"{self.get_graph_url()}/v{self.__graph_version}/{page_id}/message_attachments"
 
     def get_api_url(self):
         return self.__api_url
@@ -27,69 +54,173 @@ class AttachmentUploadApi(BaseApiClient):
     def get_graph_version(self):
         return self.__graph_version
 
-    def upload_remote_image(self, image_url: str):
-        return self.__upload_remote_attachement("image", image_url)
+    @traced
+    def upload_remote_image(self, image_url: str, validator: Optional[str] = None):
+        return self.__upload_remote_attachement("image", image_url, validator)
 
-    def upload_remote_video(self, video_url: str):
-        return self.__upload_remote_attachement("video", video_url)
+    @traced
+    def upload_remote_video(self, video_url: str, validator: Optional[str] = None):
+        return self.__upload_remote_attachement("video", video_url, validator)
 
-    def upload_remote_audio(self, audio_url: str):
-        return self.__upload_remote_attachement("audio", audio_url)
+    @traced
+    def upload_remote_audio(self, audio_url: str, validator: Optional[str] = None):
+        return self.__upload_remote_attachement("audio", audio_url, validator)
 
-    def upload_remote_file(self, file_url: str):
-        return self.__upload_remote_attachement("file", file_url)
+    @traced
+    def upload_remote_file(self, file_url: str, validator: Optional[str] = None):
+        return self.__upload_remote_attachement("file", file_url, validator)
 
+    @traced
     def upload_local_image(self, image_location: str):
         """Upload local image to send it later.
         """
         return self.__upload_local_attachment("image", image_location)
 
+    @traced
     def upload_local_video(self, video_location: str):
         """Upload local video to send it later.
         """
         return self.__upload_local_attachment("video", video_location)
 
+    @traced
     def upload_local_audio(self, audio_location: str):
         """Upload local audio to send it later.
         """
         return self.__upload_local_attachment("audio", audio_location)
 
+    @traced
     def upload_local_file(self, file_location: str):
         """Upload local file to send it later.
         """
         return self.__upload_local_attachment("file", file_location)
 
+    @traced
+    def upload_attachment(self, asset_type: str, attachment,
+        filename: Optional[str] = None, mimetype: Optional[str] = None, progress=None
+    ):
+        """Upload an attachment from memory or a stream to send it later.
+
+        Args:
+            asset_type (str): One of "image", "video", "audio" or "file".
+            attachment: The content: bytes, bytearray, memoryview, a binary file object,
+                an iterable of bytes chunks or a file path. Large files are memory-mapped.
+            filename (str, optional): The file name. Defaults to "attachment".
+            mimetype (str, optional): The MIME type, detected from filename or the first bytes if None.
+            progress (callable, optional): Called as progress(bytes_sent, total_bytes) while
+                uploading, total_bytes is None for iterables.
+
+        Returns:
+            dict: The response body from Facebook's API server, with the attachment_id.
+        """
+        if asset_type not in ASSET_TYPES:
+            raise ValueError("asset_type must be one of image, video, audio, or file")
+        return self.__upload_attachment_source(asset_type, attachment, filename, mimetype, progress)
+
+    def upload_many(self, asset_type: str, sources: Iterable, max_in_flight: int = 10
+    ) -> Iterator[UploadResult]:
+        """Upload many attachments concurrently, e.g. to warm up a media catalog.
+
+        Identical sources are uploaded once, except for unhashable ones such as lists of bytes
+        chunks. Failures are reported per source instead of stopping the other uploads. The
+        arguments are checked when upload_many() is called, before anything is uploaded.
+
+        Args:
+            asset_type (str): One of "image", "video", "audio" or "file".
+            sources (iterable): The attachments, consumed lazily: http(s) URLs, or anything
+                upload_attachment() accepts.
+            max_in_flight (int, optional): The maximum number of concurrent uploads. Defaults to 10.
+
+        Yields:
+            UploadResult: The attachment_id or the error of each source, in completion order.
+
+        Example:
+            attachment_ids = {
+                result.source: result.attachment_id
+                for result in upload_api.upload_many("image", <image_locations>)
+                if result.error is None
+            }
+        """
+        self._validate_upload_many(asset_type, max_in_flight)
+        return self._upload_many(asset_type, sources, max_in_flight)
+
+    def _upload_many(self, asset_type: str, sources: Iterable, max_in_flight: int
+    ) -> Iterator[UploadResult]:
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            in_flight = {}
+            for source in _unique(sources):
+                if len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield _upload_result(in_flight.pop(future), future)
+                in_flight[executor.submit(self._upload_one, asset_type, source)] = source
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield _upload_result(in_flight.pop(future), future)
+
+    def _validate_upload_many(self, asset_type: str, max_in_flight: int):
+        if asset_type not in ASSET_TYPES:
+            raise ValueError("asset_type must be one of image, video, audio, or file")
+        if max_in_flight <= 0:
+            raise ValueError("max_in_flight must be greater than 0")
+
+    def _upload_one(self, asset_type: str, source):
+        return _attachment_id(self._upload_source(asset_type, source))
+
+    def _upload_source(self, asset_type: str, source):
+        if isinstance(source, str) and source.startswith(("http://", "https://")):
+            return self.__upload_remote_attachement(asset_type, source)
+        return self.__upload_attachment_source(asset_type, source)
+
     def __upload_local_attachment(self, asset_type: str, file_location: str):
-        if os.path.basename(file_location).endswith(".pdf"):
-            mimetype = "application/octet-stream"
-        else:
-            mimetype = magic.Magic(mime=True).from_file(file_location)
-
-        with open(file_location, "rb") as file_data:
-            request_body = MultipartEncoder(
-                fields={
-                    "message": json.dumps({
-                        "attachment": {
-                            "type": asset_type,
-                            "payload": {
-                                "is_reusable": "true"
-                            }
+        return self.__upload_attachment_source(asset_type, file_location)
+
+    def __upload_attachment_source(self, asset_type: str, source,
+        filename: Optional[str] = None, mimetype: Optional[str] = None, progress=None
+    ):
+        cache_key = None
+        if self.__attachment_cache is not None:
+            cache_key = self.__attachment_cache.source_key(self.__cache_scope, asset_type, source)
+            attachment_id = None if cache_key is None else self.__attachment_cache.get(cache_key)
+            if attachment_id is not None:
+                return self._resolved({"attachment_id": attachment_id})
+
+        if mimetype is None:
+            started_at = time.perf_counter()
+            source, mimetype = detect_source_mimetype(source, filename)
+            record_phase("mime", started_at)
+
+        return self._execute(GraphRequest(
+            "POST",
+            self.get_api_url(),
+            f"upload_local_{asset_type}",
+            fields={
+                "message": json.dumps({
+                    "attachment": {
+                        "type": asset_type,
+                        "payload": {
+                            "is_reusable": "true"
                         }
-                    }),
-                    "filedata": (
-                        os.path.basename(file_location),
-                        file_data,
-                        mimetype
-                    )
-                }
-            )
-            return self._post_multipart(
-                self.get_api_url(),
-                request_body,
-                request_body.content_type,
-            )
-
-    def __upload_remote_attachement(self, asset_type: str, file_url: str):
+                    }
+                }),
+            },
+            files={"filedata": FilePart(source, mimetype, filename, progress, start_offset(source))},
+            parse=None if cache_key is None else self.__attachment_cache.remember(cache_key),
+            # Uploading twice only leaves an unused attachment.
+            idempotent=True,
+        ))
+
+    def __upload_remote_attachement(self, asset_type: str, file_url: str, validator: Optional[str] = None):
+        cache_key = None
+        if self.__attachment_cache is not None:
+            cache_key = self.__attachment_cache.url_key(self.__cache_scope, asset_type, file_url, validator)
+            attachment_id = self.__attachment_cache.get(cache_key)
+            if attachment_id is not None:
+                return self._resolved(attachment_id)
+
         request_body = {
             "message": {
                 "attachment": {
@@ -102,5 +233,50 @@ class AttachmentUploadApi(BaseApiClient):
             }
         }
 
-        response = self._post_json(self.get_api_url(), request_body)
-        return response["attachment_id"]
+        return self._execute(GraphRequest(
+            "POST",
+            self.get_api_url(),
+            f"upload_remote_{asset_type}",
+            json=request_body,
+            result_key="attachment_id",
+            parse=None if cache_key is None else self.__attachment_cache.remember(cache_key),
+            # Uploading twice only leaves an unused attachment.
+            idempotent=True,
+        ))
+
+
+def _unique(sources: Iterable) -> Iterator:
+    seen = set()
+    for source in sources:
+        key = _dedupe_key(source)
+        if key is None:
+            yield source
+        elif key not in seen:
+            seen.add(key)
+            yield source
+
+
+def _dedupe_key(source):
+    """Return the key identifying a source among the others, None if it cannot be compared."""
+    if isinstance(source, os.PathLike):
+        return os.fspath(source)
+    if isinstance(source, (bytearray, memoryview)):
+        return hashlib.sha256(source).digest()
+    try:
+        hash(source)
+    except TypeError:
+        return None
+    return source
+
+
+def _attachment_id(response) -> Optional[str]:
+    if isinstance(response, dict):
+        return response.get("attachment_id")
+    return response
+
+
+def _upload_result(source, future: "Future") -> UploadResult:
+    error = future.exception()
+    if error is not None:
+        return UploadResult(source, error=error)
+    return UploadResult(source, future.result())
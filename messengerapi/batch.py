@@ -0,0 +1,257 @@
+"""Graph Batch API support (https://developers.facebook.com/docs/graph-api/batch-requests)"""
+
+from __future__ import annotations
+
+import copy
+import dataclasses
+import json
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlencode, urlsplit
+
+from ._base_api import BaseApiClient, GraphRequest
+from ._json import dumps as dumps_json
+from .constants import API_VERSION
+from .exceptions import PermanentError, TransientError, error_from_response
+
+if TYPE_CHECKING:
+    from .suppression import SuppressionList
+
+MAX_BATCH_SIZE = 50
+
+
+class BatchItem:
+    """The pending result of one operation queued in a GraphBatch."""
+
+    __slots__ = ("request", "_result", "_error", "_done", "_suppression")
+
+    def __init__(self, request: GraphRequest | None) -> None:
+        self.request = request
+        self._result = None
+        self._error: BaseException | None = None
+        self._done = False
+        self._suppression: SuppressionList | None = None
+
+    def done(self) -> bool:
+        return self._done
+
+    def result(self) -> Any:
+        """Return the operation's result, the same value the direct call returns.
+
+        Raises:
+            GraphApiError: If the operation failed. Operations that Facebook could not
+                complete within the batch fail with a TransientError.
+            Exception: The error of the batch request carrying the operation, e.g. a
+                connection error, if it failed or was never sent because an earlier one did.
+        """
+        if not self._done:
+            raise RuntimeError("the batch has not been executed yet")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def exception(self) -> BaseException | None:
+        if not self._done:
+            raise RuntimeError("the batch has not been executed yet")
+        return self._error
+
+    def _resolve(self, result: Any = None, error: BaseException | None = None) -> None:
+        self._result = result
+        self._error = error
+        self._done = True
+
+
+class GraphBatch:
+    """Pack calls from any API client into batch requests of up to 50 operations.
+
+    Args:
+        client (BaseApiClient): The client used to send the batch requests. Async clients
+            must use execute_async().
+
+    Example:
+        batch = GraphBatch(send_api)
+        batch.bind(send_api).send_text_message("Hello", recipient_id)
+        batch.bind(profile_api).set_persistent_menu(menu)
+        results = batch.execute()
+    """
+
+    def __init__(self, client: BaseApiClient) -> None:
+        self._client = client
+        self._items: list[BatchItem] = []
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def bind(self, api: BaseApiClient) -> BaseApiClient:
+        """Return a copy of api whose calls are queued in this batch.
+
+        Each call returns a BatchItem instead of sending a request.
+        """
+        deferred = copy.copy(api)
+        deferred._deferred = True
+        deferred._execute = lambda request: self._add_from(api, request)
+        deferred._resolved = self._add_resolved
+        return deferred
+
+    def add(self, request: GraphRequest, access_token: str | None = None) -> BatchItem:
+        """Queue a request, sent with access_token if it differs from the batch client's."""
+        if access_token is not None and access_token != self._client.get_access_token():
+            request = _with_access_token(request, access_token)
+        item = BatchItem(request)
+        self._items.append(item)
+        return item
+
+    def execute(self) -> list[Any]:
+        """Send every queued operation and return their results in queue order.
+
+        Failed operations are returned as their GraphApiError instead of a result. If a
+        batch request fails, the operations left are resolved with its error, which is raised.
+        """
+        items, chunks = self._drain()
+        try:
+            for _, batch_request in chunks:
+                self._client._execute(batch_request)
+        except BaseException as error:
+            _fail_pending(items, error)
+            raise
+        return [_outcome(item) for item in items]
+
+    async def execute_async(self) -> list[Any]:
+        """Like execute(), for async clients, sending the batch requests concurrently.
+
+        Every batch request is waited for; the operations of those that failed are resolved
+        with their error, and the first one is raised.
+        """
+        import asyncio
+
+        items, chunks = self._drain()
+        errors = await asyncio.gather(*(
+            self._execute_chunk_async(chunk, batch_request) for chunk, batch_request in chunks
+        ), return_exceptions=True)
+        for error in errors:
+            if error is not None:
+                raise error
+        return [_outcome(item) for item in items]
+
+    async def _execute_chunk_async(self, chunk: list[BatchItem], batch_request: GraphRequest) -> None:
+        try:
+            await self._client._execute(batch_request)
+        except BaseException as error:
+            _fail_pending(chunk, error)
+            raise
+
+    def _add_from(self, api: BaseApiClient, request: GraphRequest) -> BatchItem:
+        suppression = api._suppression
+        if suppression is None or request.recipient_id is None:
+            return self.add(request, api.get_access_token())
+        from .suppression import _suppressed_error
+
+        error = _suppressed_error(suppression, request.recipient_id)
+        if error is not None:
+            # Skipped sends keep their place in the results, like calls answered from a cache.
+            item = BatchItem(request)
+            item._resolve(error=error)
+            self._items.append(item)
+            return item
+        item = self.add(request, api.get_access_token())
+        item._suppression = suppression
+        return item
+
+    def _add_resolved(self, result: Any) -> BatchItem:
+        # Calls answered without a request, e.g. from a cache, keep their place in the results.
+        item = BatchItem(None)
+        item._resolve(result)
+        self._items.append(item)
+        return item
+
+    def _drain(self) -> tuple[list[BatchItem], list[tuple[list[BatchItem], GraphRequest]]]:
+        items, self._items = self._items, []
+        pending = [item for item in items if not item.done()]
+        chunks = [
+            pending[start:start + MAX_BATCH_SIZE] for start in range(0, len(pending), MAX_BATCH_SIZE)
+        ]
+        return items, [(chunk, _batch_request(chunk)) for chunk in chunks]
+
+
+def _fail_pending(items: list[BatchItem], error: BaseException) -> None:
+    for item in items:
+        if not item.done():
+            item._resolve(error=error)
+
+
+def _with_access_token(request: GraphRequest, access_token: str) -> GraphRequest:
+    separator = "&" if "?" in request.url else "?"
+    return dataclasses.replace(
+        request, url=f"{request.url}{separator}{urlencode({'access_token': access_token})}")
+
+
+def _batch_request(items: list[BatchItem]) -> GraphRequest:
+    operations = []
+    files = {}
+    for item in items:
+        request = item.request
+        url = urlsplit(request.url)
+        operation = {
+            "method": request.method,
+            "relative_url": url.path.lstrip("/") + (f"?{url.query}" if url.query else ""),
+        }
+
+        if request.is_form:
+            body = dict(request.fields or {})
+            attached = []
+            for part in (request.files or {}).values():
+                name = f"file{len(files)}"
+                files[name] = part
+                attached.append(name)
+            if attached:
+                operation["attached_files"] = ",".join(attached)
+        else:
+            request_body = request.json or {}
+            if isinstance(request_body, bytes):
+                request_body = json.loads(request_body)
+            body = {
+                key: value if isinstance(value, str) else dumps_json(value)
+                for key, value in request_body.items()
+            }
+        if body:
+            operation["body"] = urlencode(body)
+        operations.append(operation)
+
+    url = urlsplit(items[0].request.url)
+    return GraphRequest(
+        "POST",
+        f"{url.scheme}://{url.netloc}/v{API_VERSION}/",
+        "batch",
+        fields={"batch": json.dumps(operations), "include_headers": "false"},
+        files=files or None,
+        parse=lambda response_body: _fan_out(items, response_body),
+        idempotent=all(item.request.resendable for item in items),
+    )
+
+
+def _fan_out(items: list[BatchItem], responses: list[Any]) -> list[Any]:
+    if len(responses) < len(items):
+        # zip() alone would leave the operations past the last response unresolved.
+        _fail_pending(items[len(responses):], TransientError(
+            "the batch response has no response for the operation"))
+    for item, response in zip(items, responses):
+        if response is None:
+            item._resolve(error=TransientError(
+                "the operation was not processed within the batch request"))
+        else:
+            try:
+                response_body = json.loads(response.get("body") or "null")
+            except ValueError:
+                response_body = None
+            status = response.get("code", 200)
+            if status >= 400 or (isinstance(response_body, dict) and "error" in response_body):
+                error = error_from_response(status, response_body)
+                if item._suppression is not None and isinstance(error, PermanentError):
+                    item._suppression.learn(item.request.recipient_id, error)
+                item._resolve(error=error)
+            else:
+                item._resolve(item.request.finish(response_body))
+    return [_outcome(item) for item in items]
+
+
+def _outcome(item: BatchItem) -> Any:
+    return item._result if item._error is None else item._error
@@ -1,270 +1,437 @@
-"""A module containing various elements used when sending message in Messenger API."""
+"""A module containing various elements used when sending message in Messenger API.
+
+Element, Button and QuickReply objects are immutable: they are validated once, when created,
+their with_*() methods return a modified copy, and they can be compared, hashed and used as
+cache keys. Their former set_*() methods, which modified them in place, raise an AttributeError
+rather than be silently ignored. Elements, Buttons, QuickReplies and PersistentMenu are builders collecting them,
+which enforce the limits of the Messenger Platform as items are added.
+
+Every component can be compiled into a JsonFragment, encoded once and cached. Fragments and
+components can be given to SendApi and ProfileApi in place of their get_content(), they are
+spliced into request bodies without being encoded again.
+"""
+
+import copy
 
 from messengerapi import ButtonType
+from ._json import JsonFragment
 
+MAX_ELEMENTS = 10
+MAX_BUTTONS = 3
+MAX_QUICK_REPLIES = 13
+MAX_TITLE_LENGTH = 20
+MAX_ELEMENT_TEXT_LENGTH = 80
+MAX_PAYLOAD_LENGTH = 1000
 
-class Elements:
-    """A list of Element objects.
 
-    Attributes:
-        elements (str , private) : A list containing the content of each Element object.
+def _validate_text(value, field_name, max_length=None, allow_empty=False):
+    if not isinstance(value, str):
+        raise TypeError(f"type of param {field_name} must be str , not {type(value)}")
+    if not allow_empty and value == "":
+        raise ValueError(f"param {field_name} must be non empty")
+    if max_length is not None and len(value) > max_length:
+        raise ValueError(f"max characters for param {field_name} is {max_length}")
+    return value
 
-    Notes:
-        Use the add_element() method to add an Element object's content.
-        Use the get_content() method to get the content of the Elements object before using it in an generic message.
 
-        The maximum of elements is 10 , sending generic message with more than 10 elements will return an error message from Facebook API's server.
-    """
+def _validate_optional_text(value, field_name, max_length=None):
+    return None if value is None else _validate_text(value, field_name, max_length, allow_empty=True)
 
-    def __init__(self):
-        self.__elements = []
 
-    def add_element(self, element):
-        self.__elements.append(element)
+def _content(item):
+    return item.get_content() if hasattr(item, "get_content") else item
 
-    def get_content(self):
-        return self.__elements
 
+def _compile_list(items):
+    return JsonFragment("[" + ",".join(JsonFragment.encode(item).json for item in items) + "]")
 
-class Element:
-    def __init__(self, title="An element of a generic message.", subtitle=None, image_url=None, buttons=None):
-        """Represent one element (block , card) of a generic message
 
-        Args:
-            title (str, optional): The title of the element , use set_title() method to change its default value. Defaults to "An element of a generic message.".
-            subtitle (str, optional): The subtitle of the element , use set_subtitle() method to change its default value. Defaults to None.
-            image_url (str, optional): The url of the image to show in the element , use set_image_url() method to change its default value. Defaults to None.
-            buttons (list, optional): List of the buttons in the element , max supported is 3(?). Defaults to an empty list.
+def _removed_setter(name, replacement):
+    """Return a method raising that the component cannot be modified in place."""
 
-        Notes:
-            param image_url and buttons must be non-empty.
-            Use the get_content() method to get the content of the Element object before using it in an generic message or an Elements object.
-        """
-        assert isinstance(
-            title, str), f"type of param title must be str , not {type(title)}"
-        assert title != "", "param title must be non empty"
+    def setter(self, *args, **kwargs):
+        raise AttributeError(
+            f"{type(self).__name__} is immutable, use {replacement}() to get a modified copy")
 
-        self.__title = title
-        self.__subtitle = subtitle
-        self.__image_url = image_url
-        self.__buttons = [] if buttons is None else buttons
+    setter.__name__ = name
+    setter.__doc__ = f"Removed, use {replacement}(): {name}() cannot modify an immutable component."
+    return setter
 
-        if self.__image_url == None or len(self.__buttons) == 0:
-            print("WARNING : param image_url and buttons must be non-empty.")
 
-    def set_title(self, title):
-        assert isinstance(
-            title, str), f"type of param title must be str , not {type(title)}"
-        assert title != "", "param title must be non empty"
+class _Component:
+    """Base of the immutable components, compared and hashed by the values of _FIELDS."""
 
-        self.__title = title
+    __slots__ = ("_fragment", "_hash")
 
-    def set_subtitle(self, subtitle):
-        assert isinstance(
-            subtitle, str), f"type of param subtitle must be str , not {type(subtitle)}"
-        self.__subtitle = subtitle
+    _FIELDS = ()
 
-    def set_image_url(self, image_url):
-        assert isinstance(
-            image_url, str), f"type of param image_url must be str , not {type(image_url)}"
+    def _set_fields(self, *values):
+        for name, value in zip(self._FIELDS, values):
+            object.__setattr__(self, "_" + name, value)
+        object.__setattr__(self, "_fragment", None)
+        object.__setattr__(self, "_hash", None)
 
-        self.__image_url = image_url
+    def _values(self):
+        return tuple(getattr(self, "_" + name) for name in self._FIELDS)
 
-    def add_button(self, button):
-        assert isinstance(
-            button, dict), f"type of param button must be list , not {type(button)}"
+    def _replace(self, **changes):
+        values = dict(zip(self._FIELDS, self._values()))
+        values.update(changes)
+        return type(self)(**values)
 
-        self.__buttons.append(button)
+    def __setattr__(self, name, value):
+        raise AttributeError(
+            f"{type(self).__name__} is immutable, its with_*() methods return a modified copy")
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash((type(self), self._values())))
+        return self._hash
+
+    def __reduce__(self):
+        return type(self), self._values()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in zip(self._FIELDS, self._values()))
+        return f"{type(self).__name__}({fields})"
 
     def get_content(self):
-        """Return the content of the Element object.
+        raise NotImplementedError
+
+    def compile(self):
+        """Return the content as a JsonFragment, encoded on the first call only.
 
         Returns:
-            dict: The content of the Element object.
+            JsonFragment: The encoded content of the component.
         """
-        if self.__subtitle == None:
-            return {
-                "title": self.__title,
-                "image_url": self.__image_url,
-                "buttons": self.__buttons
-            }
-        return {
-            "title": self.__title,
-            "subtitle": self.__subtitle,
-            "image_url": self.__image_url,
-            "buttons": self.__buttons
-        }
+        if self._fragment is None:
+            object.__setattr__(self, "_fragment", JsonFragment.encode(self.get_content()))
+        return self._fragment
 
 
-class Buttons:
-    """A list of Button objects.
+class _Builder:
+    """Base of the containers, a list of items holding at most _MAX_ITEMS.
 
-    Attributes:
-        buttons (str , private) : A list containing the content of each Button object.
+    Items are _ITEM_TYPE objects, their content as a dict, or their compiled JsonFragment.
+    """
 
-    Notes:
-        Use the add_button() method to add an Button object's content.
-        Use the get_content() method to get the content of the Buttons object before using it in an generic message.
+    __slots__ = ("_items",)
 
-        The maximum of buttons is 3 (in a element), sending generic message with more than 3 buttons will return an error message from Facebook API's server.
-    """
+    _MAX_ITEMS = None
+    _ITEMS_NAME = "items"
+    _ITEM_TYPE = None
 
-    def __init__(self):
-        self.__buttons = []
+    def __init__(self, items=()):
+        self._items = []
+        for item in items:
+            self._add(item)
 
-    def add_button(self, element):
-        self.__buttons.append(element)
+    def _add(self, item):
+        if not isinstance(item, (self._ITEM_TYPE, dict, JsonFragment)):
+            raise TypeError(
+                f"type of {self._ITEMS_NAME} must be {self._ITEM_TYPE.__name__} or dict , not {type(item)}")
+        if len(self._items) >= self._MAX_ITEMS:
+            raise ValueError(f"the maximum of {self._ITEMS_NAME} is {self._MAX_ITEMS}")
+        self._items.append(item)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._items == other._items
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._items!r})"
 
     def get_content(self):
-        return self.__buttons
+        return [_content(item) for item in self._items]
+
+    def compile(self):
+        """Return the content as a JsonFragment, reusing the fragments of compiled items."""
+        return _compile_list(self._items)
+
+
+class Button(_Component):
+    __slots__ = ("_button_type", "_title", "_payload", "_url")
 
+    _FIELDS = ("button_type", "title", "payload", "url")
 
-class Button:
-    def __init__(self, button_type=ButtonType.POSTBACK, title="Button"):
+    def __init__(self, button_type=ButtonType.POSTBACK, title="Button", payload=None, url=None):
         """Represent a button , used for generic message , persistent menu , ...
 
         Args:
             button_type (str, optional): The type of the button. Supported values are POSTBACK and WEB_URL. Defaults to POSTBACK.
-            title (str, optional): The title of the button. Defaults to "Button".
+            title (str, optional): The title of the button, 20 characters at most. Defaults to "Button".
+            payload (str, optional): The payload of a postback button, 1000 characters at most.
+                Defaults to "<DEVELOPER_DEFINED_PAYLOAD>".
+            url (str, optional): The url opened by a web_url button. Defaults to "<DEVELOPER_DEFINED_URL>".
+
+        Raises:
+            TypeError, ValueError: If a param is invalid.
 
         Notes:
-            param title must be non-empty.
-            If the button is a postback button , use set_payload() method to change the default value.
-            If the button is a web_url button , use set_url() method to change the default value.
+            Button objects are immutable, with_title(), with_payload() and with_url() return a modified copy.
             Use the get_content() method to get the content of the Button object before using it.
         """
-        assert button_type in (
-            ButtonType.POSTBACK, ButtonType.WEB_URL), "param type must be POSTBACK or WEB_URL"
-        assert isinstance(
-            title, str), f"type of param title must be str , not {type(title)}"
-        assert title != "", "param title must be non empty"
+        if button_type == ButtonType.POSTBACK:
+            if url is not None:
+                raise ValueError("param url is only supported on web_url buttons")
+            payload = _validate_text(
+                "<DEVELOPER_DEFINED_PAYLOAD>" if payload is None else payload, "payload", MAX_PAYLOAD_LENGTH)
+        elif button_type == ButtonType.WEB_URL:
+            if payload is not None:
+                raise ValueError("param payload is only supported on postback buttons")
+            url = _validate_text("<DEVELOPER_DEFINED_URL>" if url is None else url, "url")
+        else:
+            raise ValueError("param type must be POSTBACK or WEB_URL")
+
+        self._set_fields(button_type, _validate_text(title, "title", MAX_TITLE_LENGTH), payload, url)
+
+    @classmethod
+    def from_content(cls, content):
+        """Build a Button object from its content, as returned by get_content()."""
+        if not isinstance(content, dict):
+            raise TypeError(f"type of param content must be dict , not {type(content)}")
+        return cls(content.get("type"), content.get("title"), content.get("payload"), content.get("url"))
+
+    @property
+    def button_type(self):
+        return self._button_type
+
+    @property
+    def title(self):
+        return self._title
+
+    @property
+    def payload(self):
+        return self._payload
+
+    @property
+    def url(self):
+        return self._url
+
+    def with_title(self, title):
+        return self._replace(title=title)
+
+    def with_payload(self, payload):
+        if self._button_type != ButtonType.POSTBACK:
+            raise ValueError("param payload is only supported on postback buttons")
+        return self._replace(payload=payload)
+
+    def with_url(self, url):
+        if self._button_type != ButtonType.WEB_URL:
+            raise ValueError("param url is only supported on web_url buttons")
+        return self._replace(url=url)
+
+    set_title = _removed_setter("set_title", "with_title")
+    set_payload = _removed_setter("set_payload", "with_payload")
+    set_url = _removed_setter("set_url", "with_url")
 
-        self.__type = button_type
-        self.__title = title
+    def get_content(self):
+        """Return the content of the Button object.
 
-        if self.__type == ButtonType.POSTBACK:
-            self.__payload = "<DEVELOPER_DEFINED_PAYLOAD>"
-        elif self.__type == ButtonType.WEB_URL:
-            self.__url = "<DEVELOPER_DEFINED_URL>"
+        Returns:
+            dict: The content of the Button object.
+        """
+        if self._button_type == ButtonType.POSTBACK:
+            return {
+                "type": self._button_type,
+                "title": self._title,
+                "payload": self._payload
+            }
+        return {
+            "type": self._button_type,
+            "title": self._title,
+            "url": self._url
+        }
+
+
+class Element(_Component):
+    __slots__ = ("_title", "_subtitle", "_image_url", "_buttons")
+
+    _FIELDS = ("title", "subtitle", "image_url", "buttons")
+
+    def __init__(self, title="An element of a generic message.", subtitle=None, image_url=None, buttons=None):
+        """Represent one element (block , card) of a generic message
+
+        Args:
+            title (str, optional): The title of the element, 80 characters at most. Defaults to "An element of a generic message.".
+            subtitle (str, optional): The subtitle of the element, 80 characters at most. Defaults to None.
+            image_url (str, optional): The url of the image to show in the element. Defaults to None.
+            buttons (iterable, optional): The buttons in the element, 3 at most: Button objects or
+                their content, or a Buttons object. Defaults to no buttons.
+
+        Raises:
+            TypeError, ValueError: If a param is invalid.
+
+        Notes:
+            Element objects are immutable, the with_*() methods return a modified copy.
+            Use the get_content() method to get the content of the Element object before using it in an generic message or an Elements object.
+        """
+        buttons = tuple(
+            button if isinstance(button, Button) else Button.from_content(button)
+            for button in (() if buttons is None else buttons)
+        )
+        if len(buttons) > MAX_BUTTONS:
+            raise ValueError(f"the maximum of buttons is {MAX_BUTTONS}")
 
-    def set_title(self, title):
-        assert isinstance(
-            title, str), f"type of param title must be str , not {type(title)}"
-        assert title != "", "param title must be non empty"
+        self._set_fields(
+            _validate_text(title, "title", MAX_ELEMENT_TEXT_LENGTH),
+            _validate_optional_text(subtitle, "subtitle", MAX_ELEMENT_TEXT_LENGTH),
+            _validate_optional_text(image_url, "image_url"),
+            buttons,
+        )
 
-        self.__title = title
+    @property
+    def title(self):
+        return self._title
 
-    def set_payload(self, payload):
-        assert self.__type == ButtonType.POSTBACK, "param payload is only supported on postback buttons"
-        assert isinstance(
-            payload, str), f"type of param payload must be str , not {type(payload)}"
+    @property
+    def subtitle(self):
+        return self._subtitle
 
-        self.__payload = payload
+    @property
+    def image_url(self):
+        return self._image_url
 
-    def set_url(self, url):
-        assert self.__type == ButtonType.WEB_URL, "param url is only supported on web_url buttons"
-        assert isinstance(
-            url, str), f"type of param url must be str , not {type(url)}"
+    @property
+    def buttons(self):
+        return self._buttons
 
-        self.__url = url
+    def with_title(self, title):
+        return self._replace(title=title)
+
+    def with_subtitle(self, subtitle):
+        return self._replace(subtitle=subtitle)
+
+    def with_image_url(self, image_url):
+        return self._replace(image_url=image_url)
+
+    def with_button(self, button):
+        return self._replace(buttons=self._buttons + (button,))
+
+    set_title = _removed_setter("set_title", "with_title")
+    set_subtitle = _removed_setter("set_subtitle", "with_subtitle")
+    set_image_url = _removed_setter("set_image_url", "with_image_url")
+    add_button = _removed_setter("add_button", "with_button")
 
     def get_content(self):
-        """Return the content of the Button object.
+        """Return the content of the Element object.
 
         Returns:
-            dict: The content of the Button object.
+            dict: The content of the Element object.
         """
-        if self.__type == ButtonType.POSTBACK:
-            return {
-                "type": self.__type,
-                "title": self.__title,
-                "payload": self.__payload
-            }
-        return {
-            "type": self.__type,
-            "title": self.__title,
-            "url": self.__url
-        }
+        content = {"title": self._title}
+        if self._subtitle is not None:
+            content["subtitle"] = self._subtitle
+        content["image_url"] = self._image_url
+        content["buttons"] = [button.get_content() for button in self._buttons]
+        return content
 
 
-class QuickReplies:
-    """A list of QuickReply objects.
+class Elements(_Builder):
+    """A list of Element objects.
 
-    Attributes:
-        quick_replies (str , private) : A list containing the content of each QuickReply object.
+    Notes:
+        Use the add_element() method to add an Element object, or its content.
+        Use the get_content() method to get the content of the Elements object before using it in an generic message.
+
+        The maximum of elements is 10 , adding more raises a ValueError.
+    """
+
+    __slots__ = ()
+
+    _MAX_ITEMS = MAX_ELEMENTS
+    _ITEMS_NAME = "elements"
+    _ITEM_TYPE = Element
+
+    def add_element(self, element):
+        self._add(element)
+
+
+class Buttons(_Builder):
+    """A list of Button objects.
 
     Notes:
-        Use the add_quick_reply() method to add an QuickReply object's content.
-        Use the get_content() method to get the content of the QuickReplies object before using it.
+        Use the add_button() method to add an Button object, or its content.
+        Use the get_content() method to get the content of the Buttons object before using it in an generic message.
 
-        The maximum of quick replies is 13 , sending more than 13 quick replies will return an error message from Facebook API's server.
+        The maximum of buttons is 3 (in a element), adding more raises a ValueError.
     """
 
-    def __init__(self):
-        self.__quick_replies = []
+    __slots__ = ()
 
-    def add_quick_reply(self, quick_reply):
-        self.__quick_replies.append(quick_reply)
+    _MAX_ITEMS = MAX_BUTTONS
+    _ITEMS_NAME = "buttons"
+    _ITEM_TYPE = Button
+
+    def add_button(self, button):
+        self._add(button)
 
-    def get_content(self):
-        return self.__quick_replies
 
+class QuickReply(_Component):
+    __slots__ = ("_title", "_payload", "_image_url")
+
+    _FIELDS = ("title", "payload", "image_url")
 
-class QuickReply:
     def __init__(self, title="Quick reply", payload="<DEVELOPER_DEFINED_PAYLOAD>", image_url=None):
         """Represent a quick reply , used for a quick reply message.
 
         Args:
-            title (str, optional): The title of the quick reply. Defaults to "Quick reply".
-            payload (str, optional): The payload of this quick reply. Defaults to "<DEVELOPER_DEFINED_PAYLOAD>".
-            image_url ([type], optional): The image url to show beside the quick reply. Defaults to None.
+            title (str, optional): The title of the quick reply, 20 characters at most. Defaults to "Quick reply".
+            payload (str, optional): The payload of this quick reply, 1000 characters at most. Defaults to "<DEVELOPER_DEFINED_PAYLOAD>".
+            image_url (str, optional): The image url to show beside the quick reply. Defaults to None.
+
+        Raises:
+            TypeError, ValueError: If a param is invalid.
 
         Notes:
-            param title must be non-empty.
-            param payload must be non-empty.
-            Max characters in the param payload is 1000.
             Recommended resolution for the image in param image_url is 24x24.
+            QuickReply objects are immutable, the with_*() methods return a modified copy.
             Use the get_content() method to get the content of the QuickReply object before using it.
         """
-        assert isinstance(
-            title, str), f"type of param title must be str , not {type(title)}"
-        assert title != "", "param title must be non empty"
-        assert isinstance(
-            payload, str), f"type of param payload must be str , not {type(payload)}"
-        assert payload != "", "param payload must be non empty"
-        assert len(str(payload)) < 1000, "max character of param payload is 1000"
-
-        self.__title = title
-        self.__payload = payload
-        self.__image_url = image_url
-
-        if len(title) > 20:
-            print(
-                "WARNING : max characters for param title is 20 , your title won't show entirely")
-
-    def set_title(self, title):
-        assert isinstance(
-            title, str), f"type of param title must be str , not {type(title)}"
-        assert title != "", "param title must be non empty"
-        if len(title) > 20:
-            print(
-                "WARNING : max characters for param title is 20 , your title won't show entirely")
-
-        self.__title = title
-
-    def set_payload(self, payload):
-        assert isinstance(
-            payload, str), f"type of param payload must be str , not {type(payload)}"
-        assert payload != "", "param payload must be non empty"
-        assert len(str(payload)) < 1000, "max character of param payload is 1000"
-
-        self.__payload = str(payload)
-
-    def set_image_url(self, image_url):
-        assert isinstance(
-            image_url, str), f"type of param image_url must be str , not {type(image_url)}"
-
-        self.__image_url = image_url
+        self._set_fields(
+            _validate_text(title, "title", MAX_TITLE_LENGTH),
+            _validate_text(payload, "payload", MAX_PAYLOAD_LENGTH),
+            _validate_optional_text(image_url, "image_url"),
+        )
+
+    @property
+    def title(self):
+        return self._title
+
+    @property
+    def payload(self):
+        return self._payload
+
+    @property
+    def image_url(self):
+        return self._image_url
+
+    def with_title(self, title):
+        return self._replace(title=title)
+
+    def with_payload(self, payload):
+        return self._replace(payload=payload)
+
+    def with_image_url(self, image_url):
+        return self._replace(image_url=image_url)
+
+    set_title = _removed_setter("set_title", "with_title")
+    set_payload = _removed_setter("set_payload", "with_payload")
+    set_image_url = _removed_setter("set_image_url", "with_image_url")
 
     def get_content(self):
         """Return the content of the QuickReply object.
@@ -272,42 +439,58 @@ class QuickReply:
         Returns:
             dict: The content of the QuickReply object.
         """
-        if self.__image_url == None:
+        if self._image_url is None:
             return {
                 "content_type": "text",
-                "title": self.__title,
-                "payload": self.__payload
+                "title": self._title,
+                "payload": self._payload
             }
         return {
             "content_type": "text",
-            "title": self.__title,
-            "payload": self.__payload,
-            "image_url": self.__image_url
+            "title": self._title,
+            "payload": self._payload,
+            "image_url": self._image_url
         }
 
 
+class QuickReplies(_Builder):
+    """A list of QuickReply objects.
+
+    Notes:
+        Use the add_quick_reply() method to add an QuickReply object, or its content.
+        Use the get_content() method to get the content of the QuickReplies object before using it.
+
+        The maximum of quick replies is 13 , adding more raises a ValueError.
+    """
+
+    __slots__ = ()
+
+    _MAX_ITEMS = MAX_QUICK_REPLIES
+    _ITEMS_NAME = "quick replies"
+    _ITEM_TYPE = QuickReply
+
+    def add_quick_reply(self, quick_reply):
+        self._add(quick_reply)
+
+
 class PersistentMenu:
+    __slots__ = ("_persistent_menus", "_fragment")
+
     def __init__(self, default_locale_menu):
         """Represents a persistent menu.
 
         Args:
             default_locale_menu (list): A list of Button objects of the default locale.
 
+        Raises:
+            TypeError, ValueError: If a param is invalid.
+
         Notes:
             Use the get_content() method to get the content of the PersistentMenu object before using it.
         """
-        assert isinstance(
-            default_locale_menu, list), f"type of param default_locale_menu must be a list of Button objects"
-        assert len(
-            default_locale_menu) > 0, "param default_locale_menu must contains at least one Button object"
-
-        self.__persistent_menus = [
-            {
-                "locale": "default",
-                "composer_input_disabled": "false",
-                "call_to_actions": default_locale_menu
-            }
-        ]
+        self._persistent_menus = []
+        self._fragment = None
+        self._add_menu("default", default_locale_menu, "default_locale_menu")
 
     def add_locale(self, language_code, menu):
         """Add a locale to the persistent menu , other than the default one.
@@ -316,16 +499,37 @@ class PersistentMenu:
             language_code (str) : The language code used for this locale. eg.: fr-FR for French language.
             menu (list) : A list of Button objects.
         """
-        assert isinstance(
-            language_code, str), f"type of param language_code must be a string , not {type(language_code)}"
-        assert isinstance(
-            menu, list), f"type of param menu must be a list of Button object"
+        self._add_menu(_validate_text(language_code, "language_code"), menu, "menu")
 
-        self.__persistent_menus.append({
-            "locale": language_code,
+    def _add_menu(self, locale, menu, field_name):
+        if not isinstance(menu, (list, tuple, Buttons)):
+            raise TypeError(f"type of param {field_name} must be a list of Button objects")
+        if len(menu) == 0:
+            raise ValueError(f"param {field_name} must contains at least one Button object")
+
+        self._persistent_menus.append({
+            "locale": locale,
             "composer_input_disabled": "false",
-            "call_to_actions": menu
+            "call_to_actions": [_content(button) for button in menu]
         })
+        self._fragment = None
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._persistent_menus == other._persistent_menus
+
+    __hash__ = None
 
     def get_content(self):
-        return self.__persistent_menus
+        return copy.deepcopy(self._persistent_menus)
+
+    def compile(self):
+        """Return the content as a JsonFragment, encoded once and cached until a setter runs.
+
+        Returns:
+            JsonFragment: The encoded content of the PersistentMenu object.
+        """
+        if self._fragment is None:
+            self._fragment = JsonFragment.encode(self._persistent_menus)
+        return self._fragment
@@ -1,5 +1,9 @@
 API_VERSION = "19.0"
 
+GRAPH_URL = "https://graph.facebook.com"
+
+ASSET_TYPES = ("image", "video", "audio", "file")
+
 
 class ButtonType:
     """Button types used in Element and QuickReply classes.
@@ -0,0 +1,302 @@
+"""Concurrent handling of webhook events, in order for each sender.
+
+Events are sharded by sender id: each shard has a bounded queue and a single worker, so the
+events of one user are handled one after the other while different users are handled
+concurrently. Dispatching blocks, or waits in the async version, while the queue of the shard
+is full.
+
+Example:
+    dispatcher = Dispatcher(workers=16)
+
+    @dispatcher.on("message")
+    def reply(event):
+        send_api.send_text_message(event.text, event.sender_id)
+
+    webhook = Webhook(<verify_token>, <app_secret>, dispatcher.dispatch)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import queue
+import threading
+from typing import Any, Callable, Iterable, Optional
+
+from .webhook import (
+    DeliveryEvent, Event, MessageEvent, OptinEvent, PostbackEvent,
+    ReactionEvent, ReadEvent, ReferralEvent,
+)
+
+_logger = logging.getLogger(__name__)
+
+EVENT_NAMES = (
+    "message", "quick_reply", "echo", "postback", "delivery", "read",
+    "reaction", "referral", "optin", "other",
+)
+
+_EVENT_NAMES_BY_CLASS = {
+    MessageEvent: "message",
+    PostbackEvent: "postback",
+    DeliveryEvent: "delivery",
+    ReadEvent: "read",
+    ReactionEvent: "reaction",
+    ReferralEvent: "referral",
+    OptinEvent: "optin",
+    Event: "other",
+}
+
+Handler = Callable[[Event], Any]
+ErrorHandler = Callable[[Event, BaseException], Any]
+
+
+def _log_error(event: Event, error: BaseException) -> None:
+    _logger.error("handler of %r failed", event, exc_info=error)
+
+
+class _DispatchTable:
+    """The handlers registered by event name, compiled into a table by event class."""
+
+    def __init__(self, workers: int, queue_size: int, on_error: Optional[ErrorHandler]) -> None:
+        if workers <= 0:
+            raise ValueError("workers must be greater than 0")
+        if queue_size <= 0:
+            raise ValueError("queue_size must be greater than 0")
+
+        self._workers = workers
+        self._queue_size = queue_size
+        self._on_error = on_error or _log_error
+        self._handlers: dict[str, list[Handler]] = {name: [] for name in EVENT_NAMES}
+        self._table: dict[type, tuple[Handler, ...]] = {}
+        self._message_table: dict[str, tuple[Handler, ...]] = {}
+        self._compile()
+
+    def on(self, event_name: str, handler: Optional[Handler] = None) -> Any:
+        """Register a handler of an event type, usable as a decorator.
+
+        Args:
+            event_name (str): One of "message", "quick_reply", "echo", "postback", "delivery",
+                "read", "reaction", "referral", "optin" or "other". Messages carrying a quick
+                reply and echoes go to the "message" handlers if none is registered for them.
+            handler (callable, optional): Called with each event of this type.
+        """
+        if event_name not in self._handlers:
+            raise ValueError(f"event_name must be one of {', '.join(EVENT_NAMES)}")
+        if handler is None:
+            return lambda handler: self.on(event_name, handler)
+        self._handlers[event_name].append(handler)
+        self._compile()
+        return handler
+
+    def _compile(self) -> None:
+        handlers = {name: tuple(handlers) for name, handlers in self._handlers.items()}
+        self._table = {
+            event_class: handlers[name] for event_class, name in _EVENT_NAMES_BY_CLASS.items()}
+        self._message_table = {
+            "quick_reply": handlers["quick_reply"] or handlers["message"],
+            "echo": handlers["echo"] or handlers["message"],
+        }
+
+    def _handlers_of(self, event: Event) -> tuple[Handler, ...]:
+        handlers = self._table.get(type(event), ())
+        if type(event) is MessageEvent:
+            message = event.message
+            if message.get("is_echo"):
+                return self._message_table["echo"]
+            if "quick_reply" in message:
+                return self._message_table["quick_reply"]
+        return handlers
+
+    def _shard(self, event: Event) -> int:
+        # Echoes are sent by the page: their sender is the page, their recipient the user.
+        sender_id = event.recipient_id if type(event) is MessageEvent and event.is_echo else event.sender_id
+        return hash(sender_id) % self._workers
+
+
+class Dispatcher(_DispatchTable):
+    """Runs the handlers of events on worker threads, in order for each sender.
+
+    Args:
+        workers (int, optional): The number of worker threads, i.e. of shards. Defaults to 8.
+        queue_size (int, optional): The events queued per shard before dispatch() blocks.
+            Defaults to 1000.
+        on_error (callable, optional): Called as on_error(event, error) when a handler raises.
+            Defaults to logging the error.
+
+    Notes:
+        Use it as a context manager, or call close() to wait for the queued events and stop
+        the workers. close() waits for the dispatch() calls already started, dispatch() raises
+        a RuntimeError once close() was called.
+    """
+
+    def __init__(self, workers: int = 8, queue_size: int = 1000, *,
+        on_error: Optional[ErrorHandler] = None
+    ) -> None:
+        super().__init__(workers, queue_size, on_error)
+        self._queues: list[queue.Queue] = [queue.Queue(queue_size) for _ in range(workers)]
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        # Notified when the last dispatch() in progress returns.
+        self._idle = threading.Condition(self._lock)
+        self._dispatching = 0
+        self._closed = False
+
+    def __enter__(self) -> Dispatcher:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def dispatch(self, events: Iterable[Event]) -> None:
+        """Queue events for their handlers, blocking while the queue of a shard is full."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("the dispatcher is closed")
+            self._dispatching += 1
+        try:
+            if not self._threads:
+                self._start()
+            queues = self._queues
+            for event in events:
+                if self._handlers_of(event):
+                    queues[self._shard(event)].put(event)
+        finally:
+            with self._lock:
+                self._dispatching -= 1
+                if not self._dispatching:
+                    self._idle.notify_all()
+
+    def join(self) -> None:
+        """Wait until every queued event was handled."""
+        for shard_queue in self._queues:
+            shard_queue.join()
+
+    def close(self) -> None:
+        """Handle the queued events and stop the workers."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            # The events of the dispatches in progress are queued before the stop markers.
+            while self._dispatching:
+                self._idle.wait()
+            if not self._threads:
+                return
+        for shard_queue in self._queues:
+            shard_queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            threads = [
+                threading.Thread(target=self._work, args=(shard_queue,), daemon=True,
+                    name=f"messengerapi-dispatcher-{index}")
+                for index, shard_queue in enumerate(self._queues)
+            ]
+            for thread in threads:
+                thread.start()
+            self._threads = threads
+
+    def _work(self, shard_queue: queue.Queue) -> None:
+        while True:
+            event = shard_queue.get()
+            try:
+                if event is None:
+                    return
+                for handler in self._handlers_of(event):
+                    try:
+                        handler(event)
+                    except Exception as error:
+                        self._on_error(event, error)
+            finally:
+                shard_queue.task_done()
+
+
+class AsyncDispatcher(_DispatchTable):
+    """Runs the handlers of events on asyncio tasks, in order for each sender.
+
+    Handlers may be coroutine functions or plain functions, the latter run on the event loop.
+
+    Args:
+        workers (int, optional): The number of worker tasks, i.e. of shards. Defaults to 64.
+        queue_size (int, optional): The events queued per shard before dispatch() waits.
+            Defaults to 1000.
+        on_error (callable, optional): Called as on_error(event, error) when a handler raises.
+            Defaults to logging the error.
+    """
+
+    def __init__(self, workers: int = 64, queue_size: int = 1000, *,
+        on_error: Optional[ErrorHandler] = None
+    ) -> None:
+        super().__init__(workers, queue_size, on_error)
+        self._queues: list[asyncio.Queue] = []
+        self._tasks: list[asyncio.Task] = []
+        self._dispatching = 0
+        self._idle: Optional[asyncio.Event] = None
+        self._closed = False
+
+    async def __aenter__(self) -> AsyncDispatcher:
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def dispatch(self, events: Iterable[Event]) -> None:
+        """Queue events for their handlers, waiting while the queue of a shard is full."""
+        if self._closed:
+            raise RuntimeError("the dispatcher is closed")
+        if not self._tasks:
+            self._start()
+        self._dispatching += 1
+        try:
+            queues = self._queues
+            for event in events:
+                if self._handlers_of(event):
+                    await queues[self._shard(event)].put(event)
+        finally:
+            self._dispatching -= 1
+            if not self._dispatching:
+                self._idle.set()
+
+    async def join(self) -> None:
+        """Wait until every queued event was handled."""
+        for shard_queue in self._queues:
+            await shard_queue.join()
+
+    async def close(self) -> None:
+        """Handle the queued events and stop the workers."""
+        if self._closed:
+            return
+        self._closed = True
+        # The events of the dispatches in progress are queued before the stop markers.
+        while self._dispatching:
+            self._idle.clear()
+            await self._idle.wait()
+        for shard_queue in self._queues:
+            await shard_queue.put(None)
+        await asyncio.gather(*self._tasks)
+
+    def _start(self) -> None:
+        self._idle = asyncio.Event()
+        self._queues = [asyncio.Queue(self._queue_size) for _ in range(self._workers)]
+        self._tasks = [asyncio.ensure_future(self._work(shard_queue)) for shard_queue in self._queues]
+
+    async def _work(self, shard_queue: asyncio.Queue) -> None:
+        while True:
+            event = await shard_queue.get()
+            try:
+                if event is None:
+                    return
+                for handler in self._handlers_of(event):
+                    try:
+                        result = handler(event)
+                        if inspect.isawaitable(result):
+                            await result
+                    except Exception as error:
+                        self._on_error(event, error)
+            finally:
+                shard_queue.task_done()
@@ -0,0 +1,129 @@
+"""Errors raised for failed Graph API requests.
+
+See https://developers.facebook.com/docs/graph-api/guides/error-handling
+"""
+
+from __future__ import annotations
+
+from typing import Any, Mapping
+
+THROTTLING_CODES = frozenset({4, 17, 32, 613, 80001, 80006})
+TRANSIENT_CODES = frozenset({1, 2})
+
+
+class GraphApiError(Exception):
+    """A request rejected by the Graph API.
+
+    Attributes:
+        code (int): The Graph error code, None if the response had no error object.
+        subcode (int): The Graph error subcode.
+        status (int): The HTTP status of the response.
+        fbtrace_id (str): The trace id to give Facebook support.
+        retry_after (float): Seconds to wait before retrying, from the Retry-After header.
+        response_body: The decoded response body.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        *,
+        code: int | None = None,
+        subcode: int | None = None,
+        error_type: str | None = None,
+        status: int | None = None,
+        fbtrace_id: str | None = None,
+        retry_after: float | None = None,
+        response_body: Any = None,
+    ) -> None:
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.subcode = subcode
+        self.error_type = error_type
+        self.status = status
+        self.fbtrace_id = fbtrace_id
+        self.retry_after = retry_after
+        self.response_body = response_body
+
+    def __str__(self) -> str:
+        details = ", ".join(
+            f"{name}={value}" for name, value in (
+                ("code", self.code), ("subcode", self.subcode), ("status", self.status))
+            if value is not None
+        )
+        return f"{self.message} ({details})" if details else self.message
+
+
+class TransientError(GraphApiError):
+    """A temporary failure, retrying the same request may succeed."""
+
+
+class ThrottledError(GraphApiError):
+    """The request was rejected by a Graph API rate limit."""
+
+
+class PermanentError(GraphApiError):
+    """A failure that retrying the same request will not fix."""
+
+
+class SuppressedError(PermanentError):
+    """A send skipped without a request, its recipient being in the client's SuppressionList.
+
+    Attributes:
+        recipient_id (str): The recipient of the send.
+        reason (str): Why they are suppressed: "outside_window", "blocked" or "invalid_recipient".
+    """
+
+    def __init__(self, recipient_id: str, reason: str) -> None:
+        super().__init__(f"recipient {recipient_id} is suppressed ({reason})")
+        self.recipient_id = recipient_id
+        self.reason = reason
+
+
+class DuplicateSendError(PermanentError):
+    """A send skipped without a request, its idempotency key being in the client's Outbox from
+    an earlier send that failed, or that may have been delivered.
+
+    Outbox.reopen() lets the key be sent again.
+
+    Attributes:
+        idempotency_key (str): The key of the send.
+        status (str): Why it was skipped: "failed" or "uncertain".
+    """
+
+    def __init__(self, idempotency_key: str, status: str, response_body: Any = None) -> None:
+        super().__init__(
+            f"the request with the idempotency key {idempotency_key!r} was already sent ({status})",
+            response_body=response_body)
+        self.idempotency_key = idempotency_key
+        self.status = status
+
+
+def error_from_response(
+    status: int,
+    response_body: Any,
+    retry_after: float | None = None,
+) -> GraphApiError:
+    """Build the GraphApiError subclass matching a failed response."""
+    error = response_body.get("error") if isinstance(response_body, Mapping) else None
+    if not isinstance(error, Mapping):
+        error = {}
+
+    code = error.get("code")
+    if code in THROTTLING_CODES or status == 429:
+        error_class = ThrottledError
+    elif code in TRANSIENT_CODES or error.get("is_transient") or status >= 500:
+        error_class = TransientError
+    else:
+        error_class = PermanentError
+
+    return error_class(
+        error.get("message") or f"Graph API request failed with HTTP status {status}",
+        code=code,
+        subcode=error.get("error_subcode"),
+        error_type=error.get("type"),
+        status=status,
+        fbtrace_id=error.get("fbtrace_id"),
+        retry_after=retry_after,
+        response_body=response_body,
+    )
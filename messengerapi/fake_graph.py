@@ -0,0 +1,644 @@
+"""A local stand-in for the Graph API endpoints used by this package, for load and fault tests.
+
+It serves /messages, /message_attachments, /messenger_profile, /custom_user_settings, user
+profiles and batch requests, validates their shape like Facebook does and answers with realistic ids.
+Latency, errors, throttling and usage headers are configurable, and seeded for repeatability.
+
+Run it in-process as a context manager, or in a subprocess:
+``python -m messengerapi.fake_graph --port 8000 --latency 0.05``
+"""
+
+from __future__ import annotations
+
+import argparse
+import collections
+import json
+import random
+import re
+import string
+import threading
+import time
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterable, NamedTuple, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from .constants import ASSET_TYPES
+
+PROFILE_FIELDS = frozenset({
+    "get_started", "greeting", "persistent_menu", "ice_breakers",
+    "whitelisted_domains", "account_linking_url",
+})
+USER_FIELDS = frozenset({"id", "name", "first_name", "last_name", "profile_pic", "locale", "timezone"})
+SENDER_ACTIONS = frozenset({"mark_seen", "typing_on", "typing_off"})
+MESSAGING_TYPES = frozenset({"RESPONSE", "UPDATE", "MESSAGE_TAG"})
+MAX_BATCH_SIZE = 50
+MAX_TEXT_LENGTH = 2000
+MAX_QUICK_REPLIES = 13
+
+# code: (HTTP status, error type, message, is_transient)
+ERRORS = {
+    1: (500, "OAuthException", "An unknown error occurred", True),
+    2: (503, "OAuthException", "An unexpected error has occurred. Please retry your request later.", True),
+    4: (403, "OAuthException", "(#4) Application request limit reached", False),
+    10: (403, "OAuthException", "(#10) This message is sent outside of allowed window.", False),
+    17: (403, "OAuthException", "(#17) User request limit reached", False),
+    32: (403, "OAuthException", "(#32) Page request limit reached", False),
+    100: (400, "OAuthException", "(#100) Invalid parameter", False),
+    190: (401, "OAuthException", "Invalid OAuth access token.", False),
+    551: (400, "OAuthException", "(#551) This person isn't available right now.", False),
+    613: (403, "OAuthException", "(#613) Calls to this api have exceeded the rate limit.", False),
+}
+
+_PATH = re.compile(r"^/v\d+\.\d+/?(?P<node>[^/]*)/?(?P<edge>[^/]*)/?$")
+
+
+class RecordedRequest(NamedTuple):
+    """A request received by the server, with its decoded body."""
+
+    method: str
+    path: str
+    params: dict
+    body: Any
+    status: int
+
+
+class GraphError(Exception):
+    """An error answered in the Graph API format, raised by the request handlers."""
+
+    def __init__(self, code: int, message: Optional[str] = None, *, subcode: Optional[int] = None,
+        status: Optional[int] = None, retry_after: Optional[float] = None
+    ) -> None:
+        default_status, error_type, default_message, transient = ERRORS.get(code, ERRORS[100])
+        super().__init__(message or default_message)
+        self.code = code
+        self.subcode = subcode
+        self.status = status or default_status
+        self.error_type = error_type
+        self.transient = transient
+        self.retry_after = retry_after
+
+    def body(self, fbtrace_id: str) -> dict:
+        error = {
+            "message": str(self),
+            "type": self.error_type,
+            "code": self.code,
+            "fbtrace_id": fbtrace_id,
+        }
+        if self.subcode is not None:
+            error["error_subcode"] = self.subcode
+        if self.transient:
+            error["is_transient"] = True
+        return {"error": error}
+
+
+class _Fault:
+    __slots__ = ("error", "remaining", "path")
+
+    def __init__(self, error: GraphError, count: int, path: Optional[str]) -> None:
+        self.error = error
+        self.remaining = count
+        self.path = path
+
+
+class FakeGraphServer:
+    """A threaded HTTP server answering like graph.facebook.com.
+
+    Args:
+        host (str, optional): The interface to listen on. Defaults to "127.0.0.1".
+        port (int, optional): The port, 0 for a free one. Defaults to 0.
+        latency (float, optional): Seconds each request is held before being answered. Defaults to 0.
+        jitter (float, optional): Up to this many seconds are added at random to latency. Defaults to 0.
+        error_rate (float, optional): Probability that a request fails with one of error_codes.
+            Defaults to 0.
+        error_codes (iterable, optional): The Graph error codes of random failures. Defaults to (2,),
+            a transient error.
+        rate_limit (int, optional): Calls allowed per rate_window; further calls fail with code 4.
+            Responses then carry an X-App-Usage header. Defaults to None, no limit.
+        rate_window (float, optional): The sliding window of rate_limit, in seconds. Defaults to 60.
+        access_tokens (iterable, optional): The accepted access tokens. Defaults to any token.
+        seed (int, optional): Seeds the ids, latencies and random failures.
+        max_recorded (int, optional): The number of latest requests kept in requests. Defaults to 10000.
+
+    Example:
+        with FakeGraphServer(latency=0.05, error_rate=0.01) as server:
+            send_api = SendApi(<page_access_token>, graph_url=server.url)
+            server.inject(613, count=3)  # the next three calls are throttled
+            ...
+            assert server.requests[-1].body["message"] == {"text": "Hello"}
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        *,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_codes: Iterable[int] = (2,),
+        rate_limit: Optional[int] = None,
+        rate_window: float = 60.0,
+        access_tokens: Optional[Iterable[str]] = None,
+        seed: Optional[int] = None,
+        max_recorded: int = 10000,
+    ) -> None:
+        if latency < 0 or jitter < 0:
+            raise ValueError("latency and jitter must be positive")
+        if not 0 <= error_rate <= 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        if rate_limit is not None and rate_limit < 1:
+            raise ValueError("rate_limit must be at least 1")
+        if rate_window <= 0:
+            raise ValueError("rate_window must be greater than 0")
+
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_codes = tuple(error_codes)
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self._access_tokens = None if access_tokens is None else frozenset(access_tokens)
+
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._next_id = self._random.randrange(10 ** 15, 2 * 10 ** 15)
+        self._faults: list[_Fault] = []
+        self._calls: collections.deque[float] = collections.deque()
+        self._recorded: collections.deque[RecordedRequest] = collections.deque(maxlen=max_recorded)
+        self._profiles: dict[str, dict] = {}
+        self._user_settings: dict[tuple, dict] = {}
+
+        self._server = _HTTPServer((host, port), self)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """The url to give clients as graph_url."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self) -> list[RecordedRequest]:
+        """The latest requests received, batched operations included, oldest first."""
+        with self._lock:
+            return list(self._recorded)
+
+    def start(self) -> FakeGraphServer:
+        """Serve from a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+            self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self) -> FakeGraphServer:
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def inject(self, code: int, count: int = 1, *, subcode: Optional[int] = None,
+        status: Optional[int] = None, retry_after: Optional[float] = None, path: Optional[str] = None,
+        message: Optional[str] = None
+    ) -> None:
+        """Fail the next count calls with a Graph error.
+
+        Args:
+            code (int): The Graph error code, e.g. 2 (transient), 613 (throttled) or 551 (blocked).
+            count (int, optional): The number of calls to fail. Defaults to 1.
+            subcode (int, optional): The error subcode, e.g. 2018278 with code 10.
+            status (int, optional): The HTTP status. Defaults to the status Facebook uses for code.
+            retry_after (float, optional): The value of a Retry-After header, in seconds.
+            path (str, optional): Only fail calls whose path contains it, e.g. "/messages".
+            message (str, optional): The error message. Defaults to Facebook's message for code.
+        """
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        error = GraphError(code, message, subcode=subcode, status=status, retry_after=retry_after)
+        with self._lock:
+            self._faults.append(_Fault(error, count, path))
+
+    def reset(self) -> None:
+        """Forget the recorded requests, pending faults, rate limit window and stored profiles."""
+        with self._lock:
+            self._faults.clear()
+            self._calls.clear()
+            self._recorded.clear()
+            self._profiles.clear()
+            self._user_settings.clear()
+
+    def handle(self, method: str, target: str, content_type: str, content: bytes
+    ) -> tuple[int, dict, Any]:
+        """Answer one HTTP request, returning its status, headers and JSON body."""
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+        headers: dict[str, str] = {}
+        try:
+            body, files = _decode_body(content_type, content)
+            match = _PATH.match(url.path)
+            if method == "POST" and match is not None and not match["node"]:
+                self._check_call(method, url.path, params, body, headers)
+                status, response_body = 200, self._batch(params, body, files)
+            else:
+                status, response_body = self._call(method, url.path, params, body, files, headers)
+        except GraphError as error:
+            status, response_body = error.status, error.body(self._trace_id())
+            if error.retry_after is not None:
+                headers["Retry-After"] = str(error.retry_after)
+            self._record(method, url.path, params, None, status)
+        return status, headers, response_body
+
+    def _call(self, method: str, path: str, params: dict, body: Any, files: dict, headers: dict
+    ) -> tuple[int, Any]:
+        self._check_call(method, path, params, body, headers)
+        response_body = self._route(method, path, params, body, files)
+        self._record(method, path, params, body, 200)
+        return 200, response_body
+
+    def _check_call(self, method: str, path: str, params: dict, body: Any, headers: dict) -> None:
+        token = params.get("access_token") or (body.get("access_token") if isinstance(body, dict) else None)
+        if not token:
+            raise GraphError(190, "An active access token must be used to query information.")
+        if self._access_tokens is not None and token not in self._access_tokens:
+            raise GraphError(190)
+
+        with self._lock:
+            if self.rate_limit is not None:
+                now = time.monotonic()
+                while self._calls and self._calls[0] <= now - self.rate_window:
+                    self._calls.popleft()
+                usage = min(100, len(self._calls) * 100 // self.rate_limit)
+                headers["X-App-Usage"] = json.dumps(
+                    {"call_count": usage, "total_cputime": usage, "total_time": usage})
+                if len(self._calls) >= self.rate_limit:
+                    raise GraphError(4)
+                self._calls.append(now)
+
+            for fault in self._faults:
+                if fault.path is None or fault.path in path:
+                    fault.remaining -= 1
+                    if fault.remaining == 0:
+                        self._faults.remove(fault)
+                    raise fault.error
+            if self.error_rate and self._random.random() < self.error_rate:
+                raise GraphError(self._random.choice(self.error_codes))
+
+    def _route(self, method: str, path: str, params: dict, body: Any, files: dict) -> Any:
+        match = _PATH.match(path)
+        if match is None:
+            raise GraphError(100, f"Unknown path components: {path}")
+        node, edge = match["node"], match["edge"]
+        token = params.get("access_token", "")
+
+        if edge == "messages" and method == "POST":
+            return self._messages(body, files)
+        if edge == "message_attachments" and method == "POST":
+            return {"attachment_id": self._attachment(body, files)}
+        if edge == "messenger_profile":
+            return self._messenger_profile(method, token, params, body)
+        if edge == "custom_user_settings":
+            return self._custom_user_settings(method, token, params, body)
+        if not edge and node.isdigit() and method == "GET":
+            return self._user_profile(node, params)
+        raise GraphError(100, f"Unsupported {method.lower()} request. Object with ID '{node}' "
+                              "does not exist, cannot be loaded due to missing permissions, "
+                              "or does not support this operation.")
+
+    def _messages(self, body: Any, files: dict) -> dict:
+        body = _require_dict(body)
+        recipient = body.get("recipient")
+        if not isinstance(recipient, dict) or not recipient.get("id"):
+            raise GraphError(100, "(#100) The parameter recipient is required")
+        recipient_id = str(recipient["id"])
+
+        messaging_type = body.get("messaging_type")
+        if messaging_type is not None and messaging_type not in MESSAGING_TYPES:
+            raise GraphError(100, "(#100) Param messaging_type must be one of {RESPONSE, UPDATE, MESSAGE_TAG}")
+        if messaging_type == "MESSAGE_TAG" and not body.get("tag"):
+            raise GraphError(100, "(#100) Tag is required for MESSAGE_TAG messaging type")
+
+        if ("message" in body) == ("sender_action" in body):
+            raise GraphError(100, "(#100) Must send either message or state")
+        if "sender_action" in body:
+            if body["sender_action"] not in SENDER_ACTIONS:
+                raise GraphError(100, "(#100) Param sender_action must be one of "
+                                      "{mark_seen, typing_on, typing_off}")
+            return {"recipient_id": recipient_id}
+
+        message = _require_dict(body["message"], "message")
+        response = {"recipient_id": recipient_id, "message_id": self._message_id()}
+        if "text" in message:
+            text = message["text"]
+            if not isinstance(text, str) or not text or len(text) > MAX_TEXT_LENGTH:
+                raise GraphError(100, "(#100) Length of param message[text] must be less than "
+                                      f"or equal to {MAX_TEXT_LENGTH}")
+        elif "attachment" in message:
+            attachment = _require_dict(message["attachment"], "message[attachment]")
+            if attachment.get("type") == "template":
+                payload = _require_dict(attachment.get("payload"), "message[attachment][payload]")
+                if not payload.get("template_type"):
+                    raise GraphError(100, "(#100) param template_type must be non-empty")
+            else:
+                attachment_id = self._attachment({"message": message}, files)
+                if _attachment_is_reusable(attachment):
+                    response["attachment_id"] = attachment_id
+        else:
+            raise GraphError(100, "(#100) Must send either message[text] or message[attachment]")
+
+        quick_replies = message.get("quick_replies")
+        if quick_replies is not None and (
+                not isinstance(quick_replies, list) or not 0 < len(quick_replies) <= MAX_QUICK_REPLIES):
+            raise GraphError(100, f"(#100) param message[quick_replies] must have at most "
+                                  f"{MAX_QUICK_REPLIES} elements")
+        return response
+
+    def _attachment(self, body: Any, files: dict) -> str:
+        message = _require_dict(_require_dict(body).get("message"), "message")
+        attachment = _require_dict(message.get("attachment"), "message[attachment]")
+        if attachment.get("type") not in ASSET_TYPES:
+            raise GraphError(100, "(#100) Param message[attachment][type] must be one of "
+                                  "{image, video, audio, file}")
+        payload = attachment.get("payload") or {}
+        if not (payload.get("url") or payload.get("attachment_id") or files):
+            raise GraphError(100, "(#100) Upload attachment failure.")
+        for filename, _content_type, size in files.values():
+            if size == 0:
+                raise GraphError(100, f"(#100) Upload attachment failure: {filename} is empty.")
+        return payload.get("attachment_id") or self._attachment_id()
+
+    def _messenger_profile(self, method: str, token: str, params: dict, body: Any) -> dict:
+        with self._lock:
+            profile = self._profiles.setdefault(token, {})
+            if method == "GET":
+                fields = [field for field in params.get("fields", "").split(",") if field]
+                if not fields:
+                    raise GraphError(100, "(#100) The parameter fields is required")
+                data = {field: profile[field] for field in fields if field in profile}
+                return {"data": [data] if data else []}
+            if method == "DELETE":
+                fields = _require_dict(body).get("fields")
+                if not isinstance(fields, list) or not fields:
+                    raise GraphError(100, "(#100) The parameter fields is required")
+                for field in fields:
+                    profile.pop(field, None)
+                return {"result": "success"}
+            body = _require_dict(body)
+            unknown = set(body) - PROFILE_FIELDS - {"access_token"}
+            if unknown or not set(body) & PROFILE_FIELDS:
+                raise GraphError(100, f"(#100) Invalid keys: {', '.join(sorted(unknown)) or 'none'}")
+            for field in PROFILE_FIELDS & set(body):
+                profile[field] = body[field]
+            return {"result": "success"}
+
+    def _custom_user_settings(self, method: str, token: str, params: dict, body: Any) -> dict:
+        source = params if method != "POST" else _require_dict(body)
+        psid = source.get("psid")
+        if not psid:
+            raise GraphError(100, "(#100) The parameter psid is required")
+        key = (token, str(psid))
+        with self._lock:
+            if method == "GET":
+                settings = self._user_settings.get(key)
+                if settings is None:
+                    return {"data": []}
+                data = {"user_level_persistent_menu": settings["persistent_menu"]}
+                page_menu = self._profiles.get(token, {}).get("persistent_menu")
+                if page_menu is not None:
+                    data["page_level_persistent_menu"] = page_menu
+                return {"data": [data]}
+            if method == "DELETE":
+                self._user_settings.pop(key, None)
+                return {"result": "success"}
+            if not isinstance(source.get("persistent_menu"), list):
+                raise GraphError(100, "(#100) The parameter persistent_menu is required")
+            self._user_settings[key] = {"persistent_menu": source["persistent_menu"]}
+            return {"result": "success"}
+
+    def _user_profile(self, psid: str, params: dict) -> dict:
+        fields = [field for field in params.get("fields", "first_name,last_name,profile_pic").split(",") if field]
+        for field in fields:
+            if field not in USER_FIELDS:
+                raise GraphError(100, f"(#100) Tried accessing nonexisting field ({field}) on node type (User)")
+        # Profiles are derived from the PSID, so that lookups of a user always agree.
+        person = random.Random(psid)
+        first_name = person.choice(("Alex", "Sam", "Charlie", "Jordan", "Robin", "Kim", "Noa", "Lou"))
+        last_name = person.choice(("Martin", "Rakoto", "Silva", "Nguyen", "Smith", "Kowalski", "Haddad"))
+        profile = {
+            "id": psid,
+            "name": f"{first_name} {last_name}",
+            "first_name": first_name,
+            "last_name": last_name,
+            "profile_pic": f"https://platform-lookaside.fbsbx.com/platform/profilepic/?psid={psid}",
+            "locale": person.choice(("en_US", "fr_FR", "es_ES", "pt_BR", "mg_MG")),
+            "timezone": person.randrange(-11, 13),
+        }
+        return {field: profile[field] for field in ["id", *fields] if field in profile}
+
+    def _batch(self, params: dict, body: Any, files: dict) -> list:
+        # Form fields holding JSON are decoded already.
+        operations = _require_dict(body).get("batch")
+        if not isinstance(operations, list) or not operations:
+            raise GraphError(100, "(#100) The parameter batch is required")
+        if len(operations) > MAX_BATCH_SIZE:
+            raise GraphError(100, f"(#100) Batch requests cannot exceed {MAX_BATCH_SIZE} operations")
+
+        batch_token = params.get("access_token") or body.get("access_token")
+        responses = []
+        for operation in operations:
+            if not isinstance(operation, dict) or not operation.get("relative_url"):
+                raise GraphError(100, "(#100) Each batch operation requires a relative_url")
+            url = urlsplit("/" + operation["relative_url"].lstrip("/"))
+            params = dict(parse_qsl(url.query, keep_blank_values=True))
+            params.setdefault("access_token", batch_token)
+            operation_body = {
+                name: _decode_field(value)
+                for name, value in parse_qsl(operation.get("body") or "", keep_blank_values=True)
+            }
+            attached = [name for name in (operation.get("attached_files") or "").split(",") if name]
+            operation_files = {name: files[name] for name in attached if name in files}
+            try:
+                status, response_body = self._call(
+                    operation.get("method", "GET").upper(), url.path, params, operation_body,
+                    operation_files, {})
+            except GraphError as error:
+                status, response_body = error.status, error.body(self._trace_id())
+            responses.append({
+                "code": status,
+                "headers": [{"name": "Content-Type", "value": "application/json; charset=UTF-8"}],
+                "body": json.dumps(response_body),
+            })
+        return responses
+
+    def _record(self, method: str, path: str, params: dict, body: Any, status: int) -> None:
+        params = {name: value for name, value in params.items() if name != "access_token"}
+        with self._lock:
+            self._recorded.append(RecordedRequest(method, path, params, body, status))
+
+    def _message_id(self) -> str:
+        alphabet = string.ascii_letters + string.digits + "-_"
+        with self._lock:
+            return "m_" + "".join(self._random.choice(alphabet) for _ in range(86))
+
+    def _attachment_id(self) -> str:
+        with self._lock:
+            self._next_id += self._random.randrange(1, 1000)
+            return str(self._next_id)
+
+    def _trace_id(self) -> str:
+        alphabet = string.ascii_letters + string.digits
+        with self._lock:
+            return "".join(self._random.choice(alphabet) for _ in range(27))
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address: tuple, fake: FakeGraphServer) -> None:
+        self.fake = fake
+        super().__init__(address, _Handler)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately: without this, delayed ACKs stall each response.
+    disable_nagle_algorithm = True
+    server: _HTTPServer
+
+    def do_GET(self) -> None:
+        self._answer()
+
+    def do_POST(self) -> None:
+        self._answer()
+
+    def do_DELETE(self) -> None:
+        self._answer()
+
+    def _answer(self) -> None:
+        content = self._read_body()
+        try:
+            status, headers, body = self.server.fake.handle(
+                self.command, self.path, self.headers.get("Content-Type", ""), content)
+        except Exception as error:  # a bug of the fake, reported like a Graph failure
+            status, headers, body = 500, {}, GraphError(1, f"{type(error).__name__}: {error}").body("")
+        encoded = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(encoded)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+                if size == 0:
+                    return b"".join(chunks)
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def _decode_body(content_type: str, content: bytes) -> tuple[Any, dict]:
+    """Return the decoded body and the (filename, content type, size) of each uploaded file."""
+    if not content:
+        return {}, {}
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type == "application/json":
+        try:
+            return json.loads(content), {}
+        except ValueError:
+            raise GraphError(100, "(#100) The request body is not valid JSON") from None
+    if media_type == "application/x-www-form-urlencoded":
+        return {
+            name: _decode_field(value)
+            for name, value in parse_qsl(content.decode(), keep_blank_values=True)
+        }, {}
+    if media_type == "multipart/form-data":
+        message = BytesParser(policy=policy.HTTP).parsebytes(
+            b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + content)
+        fields, files = {}, {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True) or b""
+            if part.get_filename() is not None:
+                files[name] = (part.get_filename(), part.get_content_type(), len(payload))
+            else:
+                fields[name] = _decode_field(payload.decode())
+        return fields, files
+    raise GraphError(100, f"(#100) Unsupported content type: {media_type}")
+
+
+def _decode_field(value: str) -> Any:
+    # Form fields holding objects are JSON-encoded, as the Graph API accepts them.
+    if value[:1] in ("{", "["):
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _require_dict(value: Any, name: str = "body") -> dict:
+    if not isinstance(value, dict):
+        raise GraphError(100, f"(#100) param {name} must be an object")
+    return value
+
+
+def _attachment_is_reusable(attachment: dict) -> bool:
+    payload = attachment.get("payload") or {}
+    return str(payload.get("is_reusable", "false")).lower() == "true" and not payload.get("attachment_id")
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m messengerapi.fake_graph", description="Serve a local stand-in for the Graph API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to each request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random seconds added on top of latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a random error")
+    parser.add_argument("--error-codes", type=lambda value: [int(code) for code in value.split(",")],
+                        default=[2], help="comma-separated Graph codes of random errors (default: 2)")
+    parser.add_argument("--rate-limit", type=int, help="calls allowed per --rate-window")
+    parser.add_argument("--rate-window", type=float, default=60.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    server = FakeGraphServer(
+        args.host, args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        error_codes=args.error_codes, rate_limit=args.rate_limit, rate_window=args.rate_window,
+        seed=args.seed,
+    )
+    print(f"Serving a fake Graph API on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
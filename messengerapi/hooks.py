@@ -0,0 +1,177 @@
+"""Lifecycle hooks and per-request phase timing, to profile where the time of a call goes."""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Callable, Optional, TypeVar
+
+if TYPE_CHECKING:
+    from ._base_api import GraphRequest
+
+PHASES = ("build", "mime", "encode", "rate_limit", "pool_wait", "dns", "connect", "server", "read", "decode")
+"""The phases of RequestTiming.phases, in the order they happen."""
+
+_CONNECTION_PHASES = ("pool_wait", "dns", "connect")
+
+_current_timing: contextvars.ContextVar[Optional[RequestTiming]] = contextvars.ContextVar(
+    "messengerapi_request_timing", default=None)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class RequestTiming:
+    """Where the time of one API call went, in seconds per phase.
+
+    Phases are recorded only when they happen and add up over retries:
+        build: building the request in the API method, MIME detection excluded.
+        mime: detecting the MIME type of an attachment.
+        encode: encoding the JSON, form or multipart body.
+        rate_limit: waiting for the rate limiter.
+        pool_wait, dns, connect: waiting for a free connection, resolving the host and
+            opening the connection, TLS included. Async clients only, for sync clients
+            they are part of server.
+        server: from sending the request to receiving the response headers.
+        read: reading the response body. For sync clients it also covers the work requests
+            does around the exchange, such as preparing the request and looking up proxies.
+        decode: decoding the response JSON.
+
+    Attributes:
+        operation (str): The API method called, then the operation of its request once built.
+        attempts (int): The attempts made so far.
+        phases (dict): The seconds spent in each phase.
+        request (GraphRequest): The request sent, None while it is being built.
+    """
+
+    __slots__ = ("operation", "started_at", "attempts", "phases", "request")
+
+    def __init__(self, operation: str, started_at: Optional[float] = None) -> None:
+        self.operation = operation
+        self.started_at = perf_counter() if started_at is None else started_at
+        self.attempts = 0
+        self.phases: dict[str, float] = {}
+        self.request: Optional[GraphRequest] = None
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the call started."""
+        return perf_counter() - self.started_at
+
+    @property
+    def connection_time(self) -> float:
+        return sum(self.phases.get(phase, 0.0) for phase in _CONNECTION_PHASES)
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def __repr__(self) -> str:
+        phases = ", ".join(f"{phase}={seconds * 1000:.2f}ms" for phase, seconds in self.phases.items())
+        return f"RequestTiming({self.operation!r}, attempts={self.attempts}, {phases})"
+
+
+class RequestHooks:
+    """Callbacks run by a client around each API call; override the ones you need.
+
+    Hooks run on the thread or event loop making the call, keep them fast. An exception
+    raised by a hook propagates to the caller.
+
+    Example:
+        class SpanHooks(RequestHooks):
+            def before_send(self, request, timing):
+                self.spans[id(timing)] = tracer.start_span(request.operation)
+
+            def after_response(self, request, timing, response_body):
+                span = self.spans.pop(id(timing))
+                span.set_attributes({f"messenger.{k}": v for k, v in timing.phases.items()})
+                span.end()
+    """
+
+    def before_build(self, timing: RequestTiming) -> None:
+        """Called when an API method is entered, before its request is built."""
+
+    def before_send(self, request: GraphRequest, timing: RequestTiming) -> None:
+        """Called before each attempt to send request."""
+
+    def after_response(self, request: GraphRequest, timing: RequestTiming, response_body: Any) -> None:
+        """Called after an attempt succeeded, with the decoded response body."""
+
+    def on_error(self, request: GraphRequest, timing: RequestTiming, error: BaseException) -> None:
+        """Called after an attempt failed, whether or not it will be retried."""
+
+
+def current_timing() -> Optional[RequestTiming]:
+    """Return the timing of the API call in progress, if its client has hooks."""
+    return _current_timing.get()
+
+
+def record_phase(phase: str, started_at: float) -> None:
+    """Add the time since the perf_counter() value started_at to the call in progress."""
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.add(phase, perf_counter() - started_at)
+
+
+def traced(method: F) -> F:
+    """Time the request building of an API method, for clients with hooks."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args: Any, **kwargs: Any) -> Any:
+        hooks = self._hooks
+        if not hooks or _current_timing.get() is not None:
+            return method(self, *args, **kwargs)
+        timing = RequestTiming(method.__name__)
+        for hook in hooks:
+            hook.before_build(timing)
+        token = _current_timing.set(timing)
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            _current_timing.reset(token)
+
+    return wrapper  # type: ignore[return-value]
+
+
+def begin_request(request: GraphRequest) -> RequestTiming:
+    """Return the timing of request, continuing the one of the API method that built it."""
+    now = perf_counter()
+    timing = _current_timing.get()
+    if timing is None or timing.request is not None:
+        # Requests sent from other threads, e.g. by broadcasts, or more than one per call.
+        timing = RequestTiming(request.operation, now)
+    else:
+        timing.add("build", now - timing.started_at - timing.phases.get("mime", 0.0))
+        timing.operation = request.operation
+    timing.request = request
+    return timing
+
+
+def aiohttp_trace_config(aiohttp: Any) -> Any:
+    """Return an aiohttp TraceConfig recording pool_wait, dns and connect of traced requests."""
+    config = aiohttp.TraceConfig()
+
+    def phase_start(name: str) -> Callable[..., Any]:
+        async def on_start(session: Any, context: Any, params: Any) -> None:
+            setattr(context, name, perf_counter())
+        return on_start
+
+    def phase_end(name: str) -> Callable[..., Any]:
+        async def on_end(session: Any, context: Any, params: Any) -> None:
+            timing = context.trace_request_ctx
+            if isinstance(timing, RequestTiming):
+                elapsed = perf_counter() - getattr(context, name)
+                if name == "connect":
+                    # The host is resolved while the connection is created.
+                    elapsed -= getattr(context, "dns_elapsed", 0.0)
+                elif name == "dns":
+                    context.dns_elapsed = getattr(context, "dns_elapsed", 0.0) + elapsed
+                timing.add(name, elapsed)
+        return on_end
+
+    config.on_connection_queued_start.append(phase_start("pool_wait"))
+    config.on_connection_queued_end.append(phase_end("pool_wait"))
+    config.on_dns_resolvehost_start.append(phase_start("dns"))
+    config.on_dns_resolvehost_end.append(phase_end("dns"))
+    config.on_connection_create_start.append(phase_start("connect"))
+    config.on_connection_create_end.append(phase_end("connect"))
+    return config
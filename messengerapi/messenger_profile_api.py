@@ -1,16 +1,60 @@
 """Wrapper for the Profile API"""
 
-from ._base_api import BaseApiClient
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Iterable, Iterator, Mapping, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode
+
+from ._base_api import BaseApiClient, GraphRequest
+from ._cache import MISSING, TTLCache
+from ._json import JsonFragment, dumps as dumps_json
+from .batch import MAX_BATCH_SIZE, GraphBatch
 from .constants import API_VERSION
+from .hooks import traced
+
+PROFILE_FIELDS = (
+    "account_linking_url", "get_started", "greeting", "ice_breakers", "persistent_menu",
+    "whitelisted_domains",
+)
+"""The messenger_profile fields fetched by get_profile() and deleted by sync_profile()."""
+
+MAX_CACHED_USERS = 10_000
+
+# Menus of a bulk assignment are encoded once each, while they are among the last ones seen.
+_MAX_ENCODED_MENUS = 64
+
+
+class UserMenuResult(NamedTuple):
+    """The outcome of a bulk persistent menu assignment for one user."""
+
+    user_id: str
+    response: Optional[dict] = None
+    error: Optional[BaseException] = None
 
 
 class ProfileApi(BaseApiClient):
-    def __init__(self, page_access_token: str, *, timeout: float = 30.0):
-        super().__init__(page_access_token, timeout=timeout)
+    def __init__(self, page_access_token: str, *, timeout: float = 30.0,
+        skip_unchanged: bool = False, state_ttl: float = 600.0, **kwargs
+    ):
+        """
+        Args:
+            skip_unchanged (bool, optional): Whether the setters fetch the current profile, or
+                menu of the user, and only send the fields that differ from it. The state is
+                cached, so setting it again sends nothing. Defaults to False.
+            state_ttl (float, optional): Seconds a fetched or set state is trusted before it is
+                fetched again. Defaults to 600.
+        """
+        super().__init__(page_access_token, timeout=timeout, **kwargs)
+        if state_ttl <= 0:
+            raise ValueError("state_ttl must be greater than 0")
         self.__graph_version = API_VERSION
-        self.__api_url = f"https://graph.facebook.com/v{self.__graph_version}/me"
+        self.__api_url = f"{self.get_graph_url()}/v{self.__graph_version}/me"
         self.__global_level_endpoint = "/messenger_profile"
         self.__user_level_endpoint = "/custom_user_settings"
+        self._skip_unchanged = skip_unchanged
+        self._profile_state = _StateCache(state_ttl)
+        self._user_menu_state = _StateCache(state_ttl, MAX_CACHED_USERS)
 
     def get_api_url(self):
         return self.__api_url
@@ -21,6 +65,7 @@ class ProfileApi(BaseApiClient):
     def get_graph_version(self):
         return self.__graph_version
 
+    @traced
     def set_welcome_screen(self, get_started_button_payload: str, greetings: list = None):
         """
         Set the welcome screen of the page. (https://developers.facebook.com/docs/messenger-platform/discovery/welcome-screen/)
@@ -49,35 +94,410 @@ class ProfileApi(BaseApiClient):
             "greeting": greetings
         }
 
-        return self._post_json(
-            self.get_api_url() + self.__global_level_endpoint,
-            request_body,
-        )
+        return self._set_profile("set_welcome_screen", request_body)
 
+    @traced
     def set_user_persistent_menu(self, user_id: str, persistent_menu: list):
         """Set the persistent menu for any user of the page.
 
         Args:
 			user_id (str) : The user id.
-			persistent_menu (PersistentMenu object) : The content of the PersistentMenu object , obtained via the PersistentMenu().get_content() method.
+			persistent_menu (PersistentMenu object) : The content of the PersistentMenu object , obtained via the PersistentMenu().get_content() method,
+                or its compiled fragment, obtained via PersistentMenu().compile().
         """
 
-        return self._post_json(
-            self.get_api_url() + self.__user_level_endpoint,
-            {
-                "psid": user_id,
-                "persistent_menu": persistent_menu
-            },
-        )
+        return self._set_user_persistent_menu(user_id, persistent_menu)
 
+    @traced
     def set_persistent_menu(self, persistent_menu: list):
         """Set the persistent menu for the page.
 
         Args:
-                persistent_menu (PersistentMenu object) : The content of the PersistentMenu object , obtained via the PersistentMenu().get_content() method.
+                persistent_menu (PersistentMenu object) : The content of the PersistentMenu object , obtained via the PersistentMenu().get_content() method,
+                    or its compiled fragment, obtained via PersistentMenu().compile().
+        """
+
+        return self._set_profile("set_persistent_menu", {"persistent_menu": persistent_menu})
+
+    @traced
+    def get_profile(self, fields: Iterable[str] = PROFILE_FIELDS):
+        """Get the messenger_profile fields of the page.
+
+        Args:
+            fields (iterable, optional): The fields to get. Defaults to PROFILE_FIELDS.
+
+        Returns:
+            dict: The value of each field that is set.
+        """
+        fields = list(fields)
+        if not fields or not all(isinstance(field, str) and field for field in fields):
+            raise ValueError("fields must be a non-empty list of field names")
+
+        def parse(response_body):
+            profile = (response_body.get("data") or [{}])[0]
+            for field in fields:
+                self._profile_state.put(field, _digest(profile[field]) if field in profile else None)
+            return profile
+
+        return self._execute(GraphRequest(
+            "GET",
+            f"{self.get_api_url()}{self.__global_level_endpoint}?{urlencode({'fields': ','.join(fields)})}",
+            "get_profile",
+            parse=parse,
+        ))
+
+    @traced
+    def get_user_persistent_menu(self, user_id: str):
+        """Get the persistent menu set for a user of the page.
+
+        Args:
+            user_id (str) : The user id.
+
+        Returns:
+            list: The persistent menu of the user, None if the user sees the page's menu.
+        """
+
+        def parse(response_body):
+            settings = (response_body.get("data") or [{}])[0]
+            persistent_menu = settings.get("user_level_persistent_menu")
+            self._user_menu_state.put(user_id, None if persistent_menu is None else _digest(persistent_menu))
+            return persistent_menu
+
+        return self._execute(GraphRequest(
+            "GET",
+            f"{self.get_api_url()}{self.__user_level_endpoint}?{urlencode({'psid': user_id})}",
+            "get_user_persistent_menu",
+            parse=parse,
+        ))
+
+    @traced
+    def sync_profile(self, profile: Mapping[str, Any]):
+        """Make the messenger_profile of the page match profile, sending only the differences.
+
+        The fields whose value differs from the current one are set with one request, and the
+        PROFILE_FIELDS missing from profile are deleted with another. The current profile is
+        fetched once and cached, whether or not the client skips unchanged fields.
+
+        Args:
+            profile (dict): The value of each field, e.g. {"greeting": [...], "persistent_menu": [...]}.
+
+        Returns:
+            dict: The "updated" and "deleted" field names.
+
+        Example:
+            profile_api.sync_profile({
+                "get_started": {"payload": "GET_STARTED"},
+                "persistent_menu": PersistentMenu(<default_locale_menu>).compile(),
+            })
+        """
+        if self._profile_unknown(PROFILE_FIELDS):
+            self.get_profile()
+        requests, changes = self._sync_profile_requests(profile)
+        for request in requests:
+            self._execute(request)
+        return changes
+
+    def set_user_persistent_menus(self, assignments: Iterable[Tuple[str, Any]], max_in_flight: int = 4
+    ) -> Iterator[UserMenuResult]:
+        """Set the persistent menu of many users, each to their own menu.
+
+        Each distinct menu is JSON-encoded once. The writes are sent in batch requests of up to
+        50 users, at most max_in_flight of them at a time. With skip_unchanged, the users whose
+        cached menu is already the given one are skipped.
+
+        Args:
+            assignments (iterable): (user_id, persistent_menu) pairs, consumed lazily. Menus are
+                PersistentMenu contents, compiled fragments or PersistentMenu objects.
+            max_in_flight (int, optional): The maximum number of concurrent batch requests.
+                Defaults to 4.
+
+        Yields:
+            UserMenuResult: The outcome for each user, in completion order.
+
+        Example:
+            for result in profile_api.set_user_persistent_menus(
+                (user.psid, tier_menus[user.tier]) for user in <users>
+            ):
+                if result.error is not None:
+                    print(result.user_id, result.error)
+        """
+        if max_in_flight <= 0:
+            raise ValueError("max_in_flight must be greater than 0")
+        return self._send_user_batches(self._user_menu_requests(assignments), max_in_flight)
+
+    def broadcast_persistent_menu(self, persistent_menu: Any, user_ids: Iterable[str],
+        max_in_flight: int = 4
+    ) -> Iterator[UserMenuResult]:
+        """Set the same persistent menu for many users, as set_user_persistent_menus() does.
+
+        Args:
+            persistent_menu (PersistentMenu object) : The menu, as in set_user_persistent_menu().
+            user_ids (iterable): The user ids, consumed lazily.
+            max_in_flight (int, optional): The maximum number of concurrent batch requests.
+                Defaults to 4.
+
+        Yields:
+            UserMenuResult: The outcome for each user, in completion order.
+        """
+        return self.set_user_persistent_menus(
+            ((user_id, persistent_menu) for user_id in user_ids), max_in_flight)
+
+    @traced
+    def reset_user_persistent_menu(self, user_id: str):
+        """Delete the persistent menu of a user, who sees the page's menu again.
+
+        Args:
+            user_id (str) : The user id.
         """
+        request = self._reset_user_menu_request(user_id, "reset_user_persistent_menu")
+        if request is None:
+            return self._resolved({"result": "success"})
+        return self._execute(request)
+
+    def reset_user_persistent_menus(self, user_ids: Iterable[str], max_in_flight: int = 4
+    ) -> Iterator[UserMenuResult]:
+        """Delete the persistent menu of many users, in batch requests of up to 50 users.
+
+        Args:
+            user_ids (iterable): The user ids, consumed lazily.
+            max_in_flight (int, optional): The maximum number of concurrent batch requests.
+                Defaults to 4.
 
-        return self._post_json(
+        Yields:
+            UserMenuResult: The outcome for each user, in completion order.
+        """
+        if max_in_flight <= 0:
+            raise ValueError("max_in_flight must be greater than 0")
+        return self._send_user_batches(
+            ((user_id, self._reset_user_menu_request(user_id, "reset_user_persistent_menus"))
+             for user_id in user_ids),
+            max_in_flight,
+        )
+
+    def clear_state_cache(self):
+        """Forget the fetched profile and user menus, so that they are fetched again."""
+        self._profile_state.clear()
+        self._user_menu_state.clear()
+
+    def _set_profile(self, operation: str, fields: dict):
+        if self._skip_unchanged and self._profile_unknown(fields):
+            self.get_profile()
+        return self._post_profile(operation, fields)
+
+    def _set_user_persistent_menu(self, user_id: str, persistent_menu: list):
+        if self._skip_unchanged and self._user_menu_unknown(user_id):
+            self.get_user_persistent_menu(user_id)
+        return self._post_user_persistent_menu(user_id, persistent_menu)
+
+    def _profile_unknown(self, fields: Iterable[str]) -> bool:
+        # Batched calls cannot wait for a fetch, they send the fields whose state is unknown.
+        return not self._deferred and any(
+            self._profile_state.get(field) is MISSING for field in fields if field in PROFILE_FIELDS)
+
+    def _user_menu_unknown(self, user_id: str) -> bool:
+        return not self._deferred and self._user_menu_state.get(user_id) is MISSING
+
+    def _post_profile(self, operation: str, fields: dict):
+        if not self._skip_unchanged:
+            return self._execute(GraphRequest(
+                "POST",
+                self.get_api_url() + self.__global_level_endpoint,
+                operation,
+                json=fields,
+                parse=lambda response_body: self._profile_state.forget(fields, response_body),
+                idempotent=True,
+            ))
+        digests = {field: _digest(value) for field, value in fields.items()}
+        changed = {
+            field: value for field, value in fields.items()
+            if self._profile_state.get(field) != digests[field]
+        }
+        if not changed:
+            return self._resolved({"result": "success"})
+        return self._execute(GraphRequest(
+            "POST",
             self.get_api_url() + self.__global_level_endpoint,
-            {"persistent_menu": persistent_menu},
+            operation,
+            json=changed,
+            parse=lambda response_body: self._profile_state.update(
+                {field: digests[field] for field in changed}, response_body),
+            idempotent=True,
+        ))
+
+    def _post_user_persistent_menu(self, user_id: str, persistent_menu: list):
+        request_body = {
+            "psid": user_id,
+            "persistent_menu": persistent_menu
+        }
+        if not self._skip_unchanged:
+            return self._execute(GraphRequest(
+                "POST",
+                self.get_api_url() + self.__user_level_endpoint,
+                "set_user_persistent_menu",
+                json=request_body,
+                parse=lambda response_body: self._user_menu_state.forget([user_id], response_body),
+                idempotent=True,
+            ))
+        digest = _digest(persistent_menu)
+        if self._user_menu_state.get(user_id) == digest:
+            return self._resolved({"result": "success"})
+        return self._execute(GraphRequest(
+            "POST",
+            self.get_api_url() + self.__user_level_endpoint,
+            "set_user_persistent_menu",
+            json=request_body,
+            parse=lambda response_body: self._user_menu_state.update({user_id: digest}, response_body),
+            idempotent=True,
+        ))
+
+    def _user_menu_requests(self, assignments: Iterable[Tuple[str, Any]]):
+        """Yield (user_id, request) pairs, with a None request for users already set to the menu."""
+        encoded: OrderedDict = OrderedDict()
+        for user_id, persistent_menu in assignments:
+            entry = encoded.get(id(persistent_menu))
+            if entry is None or entry[0] is not persistent_menu:
+                menu_json = JsonFragment.encode(persistent_menu).json
+                # The menu is kept in the entry, so that its id is not reused by another object.
+                entry = encoded[id(persistent_menu)] = (persistent_menu, menu_json, _json_digest(menu_json))
+                if len(encoded) > _MAX_ENCODED_MENUS:
+                    encoded.popitem(last=False)
+            _, menu_json, digest = entry
+
+            if self._skip_unchanged and self._user_menu_state.get(user_id) == digest:
+                yield user_id, None
+                continue
+            yield user_id, GraphRequest(
+                "POST",
+                self.get_api_url() + self.__user_level_endpoint,
+                "set_user_persistent_menus",
+                fields={"psid": user_id, "persistent_menu": menu_json},
+                parse=self._user_menu_parse(user_id, digest),
+                idempotent=True,
+            )
+
+    def _reset_user_menu_request(self, user_id: str, operation: str) -> Optional[GraphRequest]:
+        if self._skip_unchanged and self._user_menu_state.get(user_id) is None:
+            return None
+        query = urlencode({"psid": user_id, "params": '["persistent_menu"]'})
+        return GraphRequest(
+            "DELETE",
+            f"{self.get_api_url()}{self.__user_level_endpoint}?{query}",
+            operation,
+            parse=self._user_menu_parse(user_id, None),
         )
+
+    def _user_menu_parse(self, user_id: str, digest: Optional[str]):
+        if self._skip_unchanged:
+            return lambda response_body: self._user_menu_state.update({user_id: digest}, response_body)
+        return lambda response_body: self._user_menu_state.forget([user_id], response_body)
+
+    def _send_user_batches(self, requests: Iterable, max_in_flight: int) -> Iterator[UserMenuResult]:
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            in_flight = set()
+            for chunk, skipped in _user_chunks(requests):
+                yield from skipped
+                if not chunk:
+                    continue
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()
+                in_flight.add(executor.submit(self._send_user_batch, chunk))
+
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+
+    def _send_user_batch(self, chunk: list) -> list:
+        batch = GraphBatch(self)
+        for _, request in chunk:
+            batch.add(request)
+        try:
+            results = batch.execute()
+        except Exception as error:
+            return [UserMenuResult(user_id, error=error) for user_id, _ in chunk]
+        return [_user_menu_result(user_id, result) for (user_id, _), result in zip(chunk, results)]
+
+    def _sync_profile_requests(self, profile: Mapping[str, Any]):
+        if not isinstance(profile, Mapping):
+            raise TypeError("profile must be a dictionary")
+        digests = {field: _digest(value) for field, value in profile.items()}
+        updated = {
+            field: value for field, value in profile.items()
+            if self._profile_state.get(field) != digests[field]
+        }
+        deleted = [
+            field for field in PROFILE_FIELDS
+            if field not in profile and self._profile_state.get(field) is not None
+        ]
+        requests = []
+        if updated:
+            requests.append(GraphRequest(
+                "POST",
+                self.get_api_url() + self.__global_level_endpoint,
+                "sync_profile",
+                json=updated,
+                parse=lambda response_body: self._profile_state.update(
+                    {field: digests[field] for field in updated}, response_body),
+                idempotent=True,
+            ))
+        if deleted:
+            requests.append(GraphRequest(
+                "DELETE",
+                self.get_api_url() + self.__global_level_endpoint,
+                "sync_profile",
+                json={"fields": deleted},
+                parse=lambda response_body: self._profile_state.update(
+                    dict.fromkeys(deleted), response_body),
+            ))
+        return requests, {"updated": list(updated), "deleted": deleted}
+
+
+class _StateCache(TTLCache):
+    """Digests of remote values; a None digest means unset."""
+
+    def update(self, digests: Mapping[str, Optional[str]], response_body: Any) -> Any:
+        """Remember the digests set by a request, passing its response body through."""
+        for key, digest in digests.items():
+            self.put(key, digest)
+        return response_body
+
+    def forget(self, keys: Iterable[str], response_body: Any) -> Any:
+        """Forget keys changed by a request, passing its response body through."""
+        for key in keys:
+            self.discard(key)
+        return response_body
+
+
+def _user_chunks(requests: Iterable) -> Iterator:
+    """Group (user_id, request) pairs into chunks of one batch request, and results of skipped users."""
+    chunk, skipped = [], []
+    for user_id, request in requests:
+        if request is None:
+            skipped.append(UserMenuResult(user_id, {"result": "success"}))
+        else:
+            chunk.append((user_id, request))
+        if len(chunk) == MAX_BATCH_SIZE or len(skipped) == MAX_BATCH_SIZE:
+            yield chunk, skipped
+            chunk, skipped = [], []
+    if chunk or skipped:
+        yield chunk, skipped
+
+
+def _user_menu_result(user_id: str, result: Any) -> UserMenuResult:
+    if isinstance(result, BaseException):
+        return UserMenuResult(user_id, error=result)
+    return UserMenuResult(user_id, result)
+
+
+def _digest(value: Any) -> str:
+    """Return a hash of value that is the same for equal JSON, fragments and components included."""
+    return _json_digest(dumps_json(value))
+
+
+def _json_digest(encoded: str) -> str:
+    canonical = json.dumps(json.loads(encoded), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
@@ -0,0 +1,293 @@
+"""Request metrics: per-operation latency histograms, outcome counters and bytes sent.
+
+See https://prometheus.io/docs/instrumenting/exposition_formats/ for the text format.
+"""
+
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from typing import ClassVar, NamedTuple, Optional, Sequence
+
+from .exceptions import GraphApiError, PermanentError, ThrottledError, TransientError
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+SUCCESS = "success"
+THROTTLED = "throttled"
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+CONNECTION_ERROR = "connection_error"
+ERROR = "error"
+
+
+def outcome_of(error: Optional[BaseException]) -> str:
+    """Return the outcome label of an attempt that failed with error, or succeeded if None.
+
+    Connection failures are told apart by the clients, which know their transport's errors.
+    """
+    if error is None:
+        return SUCCESS
+    if isinstance(error, ThrottledError):
+        return THROTTLED
+    if isinstance(error, TransientError):
+        return TRANSIENT
+    if isinstance(error, (PermanentError, GraphApiError)):
+        return PERMANENT
+    return ERROR
+
+
+class Histogram(NamedTuple):
+    """Latencies counted in fixed buckets.
+
+    Attributes:
+        bounds (tuple): The upper bound of each bucket, in seconds.
+        counts (tuple): The observations of each bucket, plus one past the last bound.
+        sum (float): The total of all observations, in seconds.
+    """
+
+    bounds: tuple
+    counts: tuple
+    sum: float
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-quantile, interpolating within its bucket; None without observations.
+
+        Observations past the last bound are reported as the last bound.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1")
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[index - 1] if index else 0.0
+                return lower + (self.bounds[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+
+class OperationMetrics(NamedTuple):
+    """The metrics of one operation, e.g. "send_text_message" or "upload_local_image".
+
+    Attributes:
+        requests (dict): The attempts per outcome: success, throttled, transient,
+            permanent, connection_error or error, for anything else such as a cancellation.
+        in_flight (int): The attempts started and not finished yet.
+        retries (int): The attempts that were retried.
+        bytes_sent (int): The bytes of request bodies and uploaded files, excluding streams
+            of unknown length.
+        latency (Histogram): The duration of finished attempts, including rate limiter waits.
+    """
+
+    requests: dict
+    in_flight: int
+    retries: int
+    bytes_sent: int
+    latency: Histogram
+
+
+class _OperationStats:
+    # Only ever written by the thread owning the shard it belongs to.
+    __slots__ = ("started", "outcomes", "buckets", "latency_sum", "retries", "bytes_sent")
+
+    def __init__(self, bucket_count: int) -> None:
+        self.started = 0
+        self.outcomes: dict[str, int] = {}
+        self.buckets = [0] * bucket_count
+        self.latency_sum = 0.0
+        self.retries = 0
+        self.bytes_sent = 0
+
+    def merge(self, other: _OperationStats) -> None:
+        self.started += other.started
+        # The owning thread may add an outcome while the shard is merged.
+        for outcome, count in list(other.outcomes.items()):
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + count
+        self.buckets = [mine + theirs for mine, theirs in zip(self.buckets, other.buckets)]
+        self.latency_sum += other.latency_sum
+        self.retries += other.retries
+        self.bytes_sent += other.bytes_sent
+
+
+class Metrics:
+    """Counters and latency histograms of the requests sent by the clients given it.
+
+    Every thread records into its own shard, so recording takes no lock; snapshot() and
+    prometheus() add the shards up. Clients without metrics record nothing.
+
+    Args:
+        buckets (sequence, optional): The upper bounds of the latency buckets, in seconds.
+            Defaults to DEFAULT_BUCKETS, from 5 ms to 30 s.
+
+    Example:
+        metrics = Metrics()
+        send_api = SendApi(<page_access_token>, metrics=metrics)
+        ...
+        p99 = metrics.snapshot()["send_text_message"].latency.quantile(0.99)
+    """
+
+    _default: ClassVar[Optional[Metrics]] = None
+    _default_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        bounds = tuple(sorted(float(bound) for bound in buckets))
+        if not bounds or bounds[0] <= 0 or len(set(bounds)) != len(bounds):
+            raise ValueError("buckets must be distinct bounds greater than 0")
+
+        self._bounds = bounds
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: list[tuple[threading.Thread, dict[str, _OperationStats]]] = []
+        self._retired: dict[str, _OperationStats] = {}
+
+    @classmethod
+    def default(cls) -> Metrics:
+        """Return the metrics shared by clients created with metrics=True."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    @property
+    def buckets(self) -> tuple:
+        return self._bounds
+
+    def start(self, operation: str) -> _OperationStats:
+        """Count an attempt of operation as in flight; pass the result to finish()."""
+        stats = self._stats(operation)
+        stats.started += 1
+        return stats
+
+    def finish(self, stats: _OperationStats, started_at: float, outcome: str) -> None:
+        """Record an attempt started at perf_counter() value started_at, from the same thread."""
+        elapsed = perf_counter() - started_at
+        stats.buckets[bisect_left(self._bounds, elapsed)] += 1
+        stats.latency_sum += elapsed
+        stats.outcomes[outcome] = stats.outcomes.get(outcome, 0) + 1
+
+    def add_retry(self, operation: str) -> None:
+        self._stats(operation).retries += 1
+
+    def add_bytes(self, operation: str, size: int) -> None:
+        self._stats(operation).bytes_sent += size
+
+    def snapshot(self) -> dict[str, OperationMetrics]:
+        """Return the metrics of each operation recorded so far."""
+        totals = self._merged()
+        return {
+            operation: OperationMetrics(
+                requests=dict(stats.outcomes),
+                in_flight=stats.started - sum(stats.buckets),
+                retries=stats.retries,
+                bytes_sent=stats.bytes_sent,
+                latency=Histogram(self._bounds, tuple(stats.buckets), stats.latency_sum),
+            )
+            for operation, stats in sorted(totals.items())
+        }
+
+    def prometheus(self, prefix: str = "messengerapi") -> str:
+        """Return the metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_requests_total Graph API request attempts by operation and outcome.",
+            f"# TYPE {prefix}_requests_total counter",
+        ]
+        for operation, metrics in snapshot.items():
+            for outcome, count in sorted(metrics.requests.items()):
+                lines.append(
+                    f"{prefix}_requests_total{_labels(operation=operation, outcome=outcome)} {count}")
+
+        lines += [
+            f"# HELP {prefix}_request_duration_seconds Graph API request attempt latency.",
+            f"# TYPE {prefix}_request_duration_seconds histogram",
+        ]
+        for operation, metrics in snapshot.items():
+            latency = metrics.latency
+            cumulative = 0
+            for bound, count in zip(latency.bounds + (float("inf"),), latency.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    f"{prefix}_request_duration_seconds_bucket"
+                    f"{_labels(operation=operation, le=le)} {cumulative}")
+            lines.append(
+                f"{prefix}_request_duration_seconds_sum{_labels(operation=operation)} {latency.sum!r}")
+            lines.append(
+                f"{prefix}_request_duration_seconds_count{_labels(operation=operation)} {cumulative}")
+
+        for name, kind, help_text, attribute in (
+            ("requests_in_flight", "gauge", "Graph API request attempts in flight.", "in_flight"),
+            ("retries_total", "counter", "Graph API request attempts retried.", "retries"),
+            ("request_bytes_total", "counter", "Request body bytes sent.", "bytes_sent"),
+        ):
+            lines += [f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} {kind}"]
+            for operation, metrics in snapshot.items():
+                lines.append(
+                    f"{prefix}_{name}{_labels(operation=operation)} {getattr(metrics, attribute)}")
+        return "\n".join(lines) + "\n"
+
+    def _stats(self, operation: str) -> _OperationStats:
+        try:
+            return self._local.shard[operation]
+        except (AttributeError, KeyError):
+            pass
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = self._register_shard()
+        stats = shard[operation] = _OperationStats(len(self._bounds) + 1)
+        return stats
+
+    def _register_shard(self) -> dict[str, _OperationStats]:
+        shard: dict[str, _OperationStats] = {}
+        with self._lock:
+            self._retire_dead_shards()
+            self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _retire_dead_shards(self) -> None:
+        # Threads of finished executors never write again: fold their shards into one,
+        # so the shard list stays as long as the number of live threads.
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _merge_into(self._retired, shard)
+        self._shards = live
+
+    def _merged(self) -> dict[str, _OperationStats]:
+        with self._lock:
+            self._retire_dead_shards()
+            totals: dict[str, _OperationStats] = {}
+            _merge_into(totals, self._retired)
+            for _, shard in self._shards:
+                _merge_into(totals, shard)
+        return totals
+
+
+def _merge_into(totals: dict[str, _OperationStats], shard: dict[str, _OperationStats]) -> None:
+    for operation, stats in list(shard.items()):
+        merged = totals.get(operation)
+        if merged is None:
+            merged = totals[operation] = _OperationStats(len(stats.buckets))
+        merged.merge(stats)
+
+
+def _labels(**labels: str) -> str:
+    return "{" + ",".join(
+        f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
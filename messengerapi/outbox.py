@@ -0,0 +1,359 @@
+"""A durable record of outgoing requests, to resume sending after a crash without duplicates."""
+
+from __future__ import annotations
+
+import contextvars
+import dataclasses
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Iterator, NamedTuple, Optional
+
+from ._base_api import GraphRequest
+from ._json import encode as encode_json
+from .exceptions import DuplicateSendError
+
+PENDING = 0
+DONE = 1
+FAILED = 2
+UNCERTAIN = 3
+"""Being sent, or failed after it may have reached Facebook: it may have been delivered."""
+
+_current_key: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "messengerapi_idempotency_key", default=None)
+
+
+@contextmanager
+def idempotency_key(key: str) -> Iterator[None]:
+    """Give the request sent in this block an idempotency key.
+
+    Example:
+        with idempotency_key(f"order-{order_id}-shipped"):
+            send_api.send_text_message("Your order has shipped", <recipient_id>)
+    """
+    if not isinstance(key, str) or not key:
+        raise ValueError("key must be a non-empty string")
+    token = _current_key.set(key)
+    try:
+        yield
+    finally:
+        _current_key.reset(token)
+
+
+class OutboxEntry(NamedTuple):
+    """The state of a request in the outbox."""
+
+    key: str
+    status: int
+    response_body: Any = None
+
+    @property
+    def done(self) -> bool:
+        return self.status == DONE
+
+
+class ReplayResult(NamedTuple):
+    """The outcome of replaying one unfinished request."""
+
+    key: str
+    response: Any = None
+    error: Optional[BaseException] = None
+
+
+class _PendingWrite:
+    __slots__ = ("sql", "params", "done", "error")
+
+    def __init__(self, sql: str, params: tuple) -> None:
+        self.sql = sql
+        self.params = params
+        self.done = False
+        self.error: Optional[BaseException] = None
+
+
+class Outbox:
+    """Records each JSON request in SQLite before it is sent, and marks it done once it succeeded.
+
+    After a crash, replay() sends the requests that were recorded but never completed, and that
+    certainly did not reach Facebook: a request is marked uncertain before it is sent, and only
+    marked pending again if it failed to connect or was throttled.
+
+    A request whose idempotency key was already sent successfully is not sent again, the
+    recorded response is returned instead. One whose key failed, or may have been delivered,
+    raises a DuplicateSendError until reopen() is called. Keys come from
+    GraphRequest.idempotency_key, the idempotency_key() context manager, or the
+    idempotency_key argument of broadcasts; requests without a key get a random one, so
+    they are replayed but never deduplicated.
+
+    Writes of concurrent requests are committed together, in one transaction.
+
+    Args:
+        path (str): The SQLite database file.
+        retention (float, optional): Seconds completed requests are kept for deduplication,
+            None to keep them forever. Defaults to 7 days.
+
+    Notes:
+        Uploads and other form requests are sent without being recorded.
+
+    Example:
+        outbox = Outbox("outbox.sqlite3")
+        send_api = SendApi(<page_access_token>, outbox=outbox)
+        for result in outbox.replay(send_api):  # on startup
+            ...
+    """
+
+    _PURGE_INTERVAL = 1000
+
+    def __init__(self, path: str, *, retention: Optional[float] = 7 * 24 * 3600) -> None:
+        if retention is not None and retention <= 0:
+            raise ValueError("retention must be greater than 0")
+
+        self._retention = retention
+        self._db_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._pending: list[_PendingWrite] = []
+        self._committing = False
+        self._in_flight: set[str] = set()
+        self._completed = 0
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " key TEXT PRIMARY KEY,"
+            " method TEXT NOT NULL,"
+            " url TEXT NOT NULL,"
+            " operation TEXT NOT NULL,"
+            " body BLOB NOT NULL,"
+            " result_key TEXT,"
+            " status INTEGER NOT NULL,"
+            " response TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, created_at)")
+
+    def close(self) -> None:
+        with self._db_lock:
+            self._connection.close()
+
+    def accepts(self, request: GraphRequest) -> bool:
+        """Whether request is recorded, only JSON requests are."""
+        return request.json is not None and not request.is_form
+
+    def begin(self, request: GraphRequest) -> tuple[GraphRequest, OutboxEntry]:
+        """Record a request about to be sent.
+
+        Returns:
+            tuple: The request to send, with its key and its body encoded, and its entry.
+                The entry is done if the key was already sent successfully.
+
+        Raises:
+            ValueError: If a request with the same key is being sent by another thread.
+            DuplicateSendError: If the key failed or may have been delivered, and was not reopened.
+        """
+        key = request.idempotency_key or _current_key.get() or uuid.uuid4().hex
+        body = request.json if isinstance(request.json, bytes) else encode_json(request.json)
+        request = dataclasses.replace(request, json=body, idempotency_key=key)
+
+        with self._cond:
+            if key in self._in_flight:
+                raise ValueError(f"a request with the idempotency key {key!r} is already in flight")
+            self._in_flight.add(key)
+        try:
+            entry = self.get(key)
+            now = time.time()
+            if entry is None:
+                self._write(
+                    "INSERT OR IGNORE INTO outbox VALUES (?, ?, ?, ?, ?, ?, ?, NULL, ?, ?)",
+                    (key, request.method, request.url, request.operation, body,
+                     request.result_key, UNCERTAIN, now, now),
+                )
+                entry = OutboxEntry(key, UNCERTAIN)
+            elif entry.status == PENDING:
+                self._write(
+                    "UPDATE outbox SET status = ?, updated_at = ? WHERE key = ?", (UNCERTAIN, now, key))
+                entry = OutboxEntry(key, UNCERTAIN)
+            elif entry.status != DONE:
+                raise DuplicateSendError(
+                    key, "failed" if entry.status == FAILED else "uncertain", entry.response_body)
+        except BaseException:
+            self._release(key)
+            raise
+        if entry.status == DONE:
+            self._release(key)
+        return request, entry
+
+    def complete(self, key: str, response_body: Any) -> None:
+        """Mark a request sent successfully, remembering its response."""
+        try:
+            self._write(
+                "UPDATE outbox SET status = ?, response = ?, updated_at = ? WHERE key = ?",
+                (DONE, json.dumps(response_body), time.time(), key),
+            )
+        finally:
+            self._release(key)
+        with self._cond:
+            self._completed += 1
+            purge = self._completed % self._PURGE_INTERVAL == 0
+        if purge:
+            self.purge()
+
+    def fail(self, key: str, error: BaseException) -> None:
+        """Mark a request failed for good, it won't be replayed."""
+        try:
+            self._write(
+                "UPDATE outbox SET status = ?, response = ?, updated_at = ? WHERE key = ?",
+                (FAILED, json.dumps(getattr(error, "response_body", None) or str(error)),
+                 time.time(), key),
+            )
+        finally:
+            self._release(key)
+
+    def abandon(self, key: str, sent: bool = True) -> None:
+        """Leave a request unfinished, after it failed in a way that replaying may fix.
+
+        Args:
+            key (str): The idempotency key of the request.
+            sent (bool, optional): Whether an attempt may have reached Facebook. If it did not,
+                the request is pending again and replayed, otherwise it stays uncertain.
+                Defaults to True.
+        """
+        try:
+            if not sent:
+                self._write(
+                    "UPDATE outbox SET status = ?, updated_at = ? WHERE key = ? AND status = ?",
+                    (PENDING, time.time(), key, UNCERTAIN),
+                )
+        finally:
+            self._release(key)
+
+    def reopen(self, key: str) -> None:
+        """Mark a request that failed, or may have been delivered, pending: sending it again
+        with its key sends it, and replay() does."""
+        self._write(
+            "UPDATE outbox SET status = ?, updated_at = ? WHERE key = ? AND status IN (?, ?)",
+            (PENDING, time.time(), key, FAILED, UNCERTAIN),
+        )
+
+    def get(self, key: str) -> Optional[OutboxEntry]:
+        """Return the entry of key, None if it was never recorded."""
+        with self._db_lock:
+            row = self._connection.execute(
+                "SELECT status, response FROM outbox WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return OutboxEntry(key, row[0], None if row[1] is None else json.loads(row[1]))
+
+    def unfinished(self) -> list[GraphRequest]:
+        """Return the requests recorded but never sent to Facebook, oldest first."""
+        return self._select(PENDING)
+
+    def uncertain(self) -> list[GraphRequest]:
+        """Return the requests that may have been delivered without being completed, oldest first.
+
+        Their sending was interrupted after they may have reached Facebook, e.g. by a read
+        timeout or a crash. Check whether their recipients got them before replaying them.
+        """
+        return self._select(UNCERTAIN)
+
+    def _select(self, *statuses: int) -> list[GraphRequest]:
+        with self._cond:
+            in_flight = set(self._in_flight)
+        with self._db_lock:
+            rows = self._connection.execute(
+                "SELECT key, method, url, operation, body, result_key FROM outbox"
+                f" WHERE status IN ({', '.join('?' * len(statuses))}) ORDER BY created_at", statuses
+            ).fetchall()
+        return [
+            GraphRequest(method, url, operation, json=bytes(body), result_key=result_key,
+                idempotency_key=key)
+            for key, method, url, operation, body, result_key in rows
+            if key not in in_flight
+        ]
+
+    def replay(self, client: Any, uncertain: bool = False) -> Iterator[ReplayResult]:
+        """Send the unfinished requests again with client, e.g. on startup after a crash.
+
+        Args:
+            client: The API client sending the requests.
+            uncertain (bool, optional): Whether the uncertain requests are sent again too, at the
+                risk of delivering them twice. Defaults to False.
+
+        Yields:
+            ReplayResult: The outcome of each request.
+        """
+        for request in self._replayed(uncertain):
+            try:
+                yield ReplayResult(request.idempotency_key, client._execute(request))
+            except Exception as error:
+                yield ReplayResult(request.idempotency_key, error=error)
+
+    async def replay_async(self, client: Any, uncertain: bool = False) -> AsyncIterator[ReplayResult]:
+        """Like replay(), with an async client."""
+        for request in self._replayed(uncertain):
+            try:
+                yield ReplayResult(request.idempotency_key, await client._execute(request))
+            except Exception as error:
+                yield ReplayResult(request.idempotency_key, error=error)
+
+    def _replayed(self, uncertain: bool) -> Iterator[GraphRequest]:
+        if not uncertain:
+            yield from self.unfinished()
+            return
+        for request in self._select(PENDING, UNCERTAIN):
+            self.reopen(request.idempotency_key)
+            yield request
+
+    def purge(self) -> None:
+        """Forget the requests completed or failed longer than retention ago."""
+        if self._retention is not None:
+            self._write(
+                "DELETE FROM outbox WHERE status IN (?, ?) AND updated_at < ?",
+                (DONE, FAILED, time.time() - self._retention),
+            )
+
+    def _release(self, key: str) -> None:
+        with self._cond:
+            self._in_flight.discard(key)
+
+    def _write(self, sql: str, params: tuple) -> None:
+        # Group commit: the first writer commits every write queued meanwhile in one
+        # transaction, the others wait for it instead of committing on their own.
+        write = _PendingWrite(sql, params)
+        with self._cond:
+            self._pending.append(write)
+            while not write.done:
+                if self._committing:
+                    self._cond.wait()
+                    continue
+                self._committing = True
+                batch, self._pending = self._pending, []
+                self._cond.release()
+                error = None
+                try:
+                    self._commit(batch)
+                except Exception as commit_error:
+                    error = commit_error
+                finally:
+                    self._cond.acquire()
+                    for pending_write in batch:
+                        pending_write.done = True
+                        pending_write.error = error
+                    self._committing = False
+                    self._cond.notify_all()
+        if write.error is not None:
+            raise write.error
+
+    def _commit(self, batch: list[_PendingWrite]) -> None:
+        with self._db_lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                for write in batch:
+                    self._connection.execute(write.sql, write.params)
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
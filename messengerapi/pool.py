@@ -0,0 +1,162 @@
+"""Connection pools shared between API clients."""
+
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, Any, ClassVar
+
+from .hooks import aiohttp_trace_config
+
+if TYPE_CHECKING:
+    import asyncio
+
+    import requests
+
+
+def _import_aiohttp() -> Any:
+    try:
+        import aiohttp
+    except ImportError as error:
+        raise ImportError(
+            "the async clients require aiohttp, install it with "
+            "'pip install messenger-api-python[async]'"
+        ) from error
+    return aiohttp
+
+
+class ConnectionPool:
+    """HTTP connections shared by every client created with it.
+
+    Args:
+        max_connections (int, optional): Connections open at once across all hosts, for async
+            clients. Defaults to 100.
+        max_connections_per_host (int, optional): Connections kept open per host. Defaults to 100.
+        pool_connections (int, optional): Number of hosts whose connections are kept by sync
+            clients. Defaults to 10.
+        keepalive_timeout (float, optional): Seconds an idle connection is kept open by async
+            clients. Defaults to 30.
+        block (bool, optional): Whether sync clients wait for a free connection instead of
+            opening throwaway ones once max_connections_per_host are in use. Defaults to False.
+
+    Notes:
+        Sync clients use ConnectionPool.default() unless given a pool or a session.
+        An async session belongs to the event loop that created it: the pool keeps one per
+        event loop, and async clients only share connections when given the same pool and
+        running in the same loop. Close them with close_async().
+    """
+
+    _default: ClassVar[ConnectionPool | None] = None
+    _default_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_connections_per_host: int = 100,
+        *,
+        pool_connections: int = 10,
+        keepalive_timeout: float = 30.0,
+        block: bool = False,
+    ) -> None:
+        if max_connections <= 0 or max_connections_per_host <= 0 or pool_connections <= 0:
+            raise ValueError("connection limits must be greater than 0")
+        if keepalive_timeout < 0:
+            raise ValueError("keepalive_timeout must be positive")
+
+        self._max_connections = max_connections
+        self._max_connections_per_host = max_connections_per_host
+        self._pool_connections = pool_connections
+        self._keepalive_timeout = keepalive_timeout
+        self._block = block
+
+        self._lock = threading.Lock()
+        self._session: requests.Session | None = None
+        self._aiohttp_sessions: dict[asyncio.AbstractEventLoop, Any] = {}
+        self._aiohttp_closing: set[asyncio.Future] = set()
+
+    @classmethod
+    def default(cls) -> ConnectionPool:
+        """Return the pool shared by clients that were not given one."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    @property
+    def session(self) -> requests.Session:
+        """The requests session used by sync clients."""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    # Imported on first use, so that async clients never load requests.
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    adapter = HTTPAdapter(
+                        pool_connections=self._pool_connections,
+                        pool_maxsize=self._max_connections_per_host,
+                        pool_block=self._block,
+                    )
+                    session = requests.Session()
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    def aiohttp_session(self) -> Any:
+        """Return the aiohttp session of the running event loop, creating it if needed."""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        session = self._aiohttp_sessions.get(loop)
+        if session is None or session.closed:
+            aiohttp = _import_aiohttp()
+            with self._lock:
+                self._drop_stale_sessions()
+                session = self._aiohttp_sessions[loop] = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(
+                        limit=self._max_connections,
+                        limit_per_host=self._max_connections_per_host,
+                        keepalive_timeout=self._keepalive_timeout,
+                    ),
+                    trace_configs=[aiohttp_trace_config(aiohttp)],
+                )
+        return session
+
+    def _drop_stale_sessions(self) -> None:
+        """Forget the sessions of closed event loops, closing them from the running one.
+
+        Their connections died with their loop, closing them only releases the session.
+        """
+        import asyncio
+
+        for loop, session in list(self._aiohttp_sessions.items()):
+            if loop.is_closed() or session.closed:
+                del self._aiohttp_sessions[loop]
+                if not session.closed:
+                    closing = asyncio.ensure_future(session.close())
+                    self._aiohttp_closing.add(closing)
+                    closing.add_done_callback(self._aiohttp_closing.discard)
+
+    def close(self) -> None:
+        """Close the connections of sync clients."""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    async def close_async(self) -> None:
+        """Close the connections of async clients, in every event loop."""
+        import asyncio
+
+        current = asyncio.get_running_loop()
+        with self._lock:
+            sessions, self._aiohttp_sessions = self._aiohttp_sessions, {}
+            closing, self._aiohttp_closing = self._aiohttp_closing, set()
+        for loop, session in sessions.items():
+            if loop is current or loop.is_closed():
+                await session.close()
+            else:
+                # A session is closed by its own loop, running in another thread.
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(session.close(), loop))
+        if closing:
+            await asyncio.gather(*closing, return_exceptions=True)
@@ -0,0 +1,158 @@
+"""Client-side rate limiting driven by the Graph API usage headers.
+
+See https://developers.facebook.com/docs/graph-api/overview/rate-limiting
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from typing import Any, ClassVar, Mapping
+
+USAGE_HEADERS = ("X-App-Usage", "X-Page-Usage", "X-Business-Use-Case-Usage")
+
+
+class RateLimiter:
+    """A token bucket that slows down as Facebook reports usage close to the limit.
+
+    Args:
+        rate (float, optional): Requests per second allowed while usage is low. Defaults to 50.
+        burst (int, optional): Bucket capacity. Defaults to rate.
+        slowdown_threshold (float, optional): Usage percentage above which the rate decreases
+            linearly, down to min_rate_factor * rate at 100%. Defaults to 75.
+        min_rate_factor (float, optional): Fraction of rate kept at full usage. Defaults to 0.05.
+
+    Notes:
+        When a usage header reports an estimated_time_to_regain_access, no request is let
+        through until that time has passed.
+        Use RateLimiter.for_token() to share one limiter between every client of a token.
+    """
+
+    _shared: ClassVar[dict[str, RateLimiter]] = {}
+    _shared_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(
+        self,
+        rate: float = 50.0,
+        burst: int | None = None,
+        *,
+        slowdown_threshold: float = 75.0,
+        min_rate_factor: float = 0.05,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        if burst is not None and burst < 1:
+            raise ValueError("burst must be at least 1")
+        if not 0 <= slowdown_threshold < 100:
+            raise ValueError("slowdown_threshold must be between 0 and 100")
+        if not 0 < min_rate_factor <= 1:
+            raise ValueError("min_rate_factor must be in ]0, 1]")
+
+        self._rate = rate
+        self._capacity = float(burst if burst is not None else max(1, int(rate)))
+        self._slowdown_threshold = slowdown_threshold
+        self._min_rate_factor = min_rate_factor
+
+        self._lock = threading.Lock()
+        self._tokens = self._capacity
+        self._updated_at = time.monotonic()
+        self._rate_factor = 1.0
+        self._blocked_until = 0.0
+        self._usage = 0.0
+
+    @classmethod
+    def for_token(cls, access_token: str) -> RateLimiter:
+        """Return the limiter shared by every client using access_token."""
+        key = hashlib.sha256(access_token.encode()).hexdigest()
+        with cls._shared_lock:
+            limiter = cls._shared.get(key)
+            if limiter is None:
+                limiter = cls._shared[key] = cls()
+            return limiter
+
+    @property
+    def usage(self) -> float:
+        """The highest usage percentage reported by the last response."""
+        return self._usage
+
+    @property
+    def current_rate(self) -> float:
+        return self._rate * self._rate_factor
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            rate = self.current_rate
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * rate)
+            self._updated_at = now
+            self._tokens -= 1
+            delay = 0.0 if self._tokens >= 0 else -self._tokens / rate
+            return max(delay, self._blocked_until - now)
+
+    def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            import asyncio
+
+            await asyncio.sleep(delay)
+
+    def update(self, headers: Mapping[str, str]) -> None:
+        """Adjust the rate from the usage headers of a response."""
+        usage, regain_minutes = _parse_usage(headers)
+        if usage is None:
+            return
+
+        with self._lock:
+            self._usage = usage
+            if usage <= self._slowdown_threshold:
+                self._rate_factor = 1.0
+            else:
+                remaining = max(0.0, 100 - usage) / (100 - self._slowdown_threshold)
+                self._rate_factor = max(self._min_rate_factor, remaining)
+            if regain_minutes > 0:
+                self._blocked_until = max(
+                    self._blocked_until, time.monotonic() + regain_minutes * 60)
+
+
+def _parse_usage(headers: Mapping[str, str]) -> tuple[float | None, float]:
+    """Return the highest usage percentage and time to regain access found in headers."""
+    usage = None
+    regain_minutes = 0.0
+    for header in USAGE_HEADERS:
+        value = headers.get(header)
+        if not value:
+            continue
+        try:
+            decoded = json.loads(value)
+        except ValueError:
+            continue
+
+        if header == "X-Business-Use-Case-Usage" and isinstance(decoded, dict):
+            reports = [report for entries in decoded.values() if isinstance(entries, list)
+                       for report in entries]
+        else:
+            reports = [decoded]
+
+        for report in reports:
+            if not isinstance(report, dict):
+                continue
+            report_usage = _max_usage(report)
+            usage = report_usage if usage is None else max(usage, report_usage)
+            regain_minutes = max(
+                regain_minutes, float(report.get("estimated_time_to_regain_access") or 0))
+    return usage, regain_minutes
+
+
+def _max_usage(report: Mapping[str, Any]) -> float:
+    return max(
+        float(report.get(key) or 0)
+        for key in ("call_count", "total_time", "total_cputime", "acc_id_util_pct")
+    )
@@ -0,0 +1,80 @@
+"""Retry policy for Graph API requests."""
+
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from typing import Mapping
+
+from .exceptions import GraphApiError, PermanentError, ThrottledError
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How failed requests are retried.
+
+    Transient errors, throttling errors and connection failures are retried with
+    exponential backoff and full jitter, or after the delay given by a Retry-After
+    header. Permanent errors are raised immediately.
+
+    Messages are sent at most once: a failed send that Facebook may have processed, such
+    as a read timeout or a 5xx response, is only retried if it has an idempotency key.
+    Connection failures before the request was sent, throttling errors and the failures
+    of GETs and other idempotent requests are always retried.
+
+    Args:
+        max_attempts (int, optional): Attempts per request, including the first one. Defaults to 3.
+        backoff_base (float, optional): Backoff before the first retry, in seconds. Defaults to 0.5.
+        backoff_max (float, optional): Upper bound of any backoff, in seconds. Defaults to 30.
+        retry_throttled (bool, optional): Whether throttling errors are retried. Defaults to True.
+    """
+
+    max_attempts: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 30.0
+    retry_throttled: bool = True
+
+    def __post_init__(self) -> None:
+        if self.max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        if self.backoff_base < 0 or self.backoff_max < 0:
+            raise ValueError("backoff_base and backoff_max must be positive")
+
+    def delay_for(self, attempt: int, error: BaseException) -> float | None:
+        """Return the seconds to wait after the given failed attempt, or None to give up.
+
+        Args:
+            attempt (int): The number of the attempt that failed, starting at 1.
+            error (BaseException): The error it failed with. Anything other than a
+                GraphApiError is taken as a connection failure.
+        """
+        if isinstance(error, PermanentError) or attempt >= self.max_attempts:
+            return None
+        if isinstance(error, ThrottledError) and not self.retry_throttled:
+            return None
+
+        backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+        if isinstance(error, GraphApiError) and error.retry_after is not None:
+            return min(self.backoff_max, max(backoff, error.retry_after))
+        return backoff
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> float | None:
+    """Return the delay of a Retry-After header, given in seconds or as an HTTP date."""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from datetime import datetime, timezone
+    from email.utils import parsedate_to_datetime
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
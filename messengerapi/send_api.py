@@ -1,15 +1,24 @@
 """Wrapper for the Send API"""
 
-import os
 import json
-from urllib.parse import urlencode
-from typing import Optional
+import time
+from typing import TYPE_CHECKING, Iterable, Iterator, NamedTuple, Optional
 
-import magic
-from requests_toolbelt import MultipartEncoder
+from ._base_api import BaseApiClient, FilePart, GraphRequest
+from ._json import JsonFragment, dumps as dumps_json
+from ._streams import detect_source_mimetype, start_offset
+from .attachment_cache import AttachmentCache, cache_scope
+from .batch import GraphBatch
+from .constants import API_VERSION, ASSET_TYPES, MessagingType, NotificationType
+from .hooks import record_phase, traced
 
-from ._base_api import BaseApiClient
-from .constants import API_VERSION, MessagingType, NotificationType
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+MESSAGE_TAGS = (
+    "ACCOUNT_UPDATE", "CONFIRMED_EVENT_UPDATE",
+    "CUSTOMER_FEEDBACK", "HUMAN_AGENT", "POST_PURCHASE_UPDATE",
+)
 
 
 def _validate_non_empty_string(value: str, field_name: str) -> None:
@@ -17,6 +26,50 @@ def _validate_non_empty_string(value: str, field_name: str) -> None:
         raise ValueError(f"{field_name} must be a non-empty string")
 
 
+def _validate_messaging_type(messaging_type: str, tag: Optional[str]) -> None:
+    if messaging_type not in ("RESPONSE", "UPDATE", "MESSAGE_TAG"):
+        raise ValueError(
+            "messaging_type must be one of RESPONSE, UPDATE, or MESSAGE_TAG"
+        )
+    if messaging_type == MessagingType.MESSAGE_TAG and tag not in MESSAGE_TAGS:
+        raise ValueError(
+            "tag must be one of ACCOUNT_UPDATE, CONFIRMED_EVENT_UPDATE, "
+            "CUSTOMER_FEEDBACK, HUMAN_AGENT, or POST_PURCHASE_UPDATE"
+        )
+
+
+class BroadcastResult(NamedTuple):
+    """The outcome of a broadcast for one recipient."""
+
+    recipient_id: str
+    response: Optional[dict] = None
+    error: Optional[BaseException] = None
+
+
+class EncodedMessage(NamedTuple):
+    """A Send API request body that is already JSON-encoded, and its recipient."""
+
+    recipient_id: str
+    request_body: bytes
+
+
+class PreparedMessage:
+    """A Send API request body JSON-encoded once, with a slot for the recipient id."""
+
+    __slots__ = ("_suffix",)
+
+    _PREFIX = b'{"recipient":{"id":'
+
+    def __init__(self, request_body: dict) -> None:
+        if not request_body:
+            raise ValueError("request_body must be non-empty")
+        encoded = dumps_json(request_body).encode()
+        self._suffix = b"}," + encoded[1:]
+
+    def for_recipient(self, recipient_id: str) -> bytes:
+        return b"".join((self._PREFIX, json.dumps(str(recipient_id)).encode(), self._suffix))
+
+
 class SendApi(BaseApiClient):
     def __init__(
         self,
@@ -24,12 +77,25 @@ class SendApi(BaseApiClient):
         page_id: Optional[str] = None,
         *,
         timeout: float = 30.0,
+        attachment_cache: Optional[AttachmentCache] = None,
+        **kwargs,
     ) -> None:
-        super().__init__(page_access_token, timeout=timeout)
+        """
+        Args:
+            page_access_token (str): The page access token.
+            page_id (str, optional): The page id, required for sender actions.
+            timeout (float, optional): The timeout of each request, in seconds. Defaults to 30.
+            attachment_cache (AttachmentCache, optional): Where reusable local attachments are
+                remembered, so sending the same content again uses its saved attachment_id.
+            Other keyword arguments are passed to BaseApiClient.
+        """
+        super().__init__(page_access_token, timeout=timeout, **kwargs)
+        self.__attachment_cache = attachment_cache
+        self.__cache_scope = cache_scope(page_id, page_access_token)
         self.__graph_version = API_VERSION
-        self.__def_api_url = f"https://graph.facebook.com/v{self.__graph_version}/me"
+        self.__def_api_url = f"{self.get_graph_url()}/v{self.__graph_version}/me"
         self.__alt_api_url = (
-            None if page_id is None else f"https://graph.facebook.com/v{self.__graph_version}/{page_id}")
+            None if page_id is None else f"{self.get_graph_url()}/v{self.__graph_version}/{page_id}")
         self.__page_id = None if page_id is None else page_id
         self.__default_endpoint = "/messages"
 
@@ -51,6 +117,21 @@ class SendApi(BaseApiClient):
     def get_graph_version(self):
         return self.__graph_version
 
+    def _message_request(self, operation: str, request_body, api_url: Optional[str] = None,
+        idempotency_key: Optional[str] = None, recipient_id: Optional[str] = None,
+        idempotent: bool = False
+    ):
+        return GraphRequest(
+            "POST",
+            api_url or self.get_def_api_url() + self.get_def_endpoint(),
+            operation,
+            json=request_body,
+            idempotency_key=idempotency_key,
+            recipient_id=recipient_id,
+            idempotent=idempotent,
+        )
+
+    @traced
     def send_text_message(self, message: str, recipient_id: str,
         messaging_type: str = MessagingType.RESPONSE,
         notification_type: str = NotificationType.REGULAR, **kwargs):
@@ -66,10 +147,7 @@ class SendApi(BaseApiClient):
         """
         _validate_non_empty_string(message, "message")
         _validate_non_empty_string(recipient_id, "recipient_id")
-        if messaging_type not in ("RESPONSE", "UPDATE", "MESSAGE_TAG"):
-            raise ValueError(
-                "messaging_type must be one of RESPONSE, UPDATE, or MESSAGE_TAG"
-            )
+        _validate_messaging_type(messaging_type, kwargs.get("tag"))
 
         request_body = {
             "messaging_type": messaging_type,
@@ -82,41 +160,36 @@ class SendApi(BaseApiClient):
             }
         }
         if messaging_type == MessagingType.MESSAGE_TAG:
-            if kwargs.get("tag") not in (
-                "ACCOUNT_UPDATE", "CONFIRMED_EVENT_UPDATE",
-                "CUSTOMER_FEEDBACK", "HUMAN_AGENT", "POST_PURCHASE_UPDATE",
-            ):
-                raise ValueError(
-                    "tag must be one of ACCOUNT_UPDATE, CONFIRMED_EVENT_UPDATE, "
-                    "CUSTOMER_FEEDBACK, HUMAN_AGENT, or POST_PURCHASE_UPDATE"
-                )
             request_body["tag"] = kwargs.get("tag")
 
-        return self._post_json(
-            self.get_def_api_url() + self.get_def_endpoint(),
-            request_body,
-        )
+        return self._execute(self._message_request(
+            "send_text_message", request_body, recipient_id=recipient_id))
 
     """
 	Send an attachment from an URL of a file
 	Max size supported is 25.0MiB , if you send an attachment that exceeds this size , this will return an error response.
 	"""
+    @traced
     def send_image_attachment(self, attachment_url: str, recipient_id: str, is_reusable: str = "false"):
         """Send an image by url : send_image_attachment("<IMAGE_URL>" , "<RECIPIENT_ID")"""
         return self.__send_attachment_message("image", attachment_url, recipient_id, is_reusable)
 
+    @traced
     def send_video_attachment(self, attachment_url: str, recipient_id: str, is_reusable: str = "false"):
         """Send a video by url : send_video_attachment("<VIDEO_URL>" , "<RECIPIENT_ID")"""
         return self.__send_attachment_message("video", attachment_url, recipient_id, is_reusable)
 
+    @traced
     def send_audio_attachment(self, attachment_url: str, recipient_id: str, is_reusable: str = "false"):
         """Send an audio by url : send_audio_attachment("<AUDIO_URL>" , "<RECIPIENT_ID")"""
         return self.__send_attachment_message("audio", attachment_url, recipient_id, is_reusable)
 
+    @traced
     def send_file_attachment(self, attachment_url: str, recipient_id: str, is_reusable: str = "false"):
         """Send a file by url : send_file_attachment("<FILE_URL>" , "<RECIPIENT_ID")"""
         return self.__send_attachment_message("file", attachment_url, recipient_id, is_reusable)
 
+    @traced
     def send_generic_message(self, elements: str, recipient_id: str,
         image_aspect_ratio: str = "horizontal", quick_replies: str = None
     ):
@@ -124,10 +197,11 @@ class SendApi(BaseApiClient):
 
         Args:
             elements (list): A list of Element objects , contained in an Elements object.
+                May also be an Elements object or its compile() fragment.
             recipient_id (str): The recipient id.
             image_aspect_ratio (str, optional): How image is diplayed in an Element object. Defaults to "horizontal".
             quick_replies (list, optional): A list of QuickReply objects , contained in a QuickReplies object.
-                defaults to None.
+                May also be a QuickReplies object or its compile() fragment. Defaults to None.
 
         Returns:
             dict: The response body from Facebook's API server.
@@ -150,30 +224,34 @@ class SendApi(BaseApiClient):
         }
 
         if quick_replies is not None:
-            if not isinstance(quick_replies, list):
+            if hasattr(quick_replies, "compile"):
+                quick_replies = quick_replies.compile()
+            if not isinstance(quick_replies, (list, JsonFragment)):
                 raise TypeError("quick_replies must be a list")
-            if len(quick_replies) == 0:
+            if isinstance(quick_replies, list) and len(quick_replies) == 0:
                 raise ValueError("quick_replies must be non-empty")
 
             request_body["message"]["quick_replies"] = quick_replies
 
-        return self._post_json(
-            self.get_def_api_url() + self.get_def_endpoint(),
-            request_body,
-        )
+        return self._execute(self._message_request(
+            "send_generic_message", request_body, recipient_id=recipient_id))
 
+    @traced
     def mark_seen_message(self, recipient_id: str):
         """Mark 'seen' the message"""
         return self.__send_sender_actions("mark_seen", recipient_id)
 
+    @traced
     def typing_on_message(self, recipient_id: str):
         """Send a typing on message"""
         return self.__send_sender_actions("typing_on", recipient_id)
 
+    @traced
     def typing_off_message(self, recipient_id: str):
         """Send a typing off message"""
         return self.__send_sender_actions("typing_off", recipient_id)
 
+    @traced
     def send_quick_replies(self, message: str, quick_replies: str,
         recipient_id: str, messaging_type: str = "RESPONSE"
     ):
@@ -181,7 +259,8 @@ class SendApi(BaseApiClient):
 
         Args:
             message (str): The message text content.
-            quick_replies (QuickReplies object): The QuickReplies object content , obtained via the QuickReplies().get_content() method.
+            quick_replies (QuickReplies object): The QuickReplies object content , obtained via the QuickReplies().get_content() method,
+                or its compiled fragment, obtained via QuickReplies().compile().
             recipient_id (str): The recipient id.
             messaging_type (str, optional): The messaging type. Defaults to "RESPONSE".
 
@@ -199,31 +278,59 @@ class SendApi(BaseApiClient):
             }
         }
 
-        return self._post_json(
-            self.get_def_api_url() + self.get_def_endpoint(),
-            request_body,
-        )
+        return self._execute(self._message_request(
+            "send_quick_replies", request_body, recipient_id=recipient_id))
 
     """
 	Send an attachment from a local file
 	Max size supported is 25.0MiB , if you send an attachment that exceeds this size , this will return an error response.
 	"""
+    @traced
     def send_local_image(self, image_location: str, recipient_id: str, is_reusable: str = "true"):
         """Send a local image : send_local_image(<IMAGE_LOCATION> , <RECIPIENT_ID>)"""
         return self.__send_local_attachment("image", image_location, recipient_id, is_reusable)
 
+    @traced
     def send_local_video(self, video_location: str, recipient_id: str, is_reusable: str = "true"):
         """Send a local video : send_local_video(<VIDEO_LOCATION> , <RECIPIENT_ID>)"""
         return self.__send_local_attachment("video", video_location, recipient_id, is_reusable)
 
+    @traced
     def send_local_audio(self, audio_location: str, recipient_id: str, is_reusable: str = "true"):
         """Send a local audio : send_local_audio(<AUDIO_LOCATION> , <RECIPIENT_ID>)"""
         return self.__send_local_attachment("audio", audio_location, recipient_id, is_reusable)
 
+    @traced
     def send_local_file(self, file_location: str, recipient_id: str, is_reusable: str = "true", mimetype: str = None):
         """Send a local file : send_local_file(<FILE_LOCATION> , <RECIPIENT_ID>)"""
         return self.__send_local_attachment("file", file_location, recipient_id, is_reusable, mimetype)
 
+    @traced
+    def send_attachment(self, asset_type: str, attachment, recipient_id: str,
+        is_reusable: str = "true", filename: str = None, mimetype: str = None, progress=None
+    ):
+        """Send an attachment from memory or a stream, without writing it to a file first.
+
+        Args:
+            asset_type (str): One of "image", "video", "audio" or "file".
+            attachment: The content: bytes, bytearray, memoryview, a binary file object,
+                an iterable of bytes chunks or a file path. Large files are memory-mapped.
+            recipient_id (str): The recipient id.
+            is_reusable (str, optional): Whether the attachment can be sent again by id. Defaults to "true".
+            filename (str, optional): The file name shown to the recipient. Defaults to "attachment".
+            mimetype (str, optional): The MIME type, detected from filename or the first bytes if None.
+            progress (callable, optional): Called as progress(bytes_sent, total_bytes) while
+                uploading, total_bytes is None for iterables.
+
+        Returns:
+            dict: The response body from Facebook's API server.
+        """
+        if asset_type not in ASSET_TYPES:
+            raise ValueError("asset_type must be one of image, video, audio, or file")
+        return self.__send_attachment_source(
+            asset_type, attachment, recipient_id, is_reusable, mimetype, filename, progress)
+
+    @traced
     def send_saved_image(self, attachment_id: str, recipient_id: str):
         """Send a saved image to the recipient.
 
@@ -236,6 +343,7 @@ class SendApi(BaseApiClient):
         """
         return self.__send_saved_attachment(attachment_id, "image", recipient_id)
 
+    @traced
     def send_saved_video(self, attachment_id: str, recipient_id: str):
         """Send a saved video to the recipient.
 
@@ -248,6 +356,7 @@ class SendApi(BaseApiClient):
         """
         return self.__send_saved_attachment(attachment_id, "video", recipient_id)
 
+    @traced
     def send_saved_audio(self, attachment_id: str, recipient_id: str):
         """Send a saved audio to the recipient.
 
@@ -260,6 +369,7 @@ class SendApi(BaseApiClient):
         """
         return self.__send_saved_attachment(attachment_id, "audio", recipient_id)
 
+    @traced
     def send_saved_file(self, attachment_id: str, recipient_id: str):
         """Send a saved file to the recipient.
 
@@ -272,12 +382,13 @@ class SendApi(BaseApiClient):
         """
         return self.__send_saved_attachment(attachment_id, "file", recipient_id)
 
+    @traced
     def send_buttons(self, text: str, buttons: list, recipient_id: str):
         """Send a button message (https://developers.facebook.com/docs/messenger-platform/send-messages/template/button)
 
         Args:
             text (str): The text to accompagny the button.
-            buttons (list): A list of Button objects.
+            buttons (list): A list of Button objects, or the fragment of a compiled Buttons object.
             recipient_id (str): The recipient id.
 
         Returns:
@@ -299,10 +410,8 @@ class SendApi(BaseApiClient):
             }
         }
 
-        return requests.post(
-            self.get_def_api_url() + self.get_def_endpoint(),
-            params={"access_token": self.get_access_token()},
-            json=request_body).json()
+        return self._execute(self._message_request(
+            "send_buttons", request_body, recipient_id=recipient_id))
 
     def __send_sender_actions(self, sender_action: str, recipient_id: str):
         if self.get_alt_api_url() is None:
@@ -315,10 +424,9 @@ class SendApi(BaseApiClient):
             "sender_action": sender_action
         }
 
-        return self._post_json(
-            self.get_alt_api_url() + self.get_def_endpoint(),
-            request_body,
-        )
+        return self._execute(self._message_request(
+            "sender_action", request_body, self.get_alt_api_url() + self.get_def_endpoint(),
+            recipient_id=recipient_id, idempotent=True))
 
     def __send_saved_attachment(self, attachment_id: str, attachment_type: str, recipient_id: str):
         request_body = {
@@ -335,53 +443,55 @@ class SendApi(BaseApiClient):
             }
         }
 
-        return self._post_json(
-            self.get_def_api_url() + self.get_def_endpoint(),
-            request_body,
-        )
+        return self._execute(self._message_request(
+            f"send_saved_{attachment_type}", request_body, recipient_id=recipient_id))
 
     def __send_local_attachment(self, asset_type: str, file_location: str,
         recipient_id: str, is_reusable: str = "true", mimetype: str = None
     ):
+        return self.__send_attachment_source(asset_type, file_location, recipient_id, is_reusable, mimetype)
+
+    def __send_attachment_source(self, asset_type: str, source, recipient_id: str,
+        is_reusable: str = "true", mimetype: str = None, filename: str = None, progress=None
+    ):
+        cache_key = None
+        if self.__attachment_cache is not None and is_reusable == "true":
+            cache_key = self.__attachment_cache.source_key(self.__cache_scope, asset_type, source)
+            attachment_id = None if cache_key is None else self.__attachment_cache.get(cache_key)
+            if attachment_id is not None:
+                return self.__send_saved_attachment(attachment_id, asset_type, recipient_id)
+
         if mimetype is None:
-            extensions = (".mp3", ".pdf")
-            for extension in extensions:
-                if file_location.endswith(extension):
-                    mimetype = "application/octet-stream"
-                    break
-                elif extension == extensions[-1]:
-                    mimetype = magic.Magic(mime=True).from_file(file_location)
-        else:
-            mimetype = mimetype
-
-        with open(file_location, "rb") as file_data:
-            multipart_data = MultipartEncoder(
-                fields={
-                    "recipient": json.dumps({"id": recipient_id}),
-                    "message": json.dumps(
-                        {
-                            "attachment": {
-                                "type": asset_type,
-                                "payload": {
-                                    "is_reusable": is_reusable
-                                }
+            started_at = time.perf_counter()
+            source, mimetype = detect_source_mimetype(source, filename)
+            record_phase("mime", started_at)
+
+        api_url = (
+            f"{self.get_def_api_url()}{self.get_def_endpoint()}"
+            if self.get_alt_api_url() is None
+            else f"{self.get_alt_api_url()}{self.get_def_endpoint()}"
+        )
+        return self._execute(GraphRequest(
+            "POST",
+            api_url,
+            f"send_local_{asset_type}",
+            fields={
+                "recipient": json.dumps({"id": recipient_id}),
+                "message": json.dumps(
+                    {
+                        "attachment": {
+                            "type": asset_type,
+                            "payload": {
+                                "is_reusable": is_reusable
                             }
                         }
-                    ),
-                    "filedata": (
-                        os.path.basename(file_location),
-                        file_data,
-                        mimetype
-                    )
-                }
-            )
-
-            api_url = (
-                f"{self.get_def_api_url()}{self.get_def_endpoint()}"
-                if self.get_alt_api_url() is None
-                else f"{self.get_alt_api_url()}{self.get_def_endpoint()}"
-            )
-            return self._post_multipart(api_url, multipart_data, multipart_data.content_type)
+                    }
+                ),
+            },
+            files={"filedata": FilePart(source, mimetype, filename, progress, start_offset(source))},
+            parse=None if cache_key is None else self.__attachment_cache.remember(cache_key),
+            recipient_id=recipient_id,
+        ))
 
     def __send_attachment_message(self, attachment_type: str, attachment_url: str,
         recipient_id: str, is_reusable: str = "false"
@@ -401,39 +511,155 @@ class SendApi(BaseApiClient):
             }
         }
 
-        return self._post_json(
-            self.get_def_api_url() + self.get_def_endpoint(),
-            request_body,
-        )
+        return self._execute(self._message_request(
+            f"send_{attachment_type}_attachment", request_body, recipient_id=recipient_id))
 
+    @traced
     def send_batch_image_attachments(self, image_urls: list, recipient_id: str):
-        if self.get_page_id() is None:
-            raise ValueError("The page id is not defined for this instance.")
+        """Send several images to the recipient in a single batch request.
+
+        Args:
+            image_urls (list): The urls of the images, up to 50 are sent per request.
+            recipient_id (str): The recipient id.
+
+        Returns:
+            list: The response body of each image message, in order.
+        """
+        return self._image_batch(image_urls, recipient_id).execute()
 
-        batch_request_body = []
+    def _image_batch(self, image_urls: list, recipient_id: str):
+        batch = GraphBatch(self)
+        batch_api = batch.bind(self)
         for image_url in image_urls:
-            request_body = {
-                "method": "POST",
-                "relative_url": f"{self.get_page_id()}" + self.get_def_endpoint(),
-                "body": urlencode({
-                    "recipient": {"id": recipient_id},
-                    "message": {
-                        "attachment": {
-                            "type": "image",
-                            "payload": {
-                                "url": image_url,
-                                "is_reusable": "true"
-                            }
-                        }
-                    }
-                }, doseq=False)
-            }
-            batch_request_body.append(request_body)
+            batch_api.send_image_attachment(image_url, recipient_id, is_reusable="true")
+        return batch
+
+    def broadcast(self, message: dict, recipients: Iterable[str],
+        messaging_type: str = MessagingType.UPDATE,
+        notification_type: str = NotificationType.REGULAR,
+        tag: Optional[str] = None, max_in_flight: int = 10,
+        idempotency_key: Optional[str] = None
+    ) -> Iterator[BroadcastResult]:
+        """Send the same message to many recipients.
+
+        The request body is JSON-encoded once, each request only splices the recipient id in.
+
+        Args:
+            message (dict): The message object, e.g. {"text": ...} or a template attachment.
+            recipients (iterable): The recipient ids, consumed lazily.
+            messaging_type (str, optional): The messaging type. Defaults to "UPDATE".
+            notification_type (str, optional): The notification type. Defaults to "REGULAR".
+            tag (str, optional): The message tag, required with the "MESSAGE_TAG" messaging type.
+            max_in_flight (int, optional): The maximum number of concurrent requests. Defaults to 10.
+            idempotency_key (str, optional): The key of this broadcast, with an Outbox: the request
+                of each recipient gets the key "<idempotency_key>:<recipient_id>", so sending the
+                broadcast again skips the recipients who already received it.
+
+        Yields:
+            BroadcastResult: The outcome for each recipient, in completion order.
+        """
+        prepared = self._prepare_broadcast(message, messaging_type, notification_type, tag, max_in_flight)
+        return self._send_concurrently(
+            ((recipient_id, self._broadcast_request(prepared, recipient_id, idempotency_key))
+             for recipient_id in recipients),
+            max_in_flight,
+        )
+
+    @traced
+    def send_encoded_message(self, request_body: bytes):
+        """Send a request body that is already JSON-encoded, e.g. rendered by a MessageTemplate.
+
+        Args:
+            request_body (bytes): The encoded request body, including the recipient.
+
+        Returns:
+            dict: The response body from Facebook's API server.
+        """
+        if not isinstance(request_body, bytes) or not request_body:
+            raise TypeError("request_body must be non-empty bytes")
+        return self._execute(self._message_request("send_encoded_message", request_body))
+
+    def send_encoded_messages(self, messages: Iterable[EncodedMessage], max_in_flight: int = 10,
+        idempotency_key: Optional[str] = None
+    ) -> Iterator[BroadcastResult]:
+        """Send many JSON-encoded request bodies concurrently, e.g. rendered by a MessageTemplate.
+
+        Args:
+            messages (iterable): EncodedMessage or (recipient_id, request_body) tuples, consumed lazily.
+            max_in_flight (int, optional): The maximum number of concurrent requests. Defaults to 10.
+            idempotency_key (str, optional): The key of these messages, with an Outbox, as in broadcast().
+
+        Yields:
+            BroadcastResult: The outcome for each recipient, in completion order.
+        """
+        if max_in_flight <= 0:
+            raise ValueError("max_in_flight must be greater than 0")
+        return self._send_concurrently(
+            ((recipient_id, self._encoded_request(recipient_id, request_body, idempotency_key))
+             for recipient_id, request_body in messages),
+            max_in_flight,
+        )
+
+    def _send_concurrently(self, requests: Iterable, max_in_flight: int) -> Iterator[BroadcastResult]:
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            in_flight = {}
+            for recipient_id, request in requests:
+                if len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield _broadcast_result(in_flight.pop(future), future)
+                in_flight[executor.submit(self._execute, request)] = recipient_id
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield _broadcast_result(in_flight.pop(future), future)
+
+    def _prepare_broadcast(self, message: dict, messaging_type: str, notification_type: str,
+        tag: Optional[str], max_in_flight: int
+    ):
+        if not isinstance(message, dict) or not message:
+            raise TypeError("message must be a non-empty dictionary")
+        _validate_messaging_type(messaging_type, tag)
+        if max_in_flight <= 0:
+            raise ValueError("max_in_flight must be greater than 0")
+
         request_body = {
-            "batch": batch_request_body
+            "messaging_type": messaging_type,
+            "notification_type": notification_type,
+            "message": message
         }
+        if messaging_type == MessagingType.MESSAGE_TAG:
+            request_body["tag"] = tag
+        return PreparedMessage(request_body)
 
-        return self._post_json(
-            f"https://graph.facebook.com/{self.get_graph_version()}",
-            request_body,
+    def _broadcast_request(self, prepared: PreparedMessage, recipient_id: str,
+        idempotency_key: Optional[str] = None
+    ):
+        return self._message_request(
+            "broadcast", prepared.for_recipient(recipient_id),
+            idempotency_key=_recipient_key(idempotency_key, recipient_id),
+            recipient_id=recipient_id,
         )
+
+    def _encoded_request(self, recipient_id: str, request_body: bytes,
+        idempotency_key: Optional[str] = None
+    ):
+        return self._message_request(
+            "send_encoded_message", request_body,
+            idempotency_key=_recipient_key(idempotency_key, recipient_id),
+            recipient_id=recipient_id,
+        )
+
+
+def _recipient_key(idempotency_key: Optional[str], recipient_id: str) -> Optional[str]:
+    return None if idempotency_key is None else f"{idempotency_key}:{recipient_id}"
+
+
+def _broadcast_result(recipient_id: str, future: "Future") -> BroadcastResult:
+    error = future.exception()
+    if error is not None:
+        return BroadcastResult(recipient_id, error=error)
+    return BroadcastResult(recipient_id, future.result())
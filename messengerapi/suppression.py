@@ -0,0 +1,238 @@
+"""The recipients that cannot be messaged for now, so that sends to them are skipped."""
+
+from __future__ import annotations
+
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any, Mapping, Union
+
+from .exceptions import SuppressedError
+
+OUTSIDE_WINDOW = "outside_window"
+BLOCKED = "blocked"
+INVALID_RECIPIENT = "invalid_recipient"
+
+REASONS = (OUTSIDE_WINDOW, BLOCKED, INVALID_RECIPIENT)
+
+DEFAULT_EXPIRY = {
+    OUTSIDE_WINDOW: 24 * 3600.0,
+    BLOCKED: 30 * 24 * 3600.0,
+    INVALID_RECIPIENT: 365 * 24 * 3600.0,
+}
+"""Seconds a recipient stays suppressed, per reason."""
+
+_MAGIC = b"MSUP\x01"
+_HEADER = struct.Struct("<5scQQ")
+# PSIDs are stored as 64-bit integers, other recipient ids as strings.
+_MAX_INT_KEY_DIGITS = 19
+_MIN_MERGE = 1024
+
+
+def reason_of(error: BaseException) -> str | None:
+    """Return why error means its recipient cannot be messaged, None if it does not.
+
+    Error code 100 is also returned for invalid message bodies, only its subcode
+    2018001, "No matching user found", is about the recipient.
+    """
+    code = getattr(error, "code", None)
+    subcode = getattr(error, "subcode", None)
+    if code == 10 and subcode == 2018278:
+        return OUTSIDE_WINDOW
+    if code == 551:
+        return BLOCKED
+    if code == 100 and subcode == 2018001:
+        return INVALID_RECIPIENT
+    return None
+
+
+class SuppressionList:
+    """Recipients that failed permanently, skipped by the send methods until their entry expires.
+
+    Clients given a SuppressionList learn from the failures of their sends: a recipient
+    outside the 24 hour messaging window, who blocked the page or who does not exist is
+    added, and later sends to them raise a SuppressedError without a request.
+
+    PSIDs are kept in sorted arrays, about 13 bytes per recipient, and looked up by
+    bisection, so that lists of tens of millions of recipients stay cheap.
+
+    Args:
+        path (str, optional): The file the list is loaded from, if it exists, and saved to by
+            save(). Defaults to None, a list that only lasts as long as the process.
+        expiry (mapping, optional): Seconds a recipient stays suppressed, per reason, overriding
+            DEFAULT_EXPIRY: 1 day outside the messaging window, 30 days blocked, 365 days invalid.
+
+    Example:
+        suppression = SuppressionList("suppressed.bin")
+        send_api = SendApi(<page_access_token>, suppression=suppression)
+        for result in send_api.broadcast(<message>, <recipient_ids>):
+            ...
+        suppression.save()
+    """
+
+    def __init__(self, path: str | None = None, *, expiry: Mapping[str, float] | None = None) -> None:
+        expiry = dict(expiry or {})
+        unknown = set(expiry) - set(REASONS)
+        if unknown:
+            raise ValueError(f"unknown suppression reasons: {', '.join(sorted(unknown))}")
+        if any(seconds <= 0 for seconds in expiry.values()):
+            raise ValueError("expiry seconds must be greater than 0")
+
+        self._path = path
+        self._expiry = {**DEFAULT_EXPIRY, **expiry}
+        self._lock = threading.Lock()
+        self._keys = array("Q")
+        self._expires = array("I")
+        self._reasons = array("B")
+        # Entries added since the last merge into the arrays, and every non-PSID recipient.
+        self._recent: dict[Union[int, str], tuple[int, int]] = {}
+        if path is not None and os.path.exists(path):
+            self._load(path)
+
+    def add(self, recipient_id: str, reason: str, ttl: float | None = None) -> None:
+        """Suppress a recipient for ttl seconds, by default the expiry of reason."""
+        if reason not in REASONS:
+            raise ValueError(f"reason must be one of {', '.join(REASONS)}")
+        if ttl is None:
+            ttl = self._expiry[reason]
+        elif ttl <= 0:
+            raise ValueError("ttl must be greater than 0")
+        key = _key(recipient_id)
+        expires_at = min(int(time.time() + ttl), 0xFFFFFFFF)
+        with self._lock:
+            self._recent[key] = (expires_at, REASONS.index(reason))
+            if len(self._recent) > max(_MIN_MERGE, len(self._keys) // 8):
+                self._merge()
+
+    def learn(self, recipient_id: str, error: BaseException) -> str | None:
+        """Suppress a recipient if error says they cannot be messaged, and return the reason."""
+        reason = reason_of(error)
+        if reason is not None:
+            self.add(recipient_id, reason)
+        return reason
+
+    def discard(self, recipient_id: str) -> None:
+        """Stop suppressing a recipient, e.g. when they message the page again."""
+        key = _key(recipient_id)
+        with self._lock:
+            self._recent.pop(key, None)
+            index = self._find(key)
+            if index is not None:
+                self._expires[index] = 0
+
+    def reason(self, recipient_id: str) -> str | None:
+        """Return why a recipient is suppressed, None if they are not."""
+        key = _key(recipient_id)
+        now = time.time()
+        with self._lock:
+            entry = self._recent.get(key)
+            if entry is None:
+                index = self._find(key)
+                if index is None:
+                    return None
+                entry = (self._expires[index], self._reasons[index])
+        if entry[0] <= now:
+            return None
+        return REASONS[entry[1]]
+
+    def __contains__(self, recipient_id: Any) -> bool:
+        return self.reason(recipient_id) is not None
+
+    def compact(self) -> None:
+        """Drop the expired and discarded entries, to free their memory."""
+        now = int(time.time())
+        with self._lock:
+            self._merge()
+            keys, expires, reasons = array("Q"), array("I"), array("B")
+            for key, expires_at, reason in zip(self._keys, self._expires, self._reasons):
+                if expires_at > now:
+                    keys.append(key)
+                    expires.append(expires_at)
+                    reasons.append(reason)
+            self._keys, self._expires, self._reasons = keys, expires, reasons
+            self._recent = {key: entry for key, entry in self._recent.items() if entry[0] > now}
+
+    def save(self, path: str | None = None) -> None:
+        """Write the list to path, by default the one it was created with, replacing the file."""
+        path = path or self._path
+        if path is None:
+            raise ValueError("path is required for a list created without one")
+        self.compact()
+        with self._lock:
+            self._merge()
+            others = {key: entry for key, entry in self._recent.items() if isinstance(key, str)}
+            temporary = f"{path}.tmp"
+            with open(temporary, "wb") as file:
+                file.write(_HEADER.pack(
+                    _MAGIC, sys.byteorder[0].encode(), len(self._keys), len(others)))
+                self._keys.tofile(file)
+                self._expires.tofile(file)
+                self._reasons.tofile(file)
+                file.write(json.dumps(others).encode())
+            os.replace(temporary, path)
+
+    def _load(self, path: str) -> None:
+        with open(path, "rb") as file:
+            magic, byteorder, count, _ = _HEADER.unpack(file.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f"{path} is not a suppression list")
+            self._keys.fromfile(file, count)
+            self._expires.fromfile(file, count)
+            self._reasons.fromfile(file, count)
+            others = json.loads(file.read() or b"{}")
+        if byteorder != sys.byteorder[0].encode():
+            self._keys.byteswap()
+            self._expires.byteswap()
+        self._recent = {key: tuple(entry) for key, entry in others.items()}
+
+    def _find(self, key: Union[int, str]) -> int | None:
+        if isinstance(key, str):
+            return None
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            return index
+        return None
+
+    def _merge(self) -> None:
+        """Move the recent PSIDs into the sorted arrays, replacing their former entries."""
+        recent = sorted((key, entry) for key, entry in self._recent.items() if isinstance(key, int))
+        if not recent:
+            return
+        old_keys, old_expires, old_reasons = self._keys, self._expires, self._reasons
+        keys, expires, reasons = array("Q"), array("I"), array("B")
+        start = 0
+        for key, (expires_at, reason) in recent:
+            index = bisect_left(old_keys, key, start)
+            keys.extend(old_keys[start:index])
+            expires.extend(old_expires[start:index])
+            reasons.extend(old_reasons[start:index])
+            keys.append(key)
+            expires.append(expires_at)
+            reasons.append(reason)
+            start = index + 1 if index < len(old_keys) and old_keys[index] == key else index
+        keys.extend(old_keys[start:])
+        expires.extend(old_expires[start:])
+        reasons.extend(old_reasons[start:])
+        self._keys, self._expires, self._reasons = keys, expires, reasons
+        self._recent = {key: entry for key, entry in self._recent.items() if isinstance(key, str)}
+
+
+def _key(recipient_id: Any) -> Union[int, str]:
+    recipient_id = str(recipient_id)
+    if (recipient_id.isdigit() and recipient_id[0] != "0"
+            and len(recipient_id) <= _MAX_INT_KEY_DIGITS):
+        return int(recipient_id)
+    return recipient_id
+
+
+def _suppressed_error(suppression: SuppressionList, recipient_id: str) -> SuppressedError | None:
+    """Return the error of a send to recipient_id skipped by suppression, None if it is not."""
+    reason = suppression.reason(recipient_id)
+    if reason is None:
+        return None
+    return SuppressedError(recipient_id, reason)
@@ -0,0 +1,170 @@
+"""Bulk personalization of messages from columnar data.
+
+A MessageTemplate is a message with $name placeholders, encoded once. Rendering it for many
+recipients only escapes the values of the placeholders and splices them between the
+pre-encoded parts of the request body, nothing else is encoded again.
+
+Example:
+    template = MessageTemplate({"text": "Hello ${first_name} !"})
+    messages = template.render({"recipient_id": [...], "first_name": [...]})
+    for result in send_api.send_encoded_messages(messages):
+        ...
+"""
+
+from __future__ import annotations
+
+import re
+from json.encoder import encode_basestring_ascii
+from typing import Any, Iterator, Sequence
+
+from ._json import dumps as dumps_json
+from .constants import MessagingType, NotificationType
+from .send_api import EncodedMessage, _validate_messaging_type
+
+# The syntax of string.Template: $name or ${name}, with $$ for a literal $.
+# JSON-encoded text only has $ characters inside strings, so the placeholders
+# can be searched for in the string values of the encoded body, keys are
+# followed by a colon.
+_PLACEHOLDER = re.compile(
+    r"\$(?:(?P<escaped>\$)|(?P<named>[_a-z][_a-z0-9]*)|\{(?P<braced>[_a-z][_a-z0-9]*)\})", re.I)
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"(?P<key>\s*:)?')
+_IDENTIFIER = re.compile(r"[_a-z][_a-z0-9]*", re.I)
+
+
+class MessageTemplate:
+    """A Send API message whose strings contain $name placeholders, filled in per recipient.
+
+    Args:
+        message: The message object, e.g. {"text": ...} or a template attachment. Its string
+            values may contain $name or ${name} placeholders, $$ stands for a literal $.
+            It may contain components and JsonFragment objects, whose strings may too.
+        messaging_type (str, optional): The messaging type. Defaults to "UPDATE".
+        notification_type (str, optional): The notification type. Defaults to "REGULAR".
+        tag (str, optional): The message tag, required with the "MESSAGE_TAG" messaging type.
+        recipient_column (str, optional): The column holding the recipient ids. Defaults to "recipient_id".
+
+    Notes:
+        Placeholders are only filled in string values, never in keys or numbers.
+        Values that are not strings are converted with str(), None becomes an empty string.
+    """
+
+    __slots__ = ("_format", "_columns", "_recipient_column")
+
+    def __init__(self, message: Any, messaging_type: str = MessagingType.UPDATE,
+        notification_type: str = NotificationType.REGULAR, tag: str | None = None,
+        recipient_column: str = "recipient_id"
+    ) -> None:
+        if not message:
+            raise TypeError("message must be a non-empty dictionary")
+        _validate_messaging_type(messaging_type, tag)
+        if not _IDENTIFIER.fullmatch(recipient_column):
+            raise ValueError("recipient_column must be a valid identifier")
+
+        request_body = {
+            "recipient": {"id": f"${{{recipient_column}}}"},
+            "messaging_type": messaging_type,
+            "notification_type": notification_type,
+            "message": message,
+        }
+        if messaging_type == MessagingType.MESSAGE_TAG:
+            request_body["tag"] = tag
+
+        literals = []
+        columns = []
+        encoded = dumps_json(request_body)
+        position = 0
+        for string in _STRING.finditer(encoded):
+            if string["key"]:
+                continue
+            for match in _PLACEHOLDER.finditer(encoded, string.start(), string.end()):
+                literals.append(encoded[position:match.start()].replace("%", "%%"))
+                if match["escaped"]:
+                    literals.append("$")
+                else:
+                    literals.append("%s")
+                    columns.append(match["named"] or match["braced"])
+                position = match.end()
+        literals.append(encoded[position:].replace("%", "%%"))
+
+        self._format = "".join(literals)
+        self._columns = tuple(columns)
+        self._recipient_column = recipient_column
+
+    @property
+    def columns(self) -> tuple[str, ...]:
+        """The names of the placeholders, in the order they appear in the request body."""
+        return tuple(dict.fromkeys(self._columns))
+
+    def render(self, data: Any) -> RenderedMessages:
+        """Render the request body of every recipient.
+
+        Args:
+            data: The columns, by placeholder name, all of the same length: a mapping of
+                lists or NumPy arrays, a pandas DataFrame or a pyarrow Table.
+
+        Returns:
+            RenderedMessages: An EncodedMessage per row, to give to SendApi.send_encoded_messages().
+        """
+        recipient_ids = _texts(_column(data, self._recipient_column))
+        escaped = {}
+        for name in self.columns:
+            values = recipient_ids if name == self._recipient_column else _column(data, name)
+            if len(values) != len(recipient_ids):
+                raise ValueError(
+                    f"column {name} has {len(values)} values, expected {len(recipient_ids)}")
+            quoted = map(encode_basestring_ascii, values if values is recipient_ids else _texts(values))
+            escaped[name] = [value[1:-1] for value in quoted]
+
+        body_format = self._format
+        bodies = [(body_format % row).encode() for row in zip(*(escaped[name] for name in self._columns))]
+        return RenderedMessages(recipient_ids, bodies)
+
+
+class RenderedMessages(Sequence[EncodedMessage]):
+    """The messages rendered by a MessageTemplate, a sequence of EncodedMessage.
+
+    The recipient ids and the request bodies are kept in two lists, the EncodedMessage
+    tuples are only created when iterating, so that millions of messages don't slow
+    the garbage collector down.
+    """
+
+    __slots__ = ("recipient_ids", "request_bodies")
+
+    def __init__(self, recipient_ids: list[str], request_bodies: list[bytes]) -> None:
+        self.recipient_ids = recipient_ids
+        self.request_bodies = request_bodies
+
+    def __len__(self) -> int:
+        return len(self.request_bodies)
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return RenderedMessages(self.recipient_ids[index], self.request_bodies[index])
+        return EncodedMessage(self.recipient_ids[index], self.request_bodies[index])
+
+    def __iter__(self) -> Iterator[EncodedMessage]:
+        return map(EncodedMessage._make, zip(self.recipient_ids, self.request_bodies))
+
+
+def _texts(values: list) -> list[str]:
+    if None in values:
+        return ["" if value is None else str(value) for value in values]
+    return list(map(str, values))
+
+
+def _column(data: Any, name: str) -> list:
+    if hasattr(data, "column") and hasattr(data, "num_rows"):  # pyarrow.Table
+        if name not in data.column_names:
+            raise KeyError(f"missing column {name}")
+        return data.column(name).to_pylist()
+    if hasattr(data, "__getitem__"):
+        try:
+            values = data[name]
+        except (KeyError, IndexError, ValueError) as error:
+            raise KeyError(f"missing column {name}") from error
+        if hasattr(values, "to_pylist"):
+            return values.to_pylist()
+        if hasattr(values, "tolist"):  # NumPy arrays and pandas Series
+            return values.tolist()
+        return list(values)
+    raise TypeError(f"data must be a mapping of columns or a table, not {type(data)}")
@@ -0,0 +1,204 @@
+"""Wrapper for the User Profile API (https://developers.facebook.com/docs/messenger-platform/identity/user-profile)"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Iterable, Optional, Union
+from urllib.parse import urlencode
+
+from ._base_api import BaseApiClient, GraphRequest
+from ._cache import MISSING, TTLCache
+from .batch import MAX_BATCH_SIZE, GraphBatch
+from .constants import API_VERSION
+from .exceptions import GraphApiError
+from .hooks import traced
+
+DEFAULT_FIELDS = ("first_name", "last_name", "profile_pic", "locale")
+
+
+class UserProfileApi(BaseApiClient):
+    """Looks up the profile of the people messaging the page, with a bounded LRU cache.
+
+    Concurrent lookups of the same user share a single request, and get_user_profiles()
+    fetches the users missing from the cache in batch requests of up to 50 users.
+
+    Example:
+        user_profile_api = UserProfileApi(<page_access_token>, ttl=3600)
+        profile = user_profile_api.get_user_profile(<psid>)
+        greeting = f"Hi {profile['first_name']}!"
+    """
+
+    def __init__(
+        self,
+        page_access_token: str,
+        *,
+        timeout: float = 30.0,
+        fields: Iterable[str] = DEFAULT_FIELDS,
+        ttl: float = 3600.0,
+        max_entries: int = 10_000,
+        **kwargs,
+    ) -> None:
+        """
+        Args:
+            fields (iterable, optional): The profile fields to get. Defaults to first_name,
+                last_name, profile_pic and locale.
+            ttl (float, optional): Seconds a profile is cached. Defaults to 3600.
+            max_entries (int, optional): The profiles kept, the least recently used are evicted
+                first. Defaults to 10000.
+            Other keyword arguments are passed to BaseApiClient.
+        """
+        super().__init__(page_access_token, timeout=timeout, **kwargs)
+        fields = tuple(fields)
+        if not fields or not all(isinstance(field, str) and field for field in fields):
+            raise ValueError("fields must be a non-empty list of field names")
+        self.__graph_version = API_VERSION
+        self.__api_url = f"{self.get_graph_url()}/v{self.__graph_version}"
+        self.__fields = ",".join(fields)
+        self._cache = TTLCache(ttl, max_entries)
+        self._lock = threading.Lock()
+        self._in_flight: dict[str, Any] = {}
+
+    def get_api_url(self) -> str:
+        return self.__api_url
+
+    def get_graph_version(self) -> str:
+        return self.__graph_version
+
+    def get_fields(self) -> str:
+        return self.__fields
+
+    @traced
+    def get_user_profile(self, user_id: str):
+        """Get the profile of a user, from the cache if it was looked up recently.
+
+        Args:
+            user_id (str): The PSID of the user.
+
+        Returns:
+            dict: The requested fields of the user's profile, and their id.
+        """
+        user_id = _validate_user_id(user_id)
+        profile = self._cache.get(user_id)
+        if profile is not MISSING:
+            return self._resolved(profile)
+        if self._deferred:
+            return self._execute(self._profile_request(user_id))
+
+        future, owner = self._join_lookup(user_id)
+        if not owner:
+            return future.result()
+        try:
+            profile = self._execute(self._profile_request(user_id))
+        except BaseException as error:
+            self._finish_lookup(user_id, future, error=error)
+            raise
+        self._finish_lookup(user_id, future, profile)
+        return profile
+
+    def get_user_profiles(self, user_ids: Iterable[str]) -> dict[str, Union[dict, GraphApiError]]:
+        """Get the profiles of many users, fetching those missing from the cache in batch requests.
+
+        Args:
+            user_ids (iterable): The PSIDs of the users.
+
+        Returns:
+            dict: The profile of each user, or the GraphApiError its lookup failed with.
+        """
+        results: dict[str, Any] = {}
+        waiting = {}
+        misses = []
+        for user_id in map(_validate_user_id, user_ids):
+            if user_id in results or user_id in waiting:
+                continue
+            profile = self._cache.get(user_id)
+            if profile is not MISSING:
+                results[user_id] = profile
+                continue
+            future, owner = self._join_lookup(user_id)
+            if owner:
+                misses.append((user_id, future))
+            else:
+                waiting[user_id] = future
+
+        for start in range(0, len(misses), MAX_BATCH_SIZE):
+            chunk = misses[start:start + MAX_BATCH_SIZE]
+            try:
+                outcomes = self._fetch([user_id for user_id, _ in chunk])
+            except BaseException as error:
+                for user_id, future in misses[start:]:
+                    self._finish_lookup(user_id, future, error=error)
+                raise
+            for (user_id, future), outcome in zip(chunk, outcomes):
+                self._finish_outcome(user_id, future, outcome)
+                results[user_id] = outcome
+
+        for user_id, future in waiting.items():
+            error = future.exception()
+            results[user_id] = error if error is not None else future.result()
+        return results
+
+    def clear_cache(self) -> None:
+        """Forget the cached profiles, so that they are looked up again."""
+        self._cache.clear()
+
+    def _profile_request(self, user_id: str, operation: str = "get_user_profile") -> GraphRequest:
+        return GraphRequest(
+            "GET",
+            f"{self.get_api_url()}/{user_id}?{urlencode({'fields': self.__fields})}",
+            operation,
+            parse=lambda response_body: self._remember(user_id, response_body),
+        )
+
+    def _fetch(self, user_ids: list) -> list:
+        """Look up the profiles of user_ids, with a batch request if there is more than one."""
+        if len(user_ids) == 1:
+            try:
+                return [self._execute(self._profile_request(user_ids[0]))]
+            except GraphApiError as error:
+                return [error]
+        batch = GraphBatch(self)
+        for user_id in user_ids:
+            batch.add(self._profile_request(user_id))
+        return batch.execute()
+
+    def _remember(self, user_id: str, profile: Any) -> Any:
+        self._cache.put(user_id, profile)
+        return profile
+
+    def _join_lookup(self, user_id: str) -> tuple[Any, bool]:
+        """Return the pending lookup of user_id, and whether the caller just started it."""
+        with self._lock:
+            future = self._in_flight.get(user_id)
+            if future is not None:
+                return future, False
+            future = self._in_flight[user_id] = self._new_lookup()
+            return future, True
+
+    def _new_lookup(self) -> Any:
+        from concurrent.futures import Future
+
+        return Future()
+
+    def _finish_lookup(self, user_id: str, future: Any, profile: Any = None,
+        error: Optional[BaseException] = None
+    ) -> None:
+        with self._lock:
+            self._in_flight.pop(user_id, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(profile)
+
+    def _finish_outcome(self, user_id: str, future: Any, outcome: Any) -> None:
+        if isinstance(outcome, BaseException):
+            self._finish_lookup(user_id, future, error=outcome)
+        else:
+            self._finish_lookup(user_id, future, outcome)
+
+
+def _validate_user_id(user_id: Any) -> str:
+    if isinstance(user_id, int) and not isinstance(user_id, bool):
+        user_id = str(user_id)
+    if not isinstance(user_id, str) or not user_id.isdigit():
+        raise ValueError("user_id must be a numeric PSID")
+    return user_id
@@ -0,0 +1,446 @@
+"""Receiver of Messenger Platform webhooks (https://developers.facebook.com/docs/messenger-platform/webhooks)
+
+Webhook handles the hub.challenge handshake, verifies the X-Hub-Signature-256 header of
+callbacks and parses their entry[].messaging[] items into events. It can be used from any
+framework, or served directly as a WSGI or ASGI application.
+
+Example:
+    def handle(events):
+        for event in events:
+            if isinstance(event, MessageEvent):
+                send_api.send_text_message(event.text, event.sender_id)
+
+    webhook = Webhook(<verify_token>, <app_secret>, handle)
+    application = webhook.wsgi_app  # or webhook.asgi_app
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import inspect
+import json
+from typing import Any, Callable, Iterable, Iterator, Mapping, Optional
+from urllib.parse import parse_qsl
+
+SIGNATURE_HEADER = "X-Hub-Signature-256"
+_SIGNATURE_PREFIX = "sha256="
+_CHUNK_SIZE = 1 << 16
+
+
+class InvalidSignatureError(ValueError):
+    """A callback whose X-Hub-Signature-256 header is missing or does not match its body."""
+
+
+class SignatureVerifier:
+    """Computes the signature of a body fed in chunks, as they are received.
+
+    Args:
+        app_secret (str): The app secret, Facebook signs the callbacks with it.
+    """
+
+    __slots__ = ("_hmac",)
+
+    def __init__(self, app_secret: str) -> None:
+        self._hmac = hmac.new(app_secret.encode(), digestmod=hashlib.sha256)
+
+    def update(self, chunk: bytes) -> None:
+        self._hmac.update(chunk)
+
+    def verify(self, signature: Optional[str]) -> bool:
+        """Whether signature, the X-Hub-Signature-256 header, matches the body, in constant time."""
+        if not signature or not signature.startswith(_SIGNATURE_PREFIX):
+            return False
+        return hmac.compare_digest(
+            self._hmac.hexdigest(), signature[len(_SIGNATURE_PREFIX):].strip().lower())
+
+
+def verify_signature(app_secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """Whether signature, the X-Hub-Signature-256 header of a callback, matches its body."""
+    verifier = SignatureVerifier(app_secret)
+    verifier.update(body)
+    return verifier.verify(signature)
+
+
+class Event:
+    """An item of the messaging array of a callback.
+
+    The fields are read from the raw item when accessed, nothing is copied.
+    Items of unknown types are parsed as Event.
+    """
+
+    __slots__ = ("_raw", "_page_id")
+
+    def __init__(self, raw: dict, page_id: Optional[str] = None) -> None:
+        self._raw = raw
+        self._page_id = page_id
+
+    @property
+    def raw(self) -> dict:
+        """The item, as sent by Facebook."""
+        return self._raw
+
+    @property
+    def page_id(self) -> Optional[str]:
+        """The id of the page of the entry holding this item."""
+        return self._page_id
+
+    @property
+    def sender_id(self) -> Optional[str]:
+        return self._raw.get("sender", {}).get("id")
+
+    @property
+    def recipient_id(self) -> Optional[str]:
+        return self._raw.get("recipient", {}).get("id")
+
+    @property
+    def timestamp(self) -> Optional[int]:
+        return self._raw.get("timestamp")
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(sender_id={self.sender_id!r}, timestamp={self.timestamp!r})"
+
+
+class MessageEvent(Event):
+    """A message sent to the page, or an echo of a message sent by the page."""
+
+    __slots__ = ()
+
+    @property
+    def message(self) -> dict:
+        return self._raw["message"]
+
+    @property
+    def mid(self) -> Optional[str]:
+        return self.message.get("mid")
+
+    @property
+    def text(self) -> Optional[str]:
+        return self.message.get("text")
+
+    @property
+    def quick_reply_payload(self) -> Optional[str]:
+        return self.message.get("quick_reply", {}).get("payload")
+
+    @property
+    def attachments(self) -> list:
+        return self.message.get("attachments", [])
+
+    @property
+    def is_echo(self) -> bool:
+        return bool(self.message.get("is_echo"))
+
+
+class PostbackEvent(Event):
+    """A postback button, Get Started button or persistent menu item was tapped."""
+
+    __slots__ = ()
+
+    @property
+    def postback(self) -> dict:
+        return self._raw["postback"]
+
+    @property
+    def title(self) -> Optional[str]:
+        return self.postback.get("title")
+
+    @property
+    def payload(self) -> Optional[str]:
+        return self.postback.get("payload")
+
+    @property
+    def mid(self) -> Optional[str]:
+        return self.postback.get("mid")
+
+
+class DeliveryEvent(Event):
+    """Messages sent by the page were delivered."""
+
+    __slots__ = ()
+
+    @property
+    def mids(self) -> list:
+        return self._raw["delivery"].get("mids", [])
+
+    @property
+    def watermark(self) -> Optional[int]:
+        return self._raw["delivery"].get("watermark")
+
+
+class ReadEvent(Event):
+    """Messages sent by the page were read."""
+
+    __slots__ = ()
+
+    @property
+    def watermark(self) -> Optional[int]:
+        return self._raw["read"].get("watermark")
+
+
+class ReactionEvent(Event):
+    """A reaction to a message was added or removed."""
+
+    __slots__ = ()
+
+    @property
+    def mid(self) -> Optional[str]:
+        return self._raw["reaction"].get("mid")
+
+    @property
+    def action(self) -> Optional[str]:
+        return self._raw["reaction"].get("action")
+
+    @property
+    def reaction(self) -> Optional[str]:
+        return self._raw["reaction"].get("reaction")
+
+    @property
+    def emoji(self) -> Optional[str]:
+        return self._raw["reaction"].get("emoji")
+
+
+class ReferralEvent(Event):
+    """The user came in through an m.me link, an ad or a chat plugin."""
+
+    __slots__ = ()
+
+    @property
+    def ref(self) -> Optional[str]:
+        return self._raw["referral"].get("ref")
+
+    @property
+    def source(self) -> Optional[str]:
+        return self._raw["referral"].get("source")
+
+
+class OptinEvent(Event):
+    """The user opted in, e.g. to recurring notifications."""
+
+    __slots__ = ()
+
+    @property
+    def optin(self) -> dict:
+        return self._raw["optin"]
+
+
+# The event class of a messaging item, by the key identifying its type.
+EVENT_TYPES = {
+    "message": MessageEvent,
+    "postback": PostbackEvent,
+    "delivery": DeliveryEvent,
+    "read": ReadEvent,
+    "reaction": ReactionEvent,
+    "referral": ReferralEvent,
+    "optin": OptinEvent,
+}
+
+
+def parse_events(body: Any) -> Iterator[Event]:
+    """Return the events of a callback, one per entry[].messaging[] item.
+
+    The body is decoded and its structure checked right away, the events are only created
+    while iterating.
+
+    Args:
+        body: The callback body, as bytes, str or already decoded.
+
+    Returns:
+        iterator: The Event objects, instances of the subclass matching their item type if any.
+
+    Raises:
+        ValueError: If the body is not a JSON object, or its entries or their messaging items
+            are not arrays of objects.
+    """
+    if isinstance(body, (bytes, bytearray, str)):
+        body = json.loads(body)
+    if not isinstance(body, dict):
+        raise ValueError("a callback body must be a JSON object")
+    entries = body.get("entry") or []
+    if not isinstance(entries, list):
+        raise ValueError("entry must be an array")
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ValueError("the items of entry must be objects")
+        items = entry.get("messaging") or []
+        if not isinstance(items, list):
+            raise ValueError("messaging must be an array")
+        for item in items:
+            if not isinstance(item, dict):
+                raise ValueError("the items of messaging must be objects")
+    return _iter_events(entries)
+
+
+def _iter_events(entries: Iterable[dict]) -> Iterator[Event]:
+    event_types = EVENT_TYPES
+    for entry in entries:
+        page_id = entry.get("id")
+        for item in entry.get("messaging") or ():
+            event_class = Event
+            for key in item:
+                if key in event_types:
+                    event_class = event_types[key]
+                    break
+            yield event_class(item, page_id)
+
+
+class Webhook:
+    """A webhook endpoint, usable from any framework or as a WSGI or ASGI application.
+
+    Args:
+        verify_token (str): The verify token entered when setting up the webhook.
+        app_secret (str): The app secret, used to verify the signature of the callbacks.
+        handler (callable, optional): Called with an iterable of the Event objects of each
+            callback. The ASGI application awaits it if it is a coroutine function.
+        max_body_size (int, optional): Callbacks larger than this are rejected, in bytes.
+            Defaults to 1 MiB.
+    """
+
+    def __init__(self, verify_token: str, app_secret: str,
+        handler: Optional[Callable[[Iterable[Event]], Any]] = None, *, max_body_size: int = 1 << 20
+    ) -> None:
+        if not isinstance(verify_token, str) or not verify_token:
+            raise ValueError("verify_token must be a non-empty string")
+        if not isinstance(app_secret, str) or not app_secret:
+            raise ValueError("app_secret must be a non-empty string")
+        if max_body_size <= 0:
+            raise ValueError("max_body_size must be greater than 0")
+
+        self._verify_token = verify_token
+        self._app_secret = app_secret
+        self._handler = handler
+        self._max_body_size = max_body_size
+
+    def challenge(self, query: Mapping[str, str]) -> Optional[str]:
+        """Return the hub.challenge to answer a subscription request with, None to reject it.
+
+        Args:
+            query (dict): The query parameters of the GET request.
+        """
+        token = query.get("hub.verify_token") or ""
+        if query.get("hub.mode") != "subscribe" or not hmac.compare_digest(
+                token.encode(), self._verify_token.encode()):
+            return None
+        return query.get("hub.challenge")
+
+    def verifier(self) -> SignatureVerifier:
+        """Return a SignatureVerifier, to feed a body to as it is received."""
+        return SignatureVerifier(self._app_secret)
+
+    def parse(self, body: bytes, signature: Optional[str]) -> Iterator[Event]:
+        """Verify the signature of a callback and return its events.
+
+        Raises:
+            InvalidSignatureError: If signature does not match the body.
+        """
+        if not verify_signature(self._app_secret, body, signature):
+            raise InvalidSignatureError("invalid X-Hub-Signature-256")
+        return parse_events(body)
+
+    def wsgi_app(self, environ: dict, start_response: Callable) -> list:
+        """The webhook as a WSGI application."""
+        method = environ.get("REQUEST_METHOD")
+        if method == "GET":
+            challenge = self.challenge(dict(parse_qsl(environ.get("QUERY_STRING", ""))))
+            if challenge is None:
+                return _wsgi_response(start_response, "403 Forbidden")
+            return _wsgi_response(start_response, "200 OK", challenge.encode())
+        if method != "POST":
+            return _wsgi_response(start_response, "405 Method Not Allowed")
+
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > self._max_body_size:
+            return _wsgi_response(start_response, "413 Payload Too Large")
+
+        verifier = self.verifier()
+        body = bytearray()
+        stream = environ["wsgi.input"]
+        while len(body) < length:
+            chunk = stream.read(min(_CHUNK_SIZE, length - len(body)))
+            if not chunk:
+                break
+            verifier.update(chunk)
+            body += chunk
+
+        if not verifier.verify(environ.get("HTTP_X_HUB_SIGNATURE_256")):
+            return _wsgi_response(start_response, "403 Forbidden")
+        try:
+            events = parse_events(body)
+        except ValueError:
+            return _wsgi_response(start_response, "400 Bad Request")
+        if self._handler is not None:
+            self._handler(events)
+        return _wsgi_response(start_response, "200 OK", b"EVENT_RECEIVED")
+
+    async def asgi_app(self, scope: dict, receive: Callable, send: Callable) -> None:
+        """The webhook as an ASGI application."""
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        method = scope.get("method")
+        if method == "GET":
+            query = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+            challenge = self.challenge(query)
+            if challenge is None:
+                return await _asgi_response(send, 403)
+            return await _asgi_response(send, 200, challenge.encode())
+        if method != "POST":
+            return await _asgi_response(send, 405)
+
+        signature = None
+        for name, value in scope.get("headers", ()):
+            if name.lower() == b"x-hub-signature-256":
+                signature = value.decode("latin-1")
+
+        verifier = self.verifier()
+        body = bytearray()
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunk = message.get("body", b"")
+            if len(body) + len(chunk) > self._max_body_size:
+                return await _asgi_response(send, 413)
+            verifier.update(chunk)
+            body += chunk
+            more_body = message.get("more_body", False)
+
+        if not verifier.verify(signature):
+            return await _asgi_response(send, 403)
+        try:
+            events = parse_events(body)
+        except ValueError:
+            return await _asgi_response(send, 400)
+        if self._handler is not None:
+            result = self._handler(events)
+            if inspect.isawaitable(result):
+                await result
+        await _asgi_response(send, 200, b"EVENT_RECEIVED")
+
+
+def _wsgi_response(start_response: Callable, status: str, body: bytes = b"") -> list:
+    start_response(status, [
+        ("Content-Type", "text/plain"),
+        ("Content-Length", str(len(body))),
+    ])
+    return [body]
+
+
+async def _asgi_response(send: Callable, status: int, body: bytes = b"") -> None:
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"text/plain"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,43 @@
+import pytest
+
+from messengerapi.fake_graph import FakeGraphServer
+from messengerapi.pool import ConnectionPool
+from messengerapi.retry import RetryPolicy
+
+TOKEN = "test-token"
+PAGE_ID = "1234"
+
+
+@pytest.fixture(scope="session")
+def _server():
+    with FakeGraphServer(seed=1) as server:
+        yield server
+
+
+@pytest.fixture
+def server(_server):
+    _server.reset()
+    yield _server
+
+
+@pytest.fixture
+def pool():
+    pool = ConnectionPool()
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def client_kwargs(server, pool):
+    """Keyword arguments of a sync client talking to the fake server, retrying without waiting."""
+    return {
+        "graph_url": server.url,
+        "pool": pool,
+        "retry_policy": RetryPolicy(backoff_base=0),
+    }
+
+
+@pytest.fixture
+def async_kwargs(server):
+    """Keyword arguments of an async client, which closes its own pool."""
+    return {"graph_url": server.url, "retry_policy": RetryPolicy(backoff_base=0)}
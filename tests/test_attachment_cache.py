@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+from messengerapi import AttachmentCache, AttachmentUploadApi, SendApi
+
+from .conftest import PAGE_ID, TOKEN
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(64)
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "image.png"
+    path.write_bytes(PNG)
+    return path
+
+
+def test_local_uploads_hit_by_content(server, client_kwargs, image, tmp_path):
+    upload_api = AttachmentUploadApi(TOKEN, PAGE_ID, attachment_cache=AttachmentCache(), **client_kwargs)
+    copy = tmp_path / "copy.png"
+    copy.write_bytes(PNG)
+
+    first = upload_api.upload_local_image(str(image))
+    assert upload_api.upload_local_image(str(image)) == first
+    assert upload_api.upload_local_image(str(copy)) == first
+    assert upload_api.upload_attachment("image", PNG) == first
+    assert len(server.requests) == 1
+
+    # The key follows the content, not the path.
+    image.write_bytes(PNG + b"changed")
+    assert upload_api.upload_local_image(str(image)) != first
+    assert upload_api.upload_attachment("video", PNG) != first
+    assert len(server.requests) == 3
+
+
+def test_remote_uploads_hit_by_url_and_validator(server, client_kwargs):
+    upload_api = AttachmentUploadApi(TOKEN, PAGE_ID, attachment_cache=AttachmentCache(), **client_kwargs)
+    url = "https://example.com/a.png"
+
+    first = upload_api.upload_remote_image(url, validator="v1")
+    assert upload_api.upload_remote_image(url, validator="v1") == first
+    assert upload_api.upload_remote_image(url, validator="v2") != first
+    assert upload_api.upload_remote_image(url) not in (first, None)
+    assert len(server.requests) == 3
+
+
+def test_entries_expire(server, client_kwargs, image, monkeypatch):
+    cache = AttachmentCache(ttl=60)
+    upload_api = AttachmentUploadApi(TOKEN, PAGE_ID, attachment_cache=cache, **client_kwargs)
+    first = upload_api.upload_local_image(str(image))
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 30)
+    assert upload_api.upload_local_image(str(image)) == first
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    assert upload_api.upload_local_image(str(image)) != first
+    assert len(server.requests) == 2
+
+
+def test_cache_is_scoped_by_page(server, client_kwargs, image):
+    cache = AttachmentCache()
+    AttachmentUploadApi(TOKEN, PAGE_ID, attachment_cache=cache, **client_kwargs).upload_local_image(str(image))
+    AttachmentUploadApi(TOKEN, "5678", attachment_cache=cache, **client_kwargs).upload_local_image(str(image))
+
+    assert len(server.requests) == 2
+
+
+def test_sends_reuse_cached_attachments(server, client_kwargs, image, tmp_path):
+    path = str(tmp_path / "attachments.sqlite3")
+    send_api = SendApi(TOKEN, PAGE_ID, attachment_cache=AttachmentCache(path), **client_kwargs)
+    send_api.send_local_image(str(image), "100")
+
+    reopened = SendApi(TOKEN, PAGE_ID, attachment_cache=AttachmentCache(path), **client_kwargs)
+    reopened.send_local_image(str(image), "200")
+
+    first, second = server.requests
+    attachment_id = second.body["message"]["attachment"]["payload"]["attachment_id"]
+    assert "attachment_id" not in first.body["message"]["attachment"]["payload"]
+    assert second.body["recipient"] == {"id": "200"} and attachment_id
+
+
+def test_least_recently_used_entries_are_evicted(monkeypatch):
+    monkeypatch.setattr(AttachmentCache, "_EVICTION_INTERVAL", 1)
+    cache = AttachmentCache(max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("1", None, "3")
+    cache.discard("a")
+    assert cache.get("a") is None
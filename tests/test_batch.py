@@ -0,0 +1,195 @@
+import asyncio
+
+import pytest
+
+from messengerapi import (
+    AsyncProfileApi, AsyncSendApi, GraphBatch, PermanentError, ProfileApi, SendApi, TransientError,
+)
+from messengerapi.batch import BatchItem, _fan_out
+
+from .conftest import PAGE_ID, TOKEN
+
+MENU = [{"locale": "default", "composer_input_disabled": False,
+         "call_to_actions": [{"type": "postback", "title": "Help", "payload": "HELP"}]}]
+
+
+def test_bound_calls_are_queued_and_fanned_out_in_order(server, client_kwargs):
+    send_api = SendApi(TOKEN, PAGE_ID, **client_kwargs)
+    profile_api = ProfileApi(TOKEN, **client_kwargs)
+    batch = GraphBatch(send_api)
+
+    first = batch.bind(send_api).send_text_message("Hello", "100")
+    second = batch.bind(profile_api).set_persistent_menu(MENU)
+    third = batch.bind(send_api).send_text_message("Bye", "200")
+
+    assert isinstance(first, BatchItem) and not first.done()
+    assert server.requests == []
+    results = batch.execute()
+
+    assert results[0]["recipient_id"] == "100"
+    assert results[1] == {"result": "success"}
+    assert results[2]["recipient_id"] == "200"
+    assert [first.result(), second.result(), third.result()] == results
+    assert [request.body["message"]["text"] for request in server.requests
+            if request.path.endswith("/messages")] == ["Hello", "Bye"]
+
+
+def test_failed_operations_are_returned_as_errors(server, client_kwargs):
+    send_api = SendApi(TOKEN, **client_kwargs)
+    batch = GraphBatch(send_api)
+    bound = batch.bind(send_api)
+    blocked = bound.send_text_message("Hello", "100")
+    sent = bound.send_text_message("Hello", "200")
+    server.inject(551, path="/messages")
+
+    results = batch.execute()
+
+    assert isinstance(results[0], PermanentError) and results[0].code == 551
+    assert results[1]["recipient_id"] == "200"
+    with pytest.raises(PermanentError):
+        blocked.result()
+    assert sent.exception() is None
+
+
+def test_results_are_not_available_before_execute(client_kwargs):
+    send_api = SendApi(TOKEN, **client_kwargs)
+    item = GraphBatch(send_api).bind(send_api).send_text_message("Hello", "100")
+    with pytest.raises(RuntimeError):
+        item.result()
+
+
+def test_more_than_50_operations_are_split(server, client_kwargs):
+    send_api = SendApi(TOKEN, **client_kwargs)
+    batch = GraphBatch(send_api)
+    bound = batch.bind(send_api)
+    for recipient in range(120):
+        bound.send_text_message("Hello", str(recipient))
+
+    results = batch.execute()
+
+    assert [result["recipient_id"] for result in results] == [str(recipient) for recipient in range(120)]
+    assert len(server.requests) == 120
+
+
+def test_failed_batch_request_fails_every_operation(server, client_kwargs):
+    send_api = SendApi(TOKEN, **client_kwargs)
+    batch = GraphBatch(send_api)
+    batch.bind(send_api).send_text_message("Hello", "100")
+    server.inject(100, path="/v19.0/")
+
+    with pytest.raises(PermanentError):
+        batch.execute()
+
+
+def test_execute_async(server, async_kwargs):
+    async def main():
+        async with AsyncSendApi(TOKEN, PAGE_ID, **async_kwargs) as send_api:
+            batch = GraphBatch(send_api)
+            bound = batch.bind(send_api)
+            items = [bound.send_text_message("Hello", str(recipient)) for recipient in range(60)]
+            assert all(isinstance(item, BatchItem) for item in items)
+            server.inject(2, path="/messages", count=1)
+            return await batch.execute_async()
+
+    results = asyncio.run(main())
+
+    # The two batch requests run concurrently, either may get the fault.
+    failed = [index for index, result in enumerate(results) if isinstance(result, TransientError)]
+    assert failed in ([0], [50])
+    assert [result["recipient_id"] for index, result in enumerate(results) if index not in failed] == [
+        str(recipient) for recipient in range(60) if recipient not in failed]
+
+
+def test_async_send_batch_image_attachments(server, async_kwargs):
+    async def main():
+        async with AsyncSendApi(TOKEN, **async_kwargs) as send_api:
+            return await send_api.send_batch_image_attachments(
+                ["https://example.com/a.png", "https://example.com/b.png"], "100")
+
+    results = asyncio.run(main())
+
+    assert [result["recipient_id"] for result in results] == ["100", "100"]
+
+
+@pytest.mark.parametrize("skip_unchanged", [False, True])
+def test_bound_async_profile_setters_return_batch_items(server, async_kwargs, skip_unchanged):
+    async def main():
+        async with AsyncProfileApi(TOKEN, skip_unchanged=skip_unchanged, **async_kwargs) as profile_api:
+            batch = GraphBatch(profile_api)
+            bound = batch.bind(profile_api)
+            items = [
+                bound.set_persistent_menu(MENU),
+                bound.set_welcome_screen("GET_STARTED"),
+                bound.set_user_persistent_menu("100", MENU),
+            ]
+            changes = bound.sync_profile({"persistent_menu": MENU})
+            assert all(isinstance(item, BatchItem) for item in items)
+            assert server.requests == []
+            return items, changes, await batch.execute_async()
+
+    items, changes, results = asyncio.run(main())
+
+    assert [item.result() for item in items] == results[:3]
+    assert all(result == {"result": "success"} for result in results)
+    assert "persistent_menu" in changes["updated"]
+    assert "GET" not in [request.method for request in server.requests]
+
+
+def test_direct_async_profile_setter_skips_unchanged_fields(server, async_kwargs):
+    async def main():
+        async with AsyncProfileApi(TOKEN, skip_unchanged=True, **async_kwargs) as profile_api:
+            first = await profile_api.set_persistent_menu(MENU)
+            second = await profile_api.set_persistent_menu(MENU)
+            return first, second
+
+    first, second = asyncio.run(main())
+
+    assert first == second == {"result": "success"}
+    assert [request.method for request in server.requests] == ["GET", "POST"]
+
+
+def test_failed_batch_request_resolves_the_operations_left(server, client_kwargs):
+    send_api = SendApi(TOKEN, **client_kwargs)
+    batch = GraphBatch(send_api)
+    bound = batch.bind(send_api)
+    items = [bound.send_text_message("Hello", str(recipient)) for recipient in range(60)]
+    server.inject(100, path="/v19.0/")
+
+    with pytest.raises(PermanentError) as raised:
+        batch.execute()
+
+    assert all(item.exception() is raised.value for item in items)
+    assert len(server.requests) == 1
+
+
+def test_failed_async_batch_request_resolves_its_operations(server, async_kwargs):
+    async def main():
+        async with AsyncSendApi(TOKEN, **async_kwargs) as send_api:
+            batch = GraphBatch(send_api)
+            bound = batch.bind(send_api)
+            items = [bound.send_text_message("Hello", str(recipient)) for recipient in range(60)]
+            server.inject(100, path="/v19.0/")
+            with pytest.raises(PermanentError) as raised:
+                await batch.execute_async()
+            return items, raised.value
+
+    items, error = asyncio.run(main())
+
+    failed = [index for index, item in enumerate(items) if item.exception() is error]
+    # The two batch requests run concurrently, either may get the fault.
+    assert failed in (list(range(50)), list(range(50, 60)))
+    assert all(items[index].result()["recipient_id"] == str(index)
+               for index in range(60) if index not in failed)
+
+
+def test_operations_without_a_response_fail(client_kwargs):
+    send_api = SendApi(TOKEN, **client_kwargs)
+    batch = GraphBatch(send_api)
+    bound = batch.bind(send_api)
+    items = [bound.send_text_message("Hello", str(recipient)) for recipient in range(3)]
+
+    results = _fan_out(items, [{"code": 200, "body": '{"recipient_id": "0", "message_id": "m0"}'}, None])
+
+    assert results[0]["recipient_id"] == "0"
+    assert isinstance(results[1], TransientError) and isinstance(results[2], TransientError)
+    assert all(item.done() for item in items)
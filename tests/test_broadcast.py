@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from messengerapi import AsyncSendApi, PermanentError, SendApi
+
+from .conftest import TOKEN
+
+
+async def _arecipients(recipients):
+    for recipient in recipients:
+        yield recipient
+
+
+def test_broadcast_sends_to_every_recipient(server, client_kwargs):
+    send_api = SendApi(TOKEN, **client_kwargs)
+    server.inject(551, path="/messages")
+
+    results = list(send_api.broadcast({"text": "Hello"}, ["1", "2", "3"], max_in_flight=1))
+
+    assert [result.recipient_id for result in results] == ["1", "2", "3"]
+    assert isinstance(results[0].error, PermanentError)
+    assert [result.response["recipient_id"] for result in results[1:]] == ["2", "3"]
+    assert all(request.body["message"] == {"text": "Hello"}
+               for request in server.requests if request.status == 200)
+
+
+@pytest.mark.parametrize("arguments", [
+    {"message": {}},
+    {"message": {"text": "Hello"}, "messaging_type": "PROMOTION"},
+    {"message": {"text": "Hello"}, "max_in_flight": 0},
+])
+def test_broadcast_validates_before_sending(server, client_kwargs, arguments):
+    send_api = SendApi(TOKEN, **client_kwargs)
+    with pytest.raises((TypeError, ValueError)):
+        send_api.broadcast(recipients=["1"], **arguments)
+    assert server.requests == []
+
+
+def test_async_broadcast_accepts_async_iterables(server, async_kwargs):
+    async def main():
+        async with AsyncSendApi(TOKEN, **async_kwargs) as send_api:
+            return [result async for result in send_api.broadcast(
+                {"text": "Hello"}, _arecipients(["1", "2", "3"]), max_in_flight=2)]
+
+    results = asyncio.run(main())
+
+    assert sorted(result.response["recipient_id"] for result in results) == ["1", "2", "3"]
+
+
+@pytest.mark.parametrize("arguments", [
+    {"message": {}},
+    {"message": {"text": "Hello"}, "messaging_type": "PROMOTION"},
+    {"message": {"text": "Hello"}, "max_in_flight": 0},
+])
+def test_async_broadcast_validates_when_called(server, async_kwargs, arguments):
+    async def main():
+        async with AsyncSendApi(TOKEN, **async_kwargs) as send_api:
+            with pytest.raises((TypeError, ValueError)):
+                send_api.broadcast(recipients=_arecipients(["1"]), **arguments)
+
+    asyncio.run(main())
+    assert server.requests == []
+
+
+def test_async_send_encoded_messages_validates_when_called(async_kwargs):
+    async def main():
+        async with AsyncSendApi(TOKEN, **async_kwargs) as send_api:
+            with pytest.raises(ValueError):
+                send_api.send_encoded_messages([], max_in_flight=0)
+
+    asyncio.run(main())
@@ -0,0 +1,131 @@
+import pickle
+
+import pytest
+
+from messengerapi import ButtonType
+from messengerapi.components import (
+    Button, Buttons, Element, Elements, PersistentMenu, QuickReplies, QuickReply,
+)
+
+
+def test_with_methods_return_modified_copies():
+    button = Button(title="Buy", payload="BUY")
+
+    renamed = button.with_title("Order").with_payload("ORDER")
+
+    assert button.get_content() == {"type": ButtonType.POSTBACK, "title": "Buy", "payload": "BUY"}
+    assert renamed.get_content() == {"type": ButtonType.POSTBACK, "title": "Order", "payload": "ORDER"}
+    link = Button(ButtonType.WEB_URL, "View", url="https://example.com/a").with_url("https://example.com/b")
+    assert link.url == "https://example.com/b"
+
+
+def test_element_with_button_keeps_the_original():
+    element = Element("Shoes", subtitle="Red")
+    button = Button(title="Buy", payload="BUY")
+
+    updated = element.with_button(button).with_subtitle("Blue").with_image_url("https://example.com/a.png")
+
+    assert element.buttons == () and element.subtitle == "Red"
+    assert updated.buttons == (button,)
+    assert updated.get_content() == {
+        "title": "Shoes", "subtitle": "Blue", "image_url": "https://example.com/a.png",
+        "buttons": [button.get_content()],
+    }
+
+
+def test_quick_reply_with_methods():
+    quick_reply = QuickReply("Yes", "YES")
+
+    updated = quick_reply.with_title("No").with_payload("NO").with_image_url("https://example.com/a.png")
+
+    assert quick_reply.get_content() == {"content_type": "text", "title": "Yes", "payload": "YES"}
+    assert updated.image_url == "https://example.com/a.png" and updated.payload == "NO"
+
+
+@pytest.mark.parametrize("component, method, value", [
+    (Button(title="Buy"), "set_title", "Order"),
+    (Button(title="Buy"), "set_payload", "ORDER"),
+    (Button(ButtonType.WEB_URL, "View"), "set_url", "https://example.com"),
+    (Element("Shoes"), "set_title", "Boots"),
+    (Element("Shoes"), "set_subtitle", "Red"),
+    (Element("Shoes"), "set_image_url", "https://example.com/a.png"),
+    (Element("Shoes"), "add_button", Button()),
+    (QuickReply(), "set_title", "Yes"),
+    (QuickReply(), "set_payload", "YES"),
+    (QuickReply(), "set_image_url", "https://example.com/a.png"),
+])
+def test_in_place_setters_raise_instead_of_being_ignored(component, method, value):
+    content = component.get_content()
+
+    with pytest.raises(AttributeError, match="with_"):
+        getattr(component, method)(value)
+
+    assert component.get_content() == content
+
+
+def test_components_cannot_be_assigned():
+    button = Button()
+    with pytest.raises(AttributeError):
+        button._title = "Order"
+
+
+def test_copies_are_validated():
+    with pytest.raises(ValueError):
+        Button().with_title("x" * 21)
+    with pytest.raises(ValueError):
+        Button().with_url("https://example.com")
+    element = Element("Shoes", buttons=[Button(), Button(), Button()])
+    with pytest.raises(ValueError):
+        element.with_button(Button())
+
+
+def test_equal_components_hash_and_compile_alike():
+    first = Element("Shoes", buttons=[Button(title="Buy", payload="BUY")])
+    second = Element("Shoes").with_button(Button(title="Buy", payload="BUY").get_content())
+
+    assert first == second and hash(first) == hash(second)
+    assert first.compile().json == second.compile().json
+    assert pickle.loads(pickle.dumps(first)) == first
+
+
+def test_builders_collect_in_place():
+    buttons = Buttons()
+    buttons.add_button(Button(title="Buy"))
+    buttons.add_button(Button(title="Sell").get_content())
+
+    assert len(buttons) == 2
+    assert Element("Shoes", buttons=buttons).buttons[1].title == "Sell"
+
+
+@pytest.mark.parametrize("builder_type, item", [
+    (Elements, Button()),
+    (Buttons, Element("Shoes")),
+    (Buttons, "Buy"),
+    (QuickReplies, Button()),
+])
+def test_builders_reject_items_of_other_types(builder_type, item):
+    with pytest.raises(TypeError):
+        builder_type([item])
+
+
+def test_rejected_items_are_not_added():
+    buttons = Buttons([Button()])
+    with pytest.raises(TypeError):
+        buttons.add_button(QuickReply("Yes"))
+    assert len(buttons) == 1
+
+
+def test_builders_accept_compiled_items():
+    buttons = Buttons([Button(title="Buy").compile()])
+
+    assert buttons.compile().json == Buttons([Button(title="Buy")]).compile().json
+
+
+def test_persistent_menu_content_is_a_copy():
+    menu = PersistentMenu([Button(title="Help", payload="HELP")])
+    content = menu.get_content()
+    content[0]["call_to_actions"].append({"type": "postback", "title": "Extra", "payload": "EXTRA"})
+    content.append({"locale": "fr_FR"})
+
+    assert menu.get_content() == PersistentMenu([Button(title="Help", payload="HELP")]).get_content()
+    assert len(menu.compile().loads()[0]["call_to_actions"]) == 1
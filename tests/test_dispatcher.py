@@ -0,0 +1,74 @@
+import asyncio
+import threading
+
+import pytest
+
+from messengerapi.dispatcher import AsyncDispatcher, Dispatcher
+from messengerapi.webhook import MessageEvent
+
+
+def _events(count, sender_id="100"):
+    return [MessageEvent({"sender": {"id": sender_id}, "message": {"mid": str(index), "text": "Hi"}})
+            for index in range(count)]
+
+
+def test_close_waits_for_dispatches_in_progress():
+    handled = []
+    release = threading.Event()
+    dispatcher = Dispatcher(workers=1, queue_size=1)
+
+    @dispatcher.on("message")
+    def handle(event):
+        release.wait()
+        handled.append(event.raw["message"]["mid"])
+
+    # The dispatch blocks on the full queue until the handler is released.
+    dispatching = threading.Thread(target=dispatcher.dispatch, args=(_events(5),))
+    dispatching.start()
+    closing = threading.Thread(target=dispatcher.close)
+    closing.start()
+    closing.join(0.1)
+    assert closing.is_alive()
+
+    release.set()
+    dispatching.join()
+    closing.join()
+
+    assert handled == ["0", "1", "2", "3", "4"]
+    with pytest.raises(RuntimeError):
+        dispatcher.dispatch(_events(1))
+
+
+def test_close_without_dispatch():
+    dispatcher = Dispatcher()
+    dispatcher.close()
+    with pytest.raises(RuntimeError):
+        dispatcher.dispatch(_events(1))
+
+
+def test_async_close_waits_for_dispatches_in_progress():
+    handled = []
+
+    async def main():
+        release = asyncio.Event()
+        dispatcher = AsyncDispatcher(workers=1, queue_size=1)
+
+        @dispatcher.on("message")
+        async def handle(event):
+            await release.wait()
+            handled.append(event.raw["message"]["mid"])
+
+        dispatching = asyncio.ensure_future(dispatcher.dispatch(_events(5)))
+        await asyncio.sleep(0)
+        closing = asyncio.ensure_future(dispatcher.close())
+        await asyncio.sleep(0.05)
+        assert not closing.done()
+
+        release.set()
+        await asyncio.gather(dispatching, closing)
+        with pytest.raises(RuntimeError):
+            await dispatcher.dispatch(_events(1))
+
+    asyncio.run(main())
+
+    assert handled == ["0", "1", "2", "3", "4"]
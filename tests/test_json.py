@@ -0,0 +1,33 @@
+import json
+
+from messengerapi._json import JsonFragment, dumps, encode
+from messengerapi.components import Button, Element, PersistentMenu
+
+
+def _carousel():
+    return [Element(f"Product {index}", subtitle="Ünïcode \"quoted\"", image_url="https://example.com/a.png",
+                    buttons=[Button(title="Buy", payload=f"BUY_{index}")])
+            for index in range(10)]
+
+
+def test_fragments_encode_like_dicts_byte_for_byte():
+    elements = _carousel()
+    with_dicts = {"recipient": {"id": "1"}, "message": {"attachment": {"type": "template", "payload": {
+        "template_type": "generic", "elements": [element.get_content() for element in elements]}}}}
+    with_fragments = {"recipient": {"id": "1"}, "message": {"attachment": {"type": "template", "payload": {
+        "template_type": "generic", "elements": [element.compile() for element in elements]}}}}
+
+    assert encode(with_fragments) == encode(with_dicts)
+    assert dumps({"menu": PersistentMenu([Button()])}) == dumps({"menu": PersistentMenu([Button()]).get_content()})
+
+
+def test_strings_looking_like_placeholders_are_kept():
+    value = {"text": "fragment:" + "0" * 32 + ":0", "nested": JsonFragment('{"a":1}')}
+
+    assert json.loads(dumps(value)) == {"text": "fragment:" + "0" * 32 + ":0", "nested": {"a": 1}}
+
+
+def test_nested_fragments():
+    inner = JsonFragment.encode({"b": [JsonFragment("2")]})
+
+    assert dumps([inner, {"c": inner}]) == '[{"b":[2]},{"c":{"b":[2]}}]'
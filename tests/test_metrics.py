@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from messengerapi import AsyncSendApi, Metrics, PermanentError, RequestHooks, SendApi
+from messengerapi.metrics import Histogram
+
+from .conftest import TOKEN
+
+
+def test_metrics_count_attempts_retries_and_bytes(server, client_kwargs):
+    metrics = Metrics()
+    send_api = SendApi(TOKEN, metrics=metrics, **client_kwargs)
+    server.inject(613, path="/messages")
+    send_api.send_text_message("Hello", "100")
+    server.inject(100, path="/messages")
+    with pytest.raises(PermanentError):
+        send_api.send_text_message("Hello", "200")
+
+    [(operation, stats)] = metrics.snapshot().items()
+
+    assert operation == "send_text_message"
+    assert stats.requests == {"throttled": 1, "success": 1, "permanent": 1}
+    assert stats.retries == 1 and stats.in_flight == 0
+    assert stats.bytes_sent > 0
+    assert stats.latency.count == 3 and stats.latency.sum > 0
+
+
+def test_prometheus_format(server, client_kwargs):
+    metrics = Metrics(buckets=(1.0, 0.5))
+    SendApi(TOKEN, metrics=metrics, **client_kwargs).send_text_message("Hello", "100")
+
+    lines = metrics.prometheus(prefix="bot").splitlines()
+
+    assert metrics.buckets == (0.5, 1.0)
+    assert 'bot_requests_total{operation="send_text_message",outcome="success"} 1' in lines
+    assert 'bot_request_duration_seconds_bucket{operation="send_text_message",le="+Inf"} 1' in lines
+    assert 'bot_request_duration_seconds_count{operation="send_text_message"} 1' in lines
+    assert 'bot_requests_in_flight{operation="send_text_message"} 0' in lines
+    assert "# TYPE bot_retries_total counter" in lines
+
+
+def test_histogram_quantile():
+    histogram = Histogram((1.0, 2.0), (2, 2, 1), 7.0)
+
+    assert histogram.count == 5
+    assert histogram.quantile(0) == 0.0
+    assert histogram.quantile(0.2) == 0.5
+    assert histogram.quantile(0.6) == 1.5
+    assert histogram.quantile(1) == 2.0
+    assert Histogram((1.0,), (0, 0), 0.0).quantile(0.5) is None
+    with pytest.raises(ValueError):
+        histogram.quantile(2)
+
+
+def test_shards_of_finished_threads_are_kept():
+    metrics = Metrics()
+
+    def record():
+        stats = metrics.start("op")
+        metrics.finish(stats, time.perf_counter(), "success")
+        metrics.add_retry("op")
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    record()
+
+    stats = metrics.snapshot()["op"]
+    assert stats.requests == {"success": 5} and stats.retries == 5
+    assert len(metrics._shards) == 1
+
+
+def test_snapshot_while_outcomes_are_added():
+    metrics = Metrics()
+    stop = threading.Event()
+
+    def record():
+        index = 0
+        while not stop.is_set():
+            stats = metrics.start("op")
+            metrics.finish(stats, time.perf_counter(), f"outcome{index % 500}")
+            index += 1
+
+    thread = threading.Thread(target=record)
+    thread.start()
+    try:
+        for _ in range(200):
+            metrics.snapshot()
+    finally:
+        stop.set()
+        thread.join()
+
+    assert sum(metrics.snapshot()["op"].requests.values()) > 0
+
+
+class _RecordingHooks(RequestHooks):
+    def __init__(self):
+        self.calls = []
+        self.timings = []
+
+    def before_build(self, timing):
+        self.calls.append("before_build")
+
+    def before_send(self, request, timing):
+        self.calls.append("before_send")
+
+    def after_response(self, request, timing, response_body):
+        self.calls.append("after_response")
+        self.timings.append(timing)
+
+    def on_error(self, request, timing, error):
+        self.calls.append(f"on_error:{type(error).__name__}")
+
+
+def test_hooks_run_around_each_attempt(server, client_kwargs):
+    hooks = _RecordingHooks()
+    send_api = SendApi(TOKEN, hooks=[hooks], **client_kwargs)
+    server.inject(613, path="/messages")
+
+    send_api.send_text_message("Hello", "100")
+
+    assert hooks.calls == ["before_build", "before_send", "on_error:ThrottledError", "before_send",
+                           "after_response"]
+    [timing] = hooks.timings
+    assert timing.operation == "send_text_message" and timing.attempts == 2
+    assert timing.request.recipient_id == "100"
+    assert {"build", "encode", "server", "read", "decode"} <= set(timing.phases)
+    assert all(seconds >= 0 for seconds in timing.phases.values())
+    assert "send_text_message" in repr(timing)
+
+
+def test_async_hooks(server, async_kwargs):
+    hooks = _RecordingHooks()
+
+    async def main():
+        async with AsyncSendApi(TOKEN, hooks=[hooks], **async_kwargs) as send_api:
+            await send_api.send_text_message("Hello", "100")
+
+    asyncio.run(main())
+
+    assert hooks.calls == ["before_build", "before_send", "after_response"]
+    [timing] = hooks.timings
+    assert timing.attempts == 1 and {"build", "encode", "decode"} <= set(timing.phases)
@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+
+from messengerapi import _mime
+from messengerapi._mime import SNIFF_SIZE, detect_file_mimetype, mimetype_from_extension, sniff_mimetype
+
+PNG = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00"
+
+
+@pytest.mark.parametrize("filename, mimetype", [
+    ("photo.JPG", "image/jpeg"),
+    ("/tmp/clip.mp4", "video/mp4"),
+    ("song.mp3", "application/octet-stream"),
+    ("invoice.pdf", "application/octet-stream"),
+    ("archive.tar.gz", None),
+    ("README", None),
+])
+def test_mimetype_from_extension(filename, mimetype):
+    assert mimetype_from_extension(filename) == mimetype
+
+
+def test_files_of_known_extension_are_not_read(tmp_path):
+    path = tmp_path / "image.png"
+    path.write_bytes(b"not a png")
+
+    assert detect_file_mimetype(str(path)) == "image/png"
+
+
+def test_files_of_unknown_extension_are_sniffed(tmp_path):
+    path = tmp_path / "upload"
+    path.write_bytes(PNG + bytes(3 * SNIFF_SIZE))
+
+    assert detect_file_mimetype(str(path)) == "image/png"
+    assert sniff_mimetype(b"GIF89a" + bytes(20)) == "image/gif"
+    assert sniff_mimetype(memoryview(b"plain text\n")) == "text/plain"
+
+
+def test_libmagic_handle_is_reused_per_thread():
+    sniff_mimetype(PNG)
+    handle = _mime._magic()
+    other_thread_handles = []
+    thread = threading.Thread(target=lambda: other_thread_handles.append(_mime._magic()))
+    thread.start()
+    thread.join()
+
+    assert _mime._magic() is handle
+    assert other_thread_handles[0] is not handle
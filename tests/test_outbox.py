@@ -0,0 +1,156 @@
+import asyncio
+import socket
+
+import pytest
+import requests
+
+from messengerapi import (
+    AsyncSendApi, DuplicateSendError, Outbox, PermanentError, SendApi, ThrottledError, TransientError,
+)
+from messengerapi.outbox import DONE, FAILED, PENDING, UNCERTAIN, idempotency_key
+from messengerapi.retry import RetryPolicy
+
+from .conftest import TOKEN
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    yield outbox
+    outbox.close()
+
+
+def _send(send_api, key, recipient_id="100"):
+    with idempotency_key(key):
+        return send_api.send_text_message("Hello", recipient_id)
+
+
+def test_sent_key_is_not_sent_again(server, client_kwargs, outbox):
+    send_api = SendApi(TOKEN, outbox=outbox, **client_kwargs)
+
+    first = _send(send_api, "welcome")
+    second = _send(send_api, "welcome")
+
+    assert first == second
+    assert outbox.get("welcome").status == DONE
+    assert len(server.requests) == 1
+
+
+def test_throttled_send_is_pending_and_replayed(server, client_kwargs, outbox):
+    send_api = SendApi(TOKEN, outbox=outbox, **client_kwargs)
+    server.inject(613, count=3)
+
+    with pytest.raises(ThrottledError):
+        _send(send_api, "welcome")
+
+    assert outbox.get("welcome").status == PENDING
+    [result] = outbox.replay(send_api)
+    assert result.key == "welcome" and result.response["recipient_id"] == "100"
+    assert outbox.get("welcome").status == DONE
+    assert list(outbox.replay(send_api)) == []
+
+
+def test_send_that_may_have_been_delivered_is_not_replayed(server, client_kwargs, outbox):
+    send_api = SendApi(TOKEN, outbox=outbox, **client_kwargs)
+    server.inject(2, count=3, status=500)
+
+    with pytest.raises(TransientError):
+        _send(send_api, "welcome")
+
+    assert outbox.get("welcome").status == UNCERTAIN
+    assert outbox.unfinished() == []
+    assert [request.idempotency_key for request in outbox.uncertain()] == ["welcome"]
+    assert list(outbox.replay(send_api)) == []
+    [result] = outbox.replay(send_api, uncertain=True)
+    assert result.response["recipient_id"] == "100"
+    assert outbox.get("welcome").status == DONE
+
+
+def test_refused_connection_leaves_send_pending(pool, outbox):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    send_api = SendApi(TOKEN, graph_url=f"http://127.0.0.1:{port}", pool=pool, outbox=outbox,
+        retry_policy=RetryPolicy(backoff_base=0))
+
+    with pytest.raises(requests.ConnectionError):
+        _send(send_api, "welcome")
+
+    assert outbox.get("welcome").status == PENDING
+
+
+def test_interrupted_send_is_uncertain(server, client_kwargs, outbox):
+    send_api = SendApi(TOKEN, outbox=outbox, **client_kwargs)
+    request = send_api._message_request("send_text_message", {"recipient": {"id": "100"}})
+
+    # A crash between begin() and complete() leaves the entry as if it was being sent.
+    request, _ = outbox.begin(request)
+    outbox._release(request.idempotency_key)
+
+    assert outbox.unfinished() == []
+    assert len(outbox.uncertain()) == 1
+
+
+def test_permanent_failure_is_not_replayed(server, client_kwargs, outbox):
+    send_api = SendApi(TOKEN, outbox=outbox, **client_kwargs)
+    server.inject(100, path="/messages")
+
+    with pytest.raises(PermanentError):
+        _send(send_api, "welcome")
+
+    assert outbox.get("welcome").status == FAILED
+    assert list(outbox.replay(send_api, uncertain=True)) == []
+
+
+def test_replay_async(server, async_kwargs, outbox):
+    async def main():
+        async with AsyncSendApi(TOKEN, outbox=outbox, **async_kwargs) as send_api:
+            server.inject(613, count=3)
+            with idempotency_key("throttled"), pytest.raises(ThrottledError):
+                await send_api.send_text_message("Hello", "100")
+            server.inject(2, count=3, status=500)
+            with idempotency_key("failed"), pytest.raises(TransientError):
+                await send_api.send_text_message("Hello", "200")
+            return [result async for result in outbox.replay_async(send_api)]
+
+    [result] = asyncio.run(main())
+
+    assert result.key == "throttled" and result.response["recipient_id"] == "100"
+    assert outbox.get("failed").status == UNCERTAIN
+
+
+@pytest.mark.parametrize("code, attempts, status", [(2, 3, UNCERTAIN), (100, 1, FAILED)])
+def test_failed_or_uncertain_key_is_not_sent_again(server, client_kwargs, outbox, code, attempts, status):
+    send_api = SendApi(TOKEN, outbox=outbox, **client_kwargs)
+    server.inject(code, count=attempts, path="/messages")
+    with pytest.raises((TransientError, PermanentError)):
+        _send(send_api, "welcome")
+    sent = len(server.requests)
+
+    with pytest.raises(DuplicateSendError) as raised:
+        _send(send_api, "welcome")
+
+    assert raised.value.idempotency_key == "welcome"
+    assert raised.value.status == ("uncertain" if status == UNCERTAIN else "failed")
+    assert len(server.requests) == sent
+    assert outbox.get("welcome").status == status
+
+    outbox.reopen("welcome")
+    assert _send(send_api, "welcome")["recipient_id"] == "100"
+    assert outbox.get("welcome").status == DONE
+
+
+def test_broadcast_sent_again_skips_uncertain_recipients(server, client_kwargs, outbox):
+    send_api = SendApi(TOKEN, outbox=outbox, **client_kwargs)
+    server.inject(2, count=3, status=500)
+
+    first = {result.recipient_id: result for result in
+             send_api.broadcast({"text": "Hello"}, ["100"], idempotency_key="campaign")}
+    second = {result.recipient_id: result for result in
+              send_api.broadcast({"text": "Hello"}, ["100", "200"], idempotency_key="campaign")}
+
+    assert isinstance(first["100"].error, TransientError)
+    assert isinstance(second["100"].error, DuplicateSendError)
+    assert second["200"].error is None
+    assert [request.status for request in server.requests] == [500] * 3 + [200]
+    assert server.requests[-1].body["recipient"]["id"] == "200"
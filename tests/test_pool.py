@@ -0,0 +1,68 @@
+import asyncio
+import threading
+
+from messengerapi import AsyncSendApi, ConnectionPool
+
+from .conftest import TOKEN
+
+
+def test_sync_session_uses_the_pool_limits():
+    pool = ConnectionPool(max_connections_per_host=7, pool_connections=3, block=True)
+    try:
+        adapter = pool.session.get_adapter("https://graph.facebook.com")
+        assert (adapter._pool_maxsize, adapter._pool_connections, adapter._pool_block) == (7, 3, True)
+        assert pool.session is pool.session
+    finally:
+        pool.close()
+
+
+async def _session(pool):
+    return pool.aiohttp_session()
+
+
+def test_shared_pool_sends_from_successive_loops(server, async_kwargs):
+    pool = ConnectionPool()
+
+    async def send():
+        async with AsyncSendApi(TOKEN, pool=pool, **async_kwargs) as send_api:
+            response = await send_api.send_text_message("Hello", "100")
+        await pool.close_async()
+        return response
+
+    assert asyncio.run(send())["recipient_id"] == "100"
+    assert asyncio.run(send())["recipient_id"] == "100"
+
+
+def test_session_of_a_closed_loop_is_closed_when_replaced():
+    pool = ConnectionPool()
+
+    first = asyncio.run(_session(pool))
+    second = asyncio.run(_session(pool))
+
+    assert first is not second
+    assert first.closed and not second.closed
+    asyncio.run(pool.close_async())
+    assert second.closed
+
+
+def test_close_async_closes_the_sessions_of_every_loop():
+    pool = ConnectionPool()
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    try:
+        other = asyncio.run_coroutine_threadsafe(_session(pool), loop).result()
+
+        async def main():
+            own = pool.aiohttp_session()
+            assert own is not other and pool.aiohttp_session() is own
+            await pool.close_async()
+            return own
+
+        own = asyncio.run(main())
+
+        assert own.closed and other.closed
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
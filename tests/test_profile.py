@@ -0,0 +1,144 @@
+import time
+
+import pytest
+
+from messengerapi import Metrics, ProfileApi
+from messengerapi.components import Button, PersistentMenu
+
+from .conftest import TOKEN
+
+MENU = [{"locale": "default", "composer_input_disabled": False,
+         "call_to_actions": [{"type": "postback", "title": "Help", "payload": "HELP"}]}]
+OTHER_MENU = [{"locale": "default", "composer_input_disabled": False,
+               "call_to_actions": [{"type": "postback", "title": "Shop", "payload": "SHOP"}]}]
+
+
+def _calls(server):
+    return [(request.method, sorted(request.body or {})) for request in server.requests]
+
+
+def test_setting_the_same_value_again_sends_nothing(server, client_kwargs):
+    profile_api = ProfileApi(TOKEN, skip_unchanged=True, **client_kwargs)
+
+    assert profile_api.set_persistent_menu(MENU) == {"result": "success"}
+    assert profile_api.set_persistent_menu(MENU) == {"result": "success"}
+    # Components digest like their content.
+    profile_api.set_persistent_menu(PersistentMenu([Button(title="Help", payload="HELP")]).compile())
+    assert [method for method, _ in _calls(server)] == ["GET", "POST", "POST"]
+
+    profile_api.set_persistent_menu(PersistentMenu([Button(title="Help", payload="HELP")]).compile())
+    assert len(server.requests) == 3
+
+
+def test_only_changed_fields_are_sent(server, client_kwargs):
+    profile_api = ProfileApi(TOKEN, skip_unchanged=True, **client_kwargs)
+    profile_api.set_welcome_screen("GET_STARTED")
+
+    profile_api.set_welcome_screen("GET_STARTED", [{"locale": "default", "text": "Hi!"}])
+
+    assert _calls(server)[1:] == [("POST", ["get_started", "greeting"]), ("POST", ["greeting"])]
+
+
+def test_values_set_elsewhere_are_fetched_first(server, client_kwargs):
+    ProfileApi(TOKEN, **client_kwargs).set_persistent_menu(MENU)
+    profile_api = ProfileApi(TOKEN, skip_unchanged=True, **client_kwargs)
+
+    profile_api.set_persistent_menu(MENU)
+
+    assert [method for method, _ in _calls(server)] == ["POST", "GET"]
+
+
+def test_without_skip_unchanged_every_call_is_sent(server, client_kwargs):
+    profile_api = ProfileApi(TOKEN, **client_kwargs)
+
+    profile_api.set_persistent_menu(MENU)
+    profile_api.set_persistent_menu(MENU)
+
+    assert [method for method, _ in _calls(server)] == ["POST", "POST"]
+
+
+def test_state_is_fetched_again_once_expired_or_cleared(server, client_kwargs, monkeypatch):
+    profile_api = ProfileApi(TOKEN, skip_unchanged=True, state_ttl=60, **client_kwargs)
+    profile_api.set_persistent_menu(MENU)
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 120)
+    profile_api.set_persistent_menu(MENU)
+    profile_api.clear_state_cache()
+    profile_api.set_persistent_menu(MENU)
+
+    assert [method for method, _ in _calls(server)] == ["GET", "POST", "GET", "GET"]
+
+
+def test_user_menus_are_skipped_when_unchanged(server, client_kwargs):
+    profile_api = ProfileApi(TOKEN, skip_unchanged=True, **client_kwargs)
+
+    profile_api.set_user_persistent_menu("100", MENU)
+    profile_api.set_user_persistent_menu("100", MENU)
+    profile_api.set_user_persistent_menu("100", OTHER_MENU)
+    profile_api.reset_user_persistent_menu("100")
+    profile_api.reset_user_persistent_menu("100")
+
+    assert [method for method, _ in _calls(server)] == ["GET", "POST", "POST", "DELETE"]
+
+
+def test_sync_profile_sends_only_the_differences(server, client_kwargs):
+    profile_api = ProfileApi(TOKEN, skip_unchanged=True, **client_kwargs)
+    profile_api.set_welcome_screen("GET_STARTED")
+    profile = {"get_started": {"payload": "GET_STARTED"}, "persistent_menu": MENU}
+
+    changes = profile_api.sync_profile(profile)
+
+    assert changes == {"updated": ["persistent_menu"], "deleted": ["greeting"]}
+    assert _calls(server)[2:] == [("POST", ["persistent_menu"]), ("DELETE", ["fields"])]
+    assert profile_api.sync_profile(profile) == {"updated": [], "deleted": []}
+    assert len(server.requests) == 4
+
+
+def test_invalid_state_ttl():
+    with pytest.raises(ValueError):
+        ProfileApi(TOKEN, state_ttl=0)
+
+
+def test_user_menus_are_set_in_batches_of_50(server, client_kwargs):
+    metrics = Metrics()
+    profile_api = ProfileApi(TOKEN, skip_unchanged=True, metrics=metrics, **client_kwargs)
+    assignments = [(str(user), MENU if user % 2 else OTHER_MENU) for user in range(120)]
+
+    results = list(profile_api.set_user_persistent_menus(assignments, max_in_flight=2))
+
+    assert sorted(result.user_id for result in results) == sorted(user_id for user_id, _ in assignments)
+    assert all(result.error is None and result.response == {"result": "success"} for result in results)
+    assert metrics.snapshot()["batch"].requests == {"success": 3}
+    assert profile_api.get_user_persistent_menu("7") is not None
+    assert server.requests[-1].method == "GET"
+
+    # The menus set are cached: setting them again sends nothing.
+    server.reset()
+    assert len(list(profile_api.set_user_persistent_menus(assignments))) == 120
+    assert server.requests == []
+
+
+def test_broadcast_and_reset_user_menus(server, client_kwargs):
+    profile_api = ProfileApi(TOKEN, **client_kwargs)
+    menu = PersistentMenu([Button(title="Help", payload="HELP")])
+    server.inject(100, path="/custom_user_settings")
+
+    results = list(profile_api.broadcast_persistent_menu(menu, (str(user) for user in range(60)), max_in_flight=1))
+
+    assert len(results) == 60
+    assert [result.user_id for result in results if result.error is not None] == ["0"]
+    assert {request.body["persistent_menu"][0]["call_to_actions"][0]["payload"]
+            for request in server.requests if request.body} == {"HELP"}
+
+    results = list(profile_api.reset_user_persistent_menus(str(user) for user in range(60)))
+    assert all(result.error is None for result in results)
+    assert [request.method for request in server.requests[-60:]] == ["DELETE"] * 60
+
+
+def test_bulk_user_menus_validate_max_in_flight(client_kwargs):
+    profile_api = ProfileApi(TOKEN, **client_kwargs)
+    with pytest.raises(ValueError):
+        profile_api.set_user_persistent_menus([("1", MENU)], max_in_flight=0)
+    with pytest.raises(ValueError):
+        profile_api.reset_user_persistent_menus(["1"], max_in_flight=0)
@@ -0,0 +1,82 @@
+import json
+import time
+
+import pytest
+
+from messengerapi import SendApi
+from messengerapi.fake_graph import FakeGraphServer
+from messengerapi.rate_limit import RateLimiter
+
+from .conftest import TOKEN
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_bucket_paces_requests_past_the_burst(clock):
+    limiter = RateLimiter(rate=10, burst=2)
+
+    assert [limiter.reserve() for _ in range(2)] == [0.0, 0.0]
+    assert limiter.reserve() == pytest.approx(0.1)
+    assert limiter.reserve() == pytest.approx(0.2)
+
+    clock[0] += 1.0
+    # Tokens accumulate up to the burst only.
+    assert [limiter.reserve() for _ in range(2)] == [0.0, 0.0]
+    assert limiter.reserve() == pytest.approx(0.1)
+
+
+def test_rate_decreases_with_usage(clock):
+    limiter = RateLimiter(rate=10, burst=1, slowdown_threshold=50, min_rate_factor=0.1)
+
+    limiter.update({"X-App-Usage": json.dumps({"call_count": 75, "total_time": 10})})
+    assert limiter.usage == 75 and limiter.current_rate == pytest.approx(5)
+    assert limiter.reserve() == 0.0
+    assert limiter.reserve() == pytest.approx(0.2)
+
+    limiter.update({"X-Page-Usage": json.dumps({"total_cputime": 100})})
+    assert limiter.current_rate == pytest.approx(1)
+    limiter.update({"X-App-Usage": json.dumps({"call_count": 10})})
+    assert limiter.current_rate == 10
+    limiter.update({"Content-Type": "application/json", "X-App-Usage": "not json"})
+    assert limiter.usage == 10
+
+
+def test_regain_access_time_blocks_requests(clock):
+    limiter = RateLimiter(rate=10)
+
+    limiter.update({"X-Business-Use-Case-Usage": json.dumps({"1234": [
+        {"type": "messenger", "call_count": 20, "estimated_time_to_regain_access": 2},
+        {"type": "pages", "call_count": 40},
+    ]})})
+
+    assert limiter.usage == 40
+    assert limiter.reserve() == pytest.approx(120)
+    clock[0] += 120
+    assert limiter.reserve() == 0.0
+
+
+def test_invalid_arguments():
+    for kwargs in ({"rate": 0}, {"burst": 0}, {"slowdown_threshold": 100}, {"min_rate_factor": 0}):
+        with pytest.raises(ValueError):
+            RateLimiter(**kwargs)
+
+
+def test_for_token_shares_one_limiter():
+    assert RateLimiter.for_token("token-a") is RateLimiter.for_token("token-a")
+    assert RateLimiter.for_token("token-a") is not RateLimiter.for_token("token-b")
+
+
+def test_client_slows_down_as_the_server_reports_usage(pool):
+    limiter = RateLimiter(rate=1000, slowdown_threshold=50)
+    with FakeGraphServer(rate_limit=10, seed=1) as server:
+        send_api = SendApi(TOKEN, graph_url=server.url, pool=pool, rate_limiter=limiter)
+        for recipient in range(8):
+            send_api.send_text_message("Hello", str(recipient))
+
+    assert limiter.usage == 70
+    assert limiter.current_rate == pytest.approx(600)
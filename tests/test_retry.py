@@ -0,0 +1,134 @@
+import asyncio
+import socket
+
+import pytest
+import requests
+
+from messengerapi import (
+    AsyncSendApi, AttachmentUploadApi, ProfileApi, SendApi, ThrottledError, TransientError,
+)
+from messengerapi._base_api import _caused_by, _reached_server
+from messengerapi.retry import RetryPolicy
+
+from .conftest import PAGE_ID, TOKEN
+
+MESSAGE = {"text": "Hello"}
+
+
+def _closed_port_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def _count_attempts(api):
+    attempts = []
+    attempt = api._attempt
+
+    def counted(request):
+        attempts.append(request.operation)
+        return attempt(request)
+
+    api._attempt = counted
+    return attempts
+
+
+def test_failed_send_is_not_retried_without_idempotency_key(server, client_kwargs):
+    send_api = SendApi(TOKEN, **client_kwargs)
+    server.inject(2, status=500)
+
+    with pytest.raises(TransientError):
+        send_api.send_text_message("Hello", "100")
+
+    assert len(server.requests) == 1
+
+
+def test_failed_send_is_retried_with_idempotency_key(server, client_kwargs):
+    send_api = SendApi(TOKEN, **client_kwargs)
+    server.inject(2, status=500)
+
+    [result] = send_api.broadcast(MESSAGE, ["100"], idempotency_key="welcome")
+
+    assert result.error is None and result.response["recipient_id"] == "100"
+    assert [request.status for request in server.requests] == [500, 200]
+
+
+def test_throttled_send_is_retried(server, client_kwargs):
+    send_api = SendApi(TOKEN, **client_kwargs)
+    server.inject(613)
+
+    assert send_api.send_text_message("Hello", "100")["recipient_id"] == "100"
+    assert len(server.requests) == 2
+
+
+def test_idempotent_requests_are_retried(server, client_kwargs):
+    profile_api = ProfileApi(TOKEN, **client_kwargs)
+    server.inject(2, status=500)
+    assert profile_api.set_persistent_menu([]) == {"result": "success"}
+    server.inject(2, status=500)
+    assert profile_api.get_profile(["persistent_menu"]) == {"persistent_menu": []}
+    assert [request.status for request in server.requests] == [500, 200, 500, 200]
+
+
+def test_refused_connection_is_retried(pool):
+    send_api = SendApi(TOKEN, graph_url=_closed_port_url(), pool=pool,
+        retry_policy=RetryPolicy(backoff_base=0))
+    attempts = _count_attempts(send_api)
+
+    with pytest.raises(requests.ConnectionError) as raised:
+        send_api.send_text_message("Hello", "100")
+
+    assert attempts == ["send_text_message"] * 3
+    assert not _reached_server(raised.value)
+
+
+def test_one_shot_stream_is_not_retried(server, client_kwargs):
+    upload_api = AttachmentUploadApi(TOKEN, PAGE_ID, **client_kwargs)
+    server.inject(613)
+    chunks = iter([b"\x89PNG\r\n\x1a\n", bytes(64)])
+
+    with pytest.raises(ThrottledError):
+        upload_api.upload_attachment("image", chunks, "image.png", "image/png")
+
+    assert len(server.requests) == 1
+
+
+def test_async_failed_send_is_not_retried_without_idempotency_key(server, async_kwargs):
+    async def main():
+        async with AsyncSendApi(TOKEN, **async_kwargs) as send_api:
+            server.inject(2, status=500)
+            with pytest.raises(TransientError):
+                await send_api.send_text_message("Hello", "100")
+            server.inject(2, status=500)
+            results = send_api.broadcast(MESSAGE, ["200"], idempotency_key="welcome")
+            return [result async for result in results]
+
+    [result] = asyncio.run(main())
+
+    assert result.error is None and result.response["recipient_id"] == "200"
+    assert [request.status for request in server.requests] == [500, 500, 200]
+
+
+@pytest.mark.parametrize("error, reached", [
+    (requests.ConnectTimeout("connect timed out"), False),
+    (requests.ReadTimeout("read timed out"), True),
+    (requests.ConnectionError(ConnectionResetError("reset by peer")), True),
+    (requests.ConnectionError(ConnectionRefusedError("refused")), False),
+    (ThrottledError("throttled", code=613), False),
+    (TransientError("unknown error", code=2), True),
+])
+def test_reached_server(error, reached):
+    assert _reached_server(error) is reached
+
+
+def test_caused_by_follows_reasons_and_chains():
+    cause = ConnectionRefusedError("refused")
+    wrapped = OSError("failed")
+    wrapped.reason = cause
+    try:
+        raise requests.ConnectionError("failed") from wrapped
+    except requests.ConnectionError as error:
+        assert _caused_by(error, (ConnectionRefusedError,))
+    assert not _caused_by(requests.ConnectionError("failed"), (ConnectionRefusedError,))
+
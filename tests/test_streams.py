@@ -0,0 +1,114 @@
+import io
+from contextlib import ExitStack
+
+import pytest
+
+from messengerapi import AttachmentUploadApi, _streams
+from messengerapi._streams import (
+    BufferReader, FileReader, IterReader, detect_source_mimetype, is_replayable, iter_multipart,
+    open_source, start_offset,
+)
+
+from .conftest import PAGE_ID, TOKEN
+
+PNG = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00"
+CONTENT = PNG + bytes(range(256)) * 40
+
+
+def _read_all(reader, chunk_size=1000):
+    return b"".join(iter(lambda: reader.read(chunk_size), b""))
+
+
+@pytest.mark.parametrize("make_source, reader_type, length", [
+    (lambda path: str(path), FileReader, len(CONTENT)),
+    (lambda path: CONTENT, BufferReader, len(CONTENT)),
+    (lambda path: bytearray(CONTENT), BufferReader, len(CONTENT)),
+    (lambda path: io.BytesIO(CONTENT), FileReader, len(CONTENT)),
+    (lambda path: [CONTENT[:100], b"", CONTENT[100:]], IterReader, None),
+])
+def test_open_source_reads_every_kind_of_source(tmp_path, make_source, reader_type, length):
+    path = tmp_path / "upload.bin"
+    path.write_bytes(CONTENT)
+    progress = []
+
+    with ExitStack() as stack:
+        reader = open_source(make_source(path), stack, lambda sent, total: progress.append((sent, total)))
+        assert type(reader) is reader_type and reader.length == length
+        assert _read_all(reader) == CONTENT
+
+    assert progress[-1] == (len(CONTENT), length)
+    assert [sent for sent, _ in progress] == sorted(set(sent for sent, _ in progress))
+
+
+def test_large_files_are_memory_mapped(tmp_path, monkeypatch):
+    monkeypatch.setattr(_streams, "MMAP_THRESHOLD", 1024)
+    path = tmp_path / "upload.bin"
+    path.write_bytes(CONTENT)
+
+    with ExitStack() as stack:
+        reader = open_source(str(path), stack)
+        assert type(reader) is BufferReader and len(reader) == len(CONTENT)
+        assert _read_all(reader, 4096) == CONTENT
+
+
+def test_file_objects_are_read_from_their_offset():
+    file_data = io.BytesIO(CONTENT)
+    file_data.seek(100)
+    offset = start_offset(file_data)
+    file_data.read()
+
+    with ExitStack() as stack:
+        reader = open_source(file_data, stack, offset=offset)
+        assert reader.length == len(CONTENT) - 100 and _read_all(reader) == CONTENT[100:]
+    assert start_offset(iter([CONTENT])) is None
+
+
+def test_is_replayable():
+    assert is_replayable("path") and is_replayable(CONTENT) and is_replayable(io.BytesIO(CONTENT))
+    assert not is_replayable(iter([CONTENT]))
+
+
+def test_sniffing_an_iterable_keeps_its_content():
+    chunks = (CONTENT[start:start + 7] for start in range(0, len(CONTENT), 7))
+
+    source, mimetype = detect_source_mimetype(chunks)
+
+    assert mimetype == "image/png"
+    assert b"".join(source) == CONTENT
+    assert detect_source_mimetype(CONTENT, "photo.jpg") == (CONTENT, "image/jpeg")
+
+
+def test_iter_multipart():
+    body = b"".join(iter_multipart({
+        "message": '{"attachment": {}}',
+        "filedata": ('a "b".png', IterReader([b"ab", b"cd"]), "image/png"),
+    }, "boundary", chunk_size=1))
+
+    assert body == (
+        b'--boundary\r\nContent-Disposition: form-data; name="message"\r\n\r\n{"attachment": {}}\r\n'
+        b'--boundary\r\nContent-Disposition: form-data; name="filedata"; filename="a %22b%22.png"\r\n'
+        b"Content-Type: image/png\r\n\r\nabcd\r\n--boundary--\r\n"
+    )
+
+
+def test_retried_upload_rewinds_the_file_object(server, client_kwargs):
+    upload_api = AttachmentUploadApi(TOKEN, PAGE_ID, **client_kwargs)
+    file_data = io.BytesIO(b"header" + CONTENT)
+    file_data.seek(len(b"header"))
+    progress = []
+    server.inject(2, path="/message_attachments")
+
+    result = upload_api.upload_attachment(
+        "image", file_data, filename="image.png", progress=lambda sent, total: progress.append((sent, total)))
+
+    assert result["attachment_id"]
+    assert [request.status for request in server.requests] == [503, 200]
+    assert progress[-1] == (len(CONTENT), len(CONTENT))
+
+
+def test_upload_from_an_iterable(server, client_kwargs):
+    upload_api = AttachmentUploadApi(TOKEN, PAGE_ID, **client_kwargs)
+
+    result = upload_api.upload_attachment("image", iter([CONTENT[:10], CONTENT[10:]]))
+
+    assert result["attachment_id"] and len(server.requests) == 1
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from messengerapi import PermanentError, SendApi, SuppressedError
+from messengerapi.suppression import BLOCKED, INVALID_RECIPIENT, OUTSIDE_WINDOW, SuppressionList
+
+from .conftest import TOKEN
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "suppressed.bin")
+    suppression = SuppressionList(path)
+    psids = [str(10**15 + index * 7) for index in range(3000)]
+    for psid in psids:
+        suppression.add(psid, BLOCKED)
+    suppression.add("100", OUTSIDE_WINDOW)
+    suppression.add("0123", INVALID_RECIPIENT)
+    suppression.add("user@example.com", INVALID_RECIPIENT)
+    suppression.add("99999999999999999999", BLOCKED)
+
+    suppression.save()
+    loaded = SuppressionList(path)
+
+    assert all(loaded.reason(psid) == BLOCKED for psid in psids)
+    assert loaded.reason("100") == OUTSIDE_WINDOW
+    assert loaded.reason("0123") == INVALID_RECIPIENT
+    assert loaded.reason("user@example.com") == INVALID_RECIPIENT
+    assert loaded.reason("99999999999999999999") == BLOCKED
+    assert "101" not in loaded and "123" not in loaded
+
+
+def test_expired_and_discarded_entries_are_not_saved(tmp_path, monkeypatch):
+    path = str(tmp_path / "suppressed.bin")
+    suppression = SuppressionList(path)
+    suppression.add("100", BLOCKED, ttl=10)
+    suppression.add("200", BLOCKED)
+    suppression.add("300", BLOCKED)
+    suppression.discard("300")
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 60)
+    suppression.save()
+    loaded = SuppressionList(path)
+
+    assert "100" not in loaded and "300" not in loaded
+    assert loaded.reason("200") == BLOCKED
+    assert len(loaded._keys) + len(loaded._recent) == 1
+
+
+def test_loaded_list_can_be_updated_and_saved_again(tmp_path):
+    path = str(tmp_path / "suppressed.bin")
+    first = SuppressionList(path)
+    first.add("100", BLOCKED)
+    first.save()
+
+    second = SuppressionList(path)
+    second.add("200", OUTSIDE_WINDOW)
+    second.discard("100")
+    second.save(str(tmp_path / "copy.bin"))
+    copy = SuppressionList(str(tmp_path / "copy.bin"))
+
+    assert "100" not in copy and copy.reason("200") == OUTSIDE_WINDOW
+    assert SuppressionList(path).reason("100") == BLOCKED
+
+
+def test_invalid_file_and_missing_path(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a suppression list" * 2)
+    with pytest.raises(ValueError):
+        SuppressionList(str(path))
+    with pytest.raises(ValueError):
+        SuppressionList().save()
+
+
+def test_sends_learn_and_skip_suppressed_recipients(server, client_kwargs, tmp_path):
+    path = str(tmp_path / "suppressed.bin")
+    send_api = SendApi(TOKEN, suppression=SuppressionList(path), **client_kwargs)
+    server.inject(551, path="/messages")
+
+    with pytest.raises(PermanentError):
+        send_api.send_text_message("Hello", "100")
+    assert send_api.send_text_message("Hello", "200")["recipient_id"] == "200"
+
+    send_api._suppression.save()
+    reloaded = SendApi(TOKEN, suppression=SuppressionList(path), **client_kwargs)
+    with pytest.raises(SuppressedError):
+        reloaded.send_text_message("Hello", "100")
+    assert len(server.requests) == 2
@@ -0,0 +1,40 @@
+import json
+
+from messengerapi.components import Button, Element
+from messengerapi.templates import MessageTemplate
+
+
+def _bodies(messages):
+    return [json.loads(body) for _, body in messages]
+
+
+def test_placeholders_are_filled_in_string_values():
+    template = MessageTemplate({"text": "Hello ${name}, 100% $$5 for $name"})
+
+    messages = template.render({"recipient_id": ["1", "2"], "name": ['Ann "A"', None]})
+
+    assert template.columns == ("recipient_id", "name")
+    assert [recipient_id for recipient_id, _ in messages] == ["1", "2"]
+    assert [body["message"]["text"] for body in _bodies(messages)] == [
+        'Hello Ann "A", 100% $5 for Ann "A"', "Hello , 100% $5 for "]
+    assert _bodies(messages)[0]["recipient"] == {"id": "1"}
+
+
+def test_placeholders_are_not_filled_in_keys():
+    template = MessageTemplate({"text": "$greeting", "metadata": {"$greeting": "${greeting}", "$$": 1}})
+
+    [body] = _bodies(template.render({"recipient_id": ["1"], "greeting": ["Hi"]}))
+
+    assert template.columns == ("recipient_id", "greeting")
+    assert body["message"] == {"text": "Hi", "metadata": {"$greeting": "Hi", "$$": 1}}
+
+
+def test_placeholders_in_components():
+    element = Element("${product}", buttons=[Button(title="Buy", payload="BUY_${product}")])
+    template = MessageTemplate({"attachment": {"type": "template", "payload": {
+        "template_type": "generic", "elements": [element.compile()]}}})
+
+    [body] = _bodies(template.render({"recipient_id": ["1"], "product": ["shoes"]}))
+
+    [content] = body["message"]["attachment"]["payload"]["elements"]
+    assert content["title"] == "shoes" and content["buttons"][0]["payload"] == "BUY_shoes"
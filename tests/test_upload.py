@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from messengerapi import AsyncAttachmentUploadApi, AttachmentUploadApi
+
+from .conftest import PAGE_ID, TOKEN
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(64)
+
+
+def test_upload_many_uploads_unhashable_sources_and_reports_errors(server, client_kwargs, tmp_path):
+    path = tmp_path / "image.png"
+    path.write_bytes(PNG)
+    upload_api = AttachmentUploadApi(TOKEN, PAGE_ID, **client_kwargs)
+    chunks = [PNG[:8], PNG[8:]]
+    sources = [chunks, list(chunks), str(path), str(path), str(tmp_path / "missing.png")]
+
+    results = list(upload_api.upload_many("image", sources, max_in_flight=2))
+
+    assert len(results) == 4
+    errors = [result for result in results if result.error is not None]
+    assert [result.source for result in errors] == [str(tmp_path / "missing.png")]
+    assert all(result.attachment_id for result in results if result.error is None)
+    assert len(server.requests) == 3
+
+
+@pytest.mark.parametrize("asset_type, max_in_flight", [("bogus", 10), ("image", 0)])
+def test_upload_many_validates_when_called(client_kwargs, asset_type, max_in_flight):
+    upload_api = AttachmentUploadApi(TOKEN, PAGE_ID, **client_kwargs)
+    with pytest.raises(ValueError):
+        upload_api.upload_many(asset_type, [PNG], max_in_flight)
+
+
+def test_async_upload_many(server, async_kwargs):
+    async def sources():
+        yield [PNG[:8], PNG[8:]]
+        yield [PNG]
+        yield PNG
+        yield PNG
+
+    async def main():
+        async with AsyncAttachmentUploadApi(TOKEN, PAGE_ID, **async_kwargs) as upload_api:
+            with pytest.raises(ValueError):
+                upload_api.upload_many("bogus", sources())
+            return [result async for result in upload_api.upload_many("image", sources())]
+
+    results = asyncio.run(main())
+
+    assert len(results) == 3 and all(result.error is None for result in results)
+    assert len(server.requests) == 3
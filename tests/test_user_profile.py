@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from messengerapi import AsyncUserProfileApi, Metrics, PermanentError, UserProfileApi
+from messengerapi.fake_graph import FakeGraphServer
+
+from .conftest import TOKEN
+
+
+def _lookups(server):
+    return sorted(request.path.rsplit("/", 1)[1] for request in server.requests)
+
+
+def test_profiles_are_cached(server, client_kwargs, monkeypatch):
+    user_profile_api = UserProfileApi(TOKEN, ttl=60, **client_kwargs)
+
+    profile = user_profile_api.get_user_profile("100")
+    assert set(profile) == {"id", "first_name", "last_name", "profile_pic", "locale"}
+    assert user_profile_api.get_user_profile(100) == profile
+    assert len(server.requests) == 1
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 120)
+    user_profile_api.get_user_profile("100")
+    user_profile_api.clear_cache()
+    user_profile_api.get_user_profile("100")
+    assert len(server.requests) == 3
+
+
+def test_concurrent_lookups_of_a_user_share_one_request(pool):
+    with FakeGraphServer(latency=0.2, seed=1) as server:
+        user_profile_api = UserProfileApi(TOKEN, graph_url=server.url, pool=pool)
+        profiles = []
+        threads = [
+            threading.Thread(target=lambda: profiles.append(user_profile_api.get_user_profile("100")))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(profiles) == 8 and all(profile == profiles[0] for profile in profiles)
+        assert len(server.requests) == 1
+
+
+def test_failed_lookup_is_shared_and_not_cached(server, client_kwargs):
+    user_profile_api = UserProfileApi(TOKEN, **client_kwargs)
+    server.inject(100, path="/100")
+
+    with pytest.raises(PermanentError):
+        user_profile_api.get_user_profile("100")
+    assert user_profile_api.get_user_profile("100")["id"] == "100"
+    assert len(server.requests) == 2
+
+
+def test_get_user_profiles_fetches_misses_in_batches(server, client_kwargs):
+    metrics = Metrics()
+    user_profile_api = UserProfileApi(TOKEN, fields=["first_name"], metrics=metrics, **client_kwargs)
+    user_profile_api.get_user_profile("1")
+    server.inject(100, path="/999")
+
+    user_ids = [str(user) for user in range(1, 111)] + ["999", "1", "2"]
+    profiles = user_profile_api.get_user_profiles(user_ids)
+
+    assert list(profiles) == list(dict.fromkeys(user_ids))
+    assert isinstance(profiles.pop("999"), PermanentError)
+    assert all(profile["id"] == user_id and set(profile) == {"id", "first_name"}
+               for user_id, profile in profiles.items())
+    # 110 misses: "1" was cached.
+    assert metrics.snapshot()["batch"].requests == {"success": 3}
+    assert _lookups(server) == sorted(["1"] + [str(user) for user in range(2, 111)])
+
+
+def test_invalid_arguments(client_kwargs):
+    with pytest.raises(ValueError):
+        UserProfileApi(TOKEN, fields=[], **client_kwargs)
+    user_profile_api = UserProfileApi(TOKEN, **client_kwargs)
+    for user_id in ("", "abc", True, None):
+        with pytest.raises(ValueError):
+            user_profile_api.get_user_profile(user_id)
+
+
+def test_async_lookups_are_coalesced_into_batches(server, async_kwargs):
+    async def main():
+        async with AsyncUserProfileApi(TOKEN, **async_kwargs) as user_profile_api:
+            profiles = await asyncio.gather(*(
+                user_profile_api.get_user_profile(str(user % 60)) for user in range(120)))
+            cached = await user_profile_api.get_user_profiles(["1", "2"])
+            return profiles, cached
+
+    profiles, cached = asyncio.run(main())
+
+    assert [profile["id"] for profile in profiles] == [str(user % 60) for user in range(120)]
+    assert cached == {"1": profiles[1], "2": profiles[2]}
+    assert _lookups(server) == sorted(str(user) for user in range(60))
@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import hmac
+import io
+import json
+
+import pytest
+
+from messengerapi.webhook import (
+    Event, InvalidSignatureError, MessageEvent, PostbackEvent, Webhook, parse_events,
+    verify_signature)
+
+VERIFY_TOKEN = "verify-token"
+APP_SECRET = "app-secret"
+
+CALLBACK = json.dumps({"object": "page", "entry": [{"id": "1234", "time": 1, "messaging": [
+    {"sender": {"id": "100"}, "recipient": {"id": "1234"}, "timestamp": 1,
+     "message": {"mid": "m1", "text": "Hi", "quick_reply": {"payload": "YES"}}},
+    {"sender": {"id": "100"}, "recipient": {"id": "1234"}, "timestamp": 2,
+     "postback": {"title": "Start", "payload": "GET_STARTED"}},
+    {"sender": {"id": "100"}, "recipient": {"id": "1234"}, "timestamp": 3, "unknown": {}},
+]}]}).encode()
+
+
+def _signature(body, secret=APP_SECRET):
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def test_verify_signature():
+    assert verify_signature(APP_SECRET, CALLBACK, _signature(CALLBACK))
+    assert verify_signature(APP_SECRET, CALLBACK, _signature(CALLBACK).upper().replace("SHA256=", "sha256="))
+    assert not verify_signature(APP_SECRET, CALLBACK, _signature(CALLBACK, "other-secret"))
+    assert not verify_signature(APP_SECRET, CALLBACK + b" ", _signature(CALLBACK))
+    assert not verify_signature(APP_SECRET, CALLBACK, _signature(CALLBACK)[len("sha256="):])
+    assert not verify_signature(APP_SECRET, CALLBACK, None)
+
+
+def test_parse_events():
+    message, postback, unknown = parse_events(CALLBACK)
+
+    assert type(message) is MessageEvent and type(postback) is PostbackEvent and type(unknown) is Event
+    assert (message.page_id, message.sender_id, message.recipient_id) == ("1234", "100", "1234")
+    assert (message.mid, message.text, message.quick_reply_payload) == ("m1", "Hi", "YES")
+    assert not message.is_echo and message.attachments == []
+    assert (postback.title, postback.payload, postback.timestamp) == ("Start", "GET_STARTED", 2)
+    assert list(parse_events({"object": "page"})) == []
+    assert list(parse_events({"entry": [{"id": "1"}]})) == []
+
+
+@pytest.mark.parametrize("body", [
+    b"not json",
+    b"[]",
+    b'{"entry": "x"}',
+    b'{"entry": {"id": "1"}}',
+    b'{"entry": ["x"]}',
+    b'{"entry": [{"messaging": "x"}]}',
+    b'{"entry": [{"messaging": [1]}]}',
+])
+def test_parse_events_rejects_malformed_bodies_right_away(body):
+    with pytest.raises(ValueError):
+        parse_events(body)
+
+
+def test_challenge():
+    webhook = Webhook(VERIFY_TOKEN, APP_SECRET)
+    query = {"hub.mode": "subscribe", "hub.verify_token": VERIFY_TOKEN, "hub.challenge": "42"}
+
+    assert webhook.challenge(query) == "42"
+    assert webhook.challenge({**query, "hub.verify_token": "wrong"}) is None
+    assert webhook.challenge({**query, "hub.mode": "unsubscribe"}) is None
+    assert webhook.challenge({"hub.challenge": "42"}) is None
+
+
+def test_parse_verifies_the_signature():
+    webhook = Webhook(VERIFY_TOKEN, APP_SECRET)
+
+    assert len(list(webhook.parse(CALLBACK, _signature(CALLBACK)))) == 3
+    with pytest.raises(InvalidSignatureError):
+        webhook.parse(CALLBACK, _signature(CALLBACK, "other-secret"))
+
+
+def _call_wsgi(webhook, method, body=b"", query="", signature=None, content_length=None):
+    environ = {
+        "REQUEST_METHOD": method,
+        "QUERY_STRING": query,
+        "CONTENT_LENGTH": str(len(body) if content_length is None else content_length),
+        "wsgi.input": io.BytesIO(body),
+    }
+    if signature is not None:
+        environ["HTTP_X_HUB_SIGNATURE_256"] = signature
+    statuses = []
+    response = webhook.wsgi_app(environ, lambda status, headers: statuses.append(status))
+    return int(statuses[0].split()[0]), b"".join(response)
+
+
+def test_wsgi_app():
+    received = []
+    webhook = Webhook(VERIFY_TOKEN, APP_SECRET, lambda events: received.extend(events),
+                      max_body_size=len(CALLBACK))
+    query = f"hub.mode=subscribe&hub.verify_token={VERIFY_TOKEN}&hub.challenge=42"
+
+    assert _call_wsgi(webhook, "GET", query=query) == (200, b"42")
+    assert _call_wsgi(webhook, "GET", query="hub.mode=subscribe&hub.verify_token=x")[0] == 403
+    assert _call_wsgi(webhook, "PUT")[0] == 405
+    assert _call_wsgi(webhook, "POST", CALLBACK, signature=_signature(CALLBACK, "other-secret"))[0] == 403
+    assert _call_wsgi(webhook, "POST", CALLBACK, content_length=len(CALLBACK) + 1)[0] == 413
+    assert received == []
+
+    assert _call_wsgi(webhook, "POST", CALLBACK, signature=_signature(CALLBACK)) == (200, b"EVENT_RECEIVED")
+    assert [event.sender_id for event in received] == ["100"] * 3
+
+
+@pytest.mark.parametrize("body", [b"not json", b'{"entry": "x"}', b'{"entry": [{"messaging": [1]}]}'])
+def test_wsgi_app_rejects_malformed_bodies_before_handling_them(body):
+    handled = []
+    webhook = Webhook(VERIFY_TOKEN, APP_SECRET, handled.append)
+
+    assert _call_wsgi(webhook, "POST", body, signature=_signature(body))[0] == 400
+    assert handled == []
+
+
+def _call_asgi(webhook, method, chunks=(b"",), query=b"", signature=None):
+    headers = [(b"content-type", b"application/json")]
+    if signature is not None:
+        headers.append((b"X-Hub-Signature-256", signature.encode()))
+    scope = {"type": "http", "method": method, "query_string": query, "headers": headers}
+    messages = [{"type": "http.request", "body": chunk, "more_body": index < len(chunks) - 1}
+                for index, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(webhook.asgi_app(scope, receive, send))
+    return sent[0]["status"], sent[1]["body"]
+
+
+def test_asgi_app():
+    received = []
+
+    async def handle(events):
+        received.extend(events)
+
+    webhook = Webhook(VERIFY_TOKEN, APP_SECRET, handle, max_body_size=len(CALLBACK))
+    query = f"hub.mode=subscribe&hub.verify_token={VERIFY_TOKEN}&hub.challenge=42".encode()
+    chunks = (CALLBACK[:10], CALLBACK[10:])
+
+    assert _call_asgi(webhook, "GET", query=query) == (200, b"42")
+    assert _call_asgi(webhook, "GET", query=b"hub.mode=subscribe")[0] == 403
+    assert _call_asgi(webhook, "DELETE")[0] == 405
+    assert _call_asgi(webhook, "POST", chunks, signature=_signature(b"other"))[0] == 403
+    assert _call_asgi(webhook, "POST", (CALLBACK,) * 3, signature=_signature(CALLBACK * 3))[0] == 413
+    assert _call_asgi(webhook, "POST", (b'{"entry": "x"}',), signature=_signature(b'{"entry": "x"}'))[0] == 400
+    assert received == []
+
+    assert _call_asgi(webhook, "POST", chunks, signature=_signature(CALLBACK)) == (200, b"EVENT_RECEIVED")
+    assert [event.timestamp for event in received] == [1, 2, 3]
+
+
+def test_asgi_lifespan():
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(Webhook(VERIFY_TOKEN, APP_SECRET).asgi_app({"type": "lifespan"}, receive, send))
+
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]